@@ -2,12 +2,202 @@
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from pandas.api.types import union_categoricals
 from datetime import datetime
-from typing import Tuple, Optional
+from typing import NamedTuple, Tuple, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Identifier columns are read as strings so leading zeros are preserved
+ID_COLUMN_DTYPES = {'census_tract_2010': str, 'cbsa_id': str}
+
+# Arrow schema for the transaction CSV (columns not in the file are ignored)
+TRANSACTION_COLUMN_TYPES = {
+    'property_id': pa.string(),
+    'transaction_date': pa.timestamp('ns'),
+    'transaction_price': pa.float64(),
+    'census_tract_2010': pa.string(),
+    'cbsa_id': pa.string()
+}
+
+# ID columns of the transaction data stored as pandas Categorical
+TRANSACTION_CATEGORICAL_COLUMNS = ['property_id', 'census_tract_2010', 'cbsa_id']
+
+# Dates are ISO-8601 (YYYY-MM-DD, optionally with a time); Arrow's built-in
+# ISO parser is a vectorized C path, so no per-value format inference
+TRANSACTION_TIMESTAMP_PARSERS = [pacsv.ISO8601]
+
+
+def _to_categorical(df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+    """Store repeated string identifiers as pandas Categorical (int codes)"""
+    present = [col for col in columns if col in df.columns]
+    return df.astype({col: 'category' for col in present})
+
+
+def _arrow_categorical(values: pa.ChunkedArray) -> pd.Categorical:
+    """
+    Categorical of an Arrow string column with sorted categories (as
+    astype('category') gives), encoded in Arrow: only the distinct values
+    become Python strings, not every row.
+    """
+    uniques = pc.unique(values).drop_null()
+    categories = uniques.take(pc.array_sort_indices(uniques))
+    codes = pc.fill_null(pc.index_in(values, value_set=categories), -1)
+    return pd.Categorical.from_codes(
+        codes.to_numpy(), categories=pd.Index(categories.to_numpy(zero_copy_only=False), dtype=object)
+    )
+
+
+def _sort_codes(values: pd.Series) -> Tuple[np.ndarray, int]:
+    """
+    int64 codes that order like the values themselves in sort_values
+    (category order for a Categorical), with missing values last; returns
+    the codes and the code given to missing values.
+    
+    Distinct values are hashed once and only the uniques are sorted, by
+    Arrow's string sort, instead of comparing Python strings row by row.
+    """
+    # rank[code] is the sort position of a code; code -1 (missing) maps to
+    # the last entry, after every value
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        n_values = len(values.cat.categories)
+        rank = np.arange(n_values + 1)
+    else:
+        codes, uniques = pd.factorize(values)
+        n_values = len(uniques)
+        rank = np.empty(n_values + 1, dtype=np.int64)
+        rank[pc.array_sort_indices(pa.array(uniques)).to_numpy()] = np.arange(n_values)
+        rank[-1] = n_values
+    return rank[codes], n_values
+
+
+def _sale_order(property_ids: pd.Series,
+                dates: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Positions that sort sales by (property_id, date) as a stable
+    sort_values would, with missing ids and dates last, found from integer
+    keys: the _sort_codes of the ids and the int64 view of the datetime64
+    dates. Also returns the id codes and the code of missing ids.
+    
+    When every date is a whole day (no time of day) and the keys fit,
+    the id code and day are packed into one int64 key, so the order
+    comes from a single stable argsort instead of a two-key lexsort.
+    """
+    id_codes, missing_code = _sort_codes(property_ids)
+    missing_dates = np.isnat(dates)
+    
+    days = dates.astype('datetime64[D]')
+    if len(dates) and not missing_dates.all() and ((days == dates) | missing_dates).all():
+        day_keys = days.view(np.int64)
+        valid_days = day_keys[~missing_dates]
+        first_day = valid_days.min()
+        # Day offsets in [0, span - 1), missing dates at span - 1
+        span = int(valid_days.max() - first_day) + 2
+        if (missing_code + 1) * span < 2 ** 62:
+            keys = id_codes * span + np.where(missing_dates, span - 1, day_keys - first_day)
+            return np.argsort(keys, kind='stable'), id_codes, missing_code
+    
+    date_keys = np.where(missing_dates, np.iinfo(np.int64).max, dates.view(np.int64))
+    return np.lexsort((date_keys, id_codes)), id_codes, missing_code
+
+
+# Sale year of a missing (NaT) date in the int16 year arrays; never equal
+# to a calendar year, so half-pair counts skip it
+MISSING_YEAR = np.iinfo(np.int16).min
+
+
+def datetime_years(dates) -> np.ndarray:
+    """
+    Calendar years of a datetime64 column as int16.
+    
+    Casts the datetime64 buffer to year resolution (years since 1970) in
+    one vectorized step instead of going through the .dt.year accessor.
+    Missing dates (NaT) map to MISSING_YEAR.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    years = dates.astype('datetime64[Y]').astype(np.int16) + np.int16(1970)
+    years[np.isnat(dates)] = MISSING_YEAR
+    return years
+
+
+def check_sale_years(first_years: np.ndarray, second_years: np.ndarray) -> None:
+    """Raise ValueError if any pair has a missing sale year (MISSING_YEAR)"""
+    if (first_years == MISSING_YEAR).any() or (second_years == MISSING_YEAR).any():
+        raise ValueError("Repeat sales pairs with missing sale dates; "
+                         "filter them out (apply_filters) first")
+
+
+def sale_years(repeat_sales_df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    First and second sale years of each pair as int16 arrays.
+    
+    Reads the first_year/second_year columns stored by
+    calculate_price_relatives when present (no recompute, no copy), and
+    falls back to extracting the years from the sale dates.
+    """
+    if 'first_year' in repeat_sales_df.columns and 'second_year' in repeat_sales_df.columns:
+        return (repeat_sales_df['first_year'].to_numpy(),
+                repeat_sales_df['second_year'].to_numpy())
+    return (datetime_years(repeat_sales_df['first_sale_date']),
+            datetime_years(repeat_sales_df['second_sale_date']))
+
+
+class RepeatSalesArrays(NamedTuple):
+    """
+    Regression columns of a repeat sales frame as contiguous arrays.
+    
+    tract_code indexes tracts (-1 for pairs without a tract); the other
+    arrays are aligned with it row for row.
+    """
+    tracts: pd.Index
+    tract_code: np.ndarray
+    first_year: np.ndarray
+    second_year: np.ndarray
+    log_price_relative: np.ndarray
+
+
+def repeat_sales_arrays(repeat_sales_df: pd.DataFrame) -> RepeatSalesArrays:
+    """
+    Extract the tract codes, sale years and log price relatives once.
+    
+    Categorical tract columns reuse their codes (no hashing of the tract
+    strings); other columns are factorized.
+    
+    Parameters:
+    -----------
+    repeat_sales_df: pd.DataFrame
+        Repeat sales pairs with census_tract_2010 and log_price_relative
+        
+    Returns:
+    --------
+    RepeatSalesArrays
+        int32 tract codes, int16 sale years and float64 log price relatives
+    """
+    tracts_col = repeat_sales_df['census_tract_2010']
+    if isinstance(tracts_col.dtype, pd.CategoricalDtype):
+        codes = tracts_col.cat.codes.to_numpy()
+        tracts = tracts_col.cat.categories
+    else:
+        codes, tracts = pd.factorize(tracts_col)
+    first_years, second_years = sale_years(repeat_sales_df)
+    check_sale_years(first_years, second_years)
+    # log price relatives stay float64: the BMN coefficients are
+    # differences of nearby values and lose accuracy in float32
+    return RepeatSalesArrays(
+        tracts=pd.Index(tracts),
+        tract_code=np.ascontiguousarray(codes, dtype=np.int32),
+        first_year=np.ascontiguousarray(first_years, dtype=np.int16),
+        second_year=np.ascontiguousarray(second_years, dtype=np.int16),
+        log_price_relative=np.ascontiguousarray(
+            repeat_sales_df['log_price_relative'].to_numpy(dtype=np.float64)
+        )
+    )
+
 
 class DataIngestion:
     """Handles data loading, validation, and initial processing"""
@@ -16,26 +206,48 @@ class DataIngestion:
         self.transactions_df = None
         self.geographic_df = None
         self.weighting_df = None
+        # Census tract IDs in code order, shared by the loaded frames once
+        # share_tract_codes has run (code = position in this index)
+        self.tract_code_map = None
         
     def load_transaction_data(self, filepath: str) -> pd.DataFrame:
         """Load and validate transaction data from CSV file"""
         logger.info(f"Loading transaction data from {filepath}")
         
-        df = pd.read_csv(filepath, parse_dates=['transaction_date'])
+        # Multi-threaded Arrow parse with a declared schema
+        table = pacsv.read_csv(
+            filepath,
+            convert_options=pacsv.ConvertOptions(
+                column_types=TRANSACTION_COLUMN_TYPES,
+                timestamp_parsers=TRANSACTION_TIMESTAMP_PARSERS,
+                strings_can_be_null=True
+            )
+        )
         
         # Validate required columns
         required_cols = ['property_id', 'transaction_date', 'transaction_price', 
                         'census_tract_2010', 'cbsa_id']
-        missing_cols = set(required_cols) - set(df.columns)
+        missing_cols = set(required_cols) - set(table.column_names)
         if missing_cols:
             raise ValueError(f"Missing required columns: {missing_cols}")
         
-        # Basic data validation
-        df = df[df['transaction_price'] > 0]
-        df = df.dropna(subset=required_cols)
+        # Basic data validation, applied in Arrow before converting to pandas
+        keep = pc.greater(table['transaction_price'], 0)
+        for col in required_cols:
+            keep = pc.and_(keep, pc.is_valid(table[col]))
+        table = table.filter(keep)
+        
+        # Categorical IDs make later groupby/isin/nunique run on int codes;
+        # they are dictionary-encoded from the Arrow columns directly
+        df = pd.DataFrame({
+            col: (_arrow_categorical(table[col]) if col in TRANSACTION_CATEGORICAL_COLUMNS
+                  else table[col].to_pandas())
+            for col in table.column_names
+        })
         
-        # Sort by property_id and transaction_date for repeat sales identification
-        df = df.sort_values(['property_id', 'transaction_date'])
+        # Sort by property_id and transaction_date for repeat sales
+        # identification (keyed on the parsed datetime64 values, no re-parse)
+        df = df.iloc[_sale_order(df['property_id'], df['transaction_date'].values)[0]]
         
         self.transactions_df = df
         logger.info(f"Loaded {len(df)} transactions")
@@ -45,7 +257,7 @@ class DataIngestion:
         """Load census tract geographic data"""
         logger.info(f"Loading geographic data from {filepath}")
         
-        df = pd.read_csv(filepath)
+        df = pd.read_csv(filepath, dtype=ID_COLUMN_DTYPES)
         required_cols = ['census_tract_2010', 'centroid_lat', 'centroid_lon']
         missing_cols = set(required_cols) - set(df.columns)
         if missing_cols:
@@ -55,6 +267,8 @@ class DataIngestion:
         df = df[(df['centroid_lat'] >= -90) & (df['centroid_lat'] <= 90)]
         df = df[(df['centroid_lon'] >= -180) & (df['centroid_lon'] <= 180)]
         
+        df = _to_categorical(df, ['census_tract_2010', 'cbsa_id'])
+        
         self.geographic_df = df
         logger.info(f"Loaded geographic data for {len(df)} census tracts")
         return df
@@ -63,15 +277,85 @@ class DataIngestion:
         """Load tract-level weighting data"""
         logger.info(f"Loading weighting data from {filepath}")
         
-        df = pd.read_csv(filepath)
+        df = pd.read_csv(filepath, dtype=ID_COLUMN_DTYPES)
         required_cols = ['census_tract_2010', 'year']
         missing_cols = set(required_cols) - set(df.columns)
         if missing_cols:
             raise ValueError(f"Missing required columns: {missing_cols}")
         
+        df = _to_categorical(df, ['census_tract_2010'])
+        
         self.weighting_df = df
         logger.info(f"Loaded weighting data with {len(df)} records")
         return df
+    
+    def share_tract_codes(self) -> pd.Index:
+        """
+        Give the census tract columns of all loaded frames one categorical
+        dtype, so equal tracts have equal integer codes across the
+        transaction, geographic and weighting data (joins and lookups
+        between them compare codes instead of hashing strings). Tract IDs
+        themselves are unchanged.
+        
+        Returns:
+        --------
+        pd.Index
+            Sorted tract IDs; a tract's code is its position (also stored
+            as tract_code_map)
+        """
+        # The code map of an earlier call is stale once frames are reloaded
+        self.tract_code_map = None
+        names = ['transactions_df', 'geographic_df', 'weighting_df']
+        frames = {name: getattr(self, name) for name in names
+                  if getattr(self, name) is not None and
+                  'census_tract_2010' in getattr(self, name).columns}
+        if not frames:
+            return self.tract_code_map
+        
+        # Observed tracts only: frames shared before may carry categories
+        # of a frame that has since been replaced
+        tracts = union_categoricals(
+            [df['census_tract_2010'].astype('category').cat.remove_unused_categories()
+             for df in frames.values()],
+            sort_categories=True, ignore_order=True
+        )
+        self.tract_code_map = tracts.categories
+        
+        tract_dtype = pd.CategoricalDtype(self.tract_code_map)
+        for name, df in frames.items():
+            setattr(self, name, df.astype({'census_tract_2010': tract_dtype}))
+        return self.tract_code_map
+
+
+def _make_pair_filter(min_period_months: int, max_annual_growth: float,
+                      min_appreciation_factor: float, max_appreciation_factor: float):
+    """
+    Build a filter over (years, growth, appreciation) arrays with the
+    thresholds bound as closure constants.
+    
+    The period threshold is pre-divided into years so the hot path compares
+    directly against the years array without a scaled temporary. Returns
+    the boolean keep-mask and the surviving count after each filter stage.
+    """
+    min_years = min_period_months / 12
+    
+    def filter_pairs(years: np.ndarray, growth: np.ndarray,
+                     appreciation: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int, int]]:
+        # Filter 1: Remove same-year transactions
+        mask = years >= min_years
+        after_period = int(mask.sum())
+        
+        # Filter 2: Remove excessive annual growth
+        mask &= np.abs(growth) <= max_annual_growth
+        after_growth = int(mask.sum())
+        
+        # Filter 3: Remove extreme cumulative appreciation
+        mask &= appreciation >= min_appreciation_factor
+        mask &= appreciation <= max_appreciation_factor
+        
+        return mask, (after_period, after_growth, int(mask.sum()))
+    
+    return filter_pairs
 
 
 class RepeatSalesProcessor:
@@ -85,61 +369,95 @@ class RepeatSalesProcessor:
         self.max_annual_growth = max_annual_growth
         self.max_appreciation_factor = max_appreciation_factor
         self.min_appreciation_factor = min_appreciation_factor
+        self._pair_filter_key = None
+        self._pair_filter = None
+        # Array view of the last process_repeat_sales result
+        self.repeat_sales_arrays = None
+    
+    def _get_pair_filter(self):
+        """Filter closure for the current thresholds (rebuilt if they change)"""
+        key = (self.min_period_months, self.max_annual_growth,
+               self.min_appreciation_factor, self.max_appreciation_factor)
+        if key != self._pair_filter_key:
+            self._pair_filter = _make_pair_filter(*key)
+            self._pair_filter_key = key
+        return self._pair_filter
     
     def identify_repeat_sales(self, transactions_df: pd.DataFrame) -> pd.DataFrame:
         """Identify all repeat sales pairs from transaction data"""
         logger.info("Identifying repeat sales pairs")
         
-        # Group by property_id and find properties with multiple sales
-        property_groups = transactions_df.groupby('property_id')
-        
-        repeat_sales = []
-        for property_id, group in property_groups:
-            if len(group) < 2:
-                continue
-            
-            # Create all consecutive pairs
-            sorted_group = group.sort_values('transaction_date')
-            for i in range(len(sorted_group) - 1):
-                first_sale = sorted_group.iloc[i]
-                second_sale = sorted_group.iloc[i + 1]
-                
-                repeat_sales.append({
-                    'property_id': property_id,
-                    'first_sale_date': first_sale['transaction_date'],
-                    'first_sale_price': first_sale['transaction_price'],
-                    'second_sale_date': second_sale['transaction_date'],
-                    'second_sale_price': second_sale['transaction_price'],
-                    'census_tract_2010': first_sale['census_tract_2010'],
-                    'cbsa_id': first_sale['cbsa_id']
-                })
-        
-        repeat_sales_df = pd.DataFrame(repeat_sales)
+        # Positions that sort each property's sales contiguously and in date
+        # order; the other columns are only gathered at the paired rows (no
+        # sorted copy of the frame)
+        dates = transactions_df['transaction_date'].values
+        order, id_codes, missing_code = _sale_order(transactions_df['property_id'], dates)
+        
+        # Pair every sale with the next sale of the same property (equal
+        # adjacent id codes; a missing id is never a property), taking the
+        # pair columns at the paired rows so they keep their dtypes
+        id_codes = id_codes[order]
+        first_idx = np.flatnonzero(
+            (id_codes[:-1] == id_codes[1:]) & (id_codes[:-1] != missing_code)
+        )
+        first_rows = order[first_idx]
+        second_rows = order[first_idx + 1]
+        
+        prices = transactions_df['transaction_price'].values
+        repeat_sales_df = pd.DataFrame({
+            'property_id': transactions_df['property_id'].values[first_rows],
+            'first_sale_date': dates[first_rows],
+            'first_sale_price': prices[first_rows],
+            'second_sale_date': dates[second_rows],
+            'second_sale_price': prices[second_rows],
+            'census_tract_2010': transactions_df['census_tract_2010'].values[first_rows],
+            'cbsa_id': transactions_df['cbsa_id'].values[first_rows]
+        })
         logger.info(f"Identified {len(repeat_sales_df)} repeat sales pairs")
         return repeat_sales_df
     
-    def calculate_price_relatives(self, repeat_sales_df: pd.DataFrame) -> pd.DataFrame:
-        """Calculate log price relatives and growth metrics"""
-        df = repeat_sales_df.copy()
+    def calculate_price_relatives(self, repeat_sales_df: pd.DataFrame,
+                                  copy: bool = True) -> pd.DataFrame:
+        """
+        Calculate log price relatives and growth metrics.
+        
+        With copy=False the metric columns are added to repeat_sales_df in
+        place instead of to a copy (for callers that own the frame).
+        """
+        df = repeat_sales_df.copy() if copy else repeat_sales_df
+        
+        # Compute the price ratio and holding period once as numpy arrays
+        first_price = df['first_sale_price'].to_numpy(dtype=np.float64)
+        second_price = df['second_sale_price'].to_numpy(dtype=np.float64)
+        ratio = second_price / first_price
+        holding = df['second_sale_date'].values - df['first_sale_date'].values
+        days = holding.astype('timedelta64[D]').astype(np.float64)
+        # A missing sale date gives a NaT period; the cast above turns it
+        # into int64 min days, so mark it missing (NaN) as .dt.days does
+        days[np.isnat(holding)] = np.nan
+        years = days / 365.25
+        # log1p of the relative change keeps full relative precision for
+        # small price changes, where log(ratio) loses digits to rounding
+        log_ratio = np.log1p((second_price - first_price) / first_price)
         
         # Calculate log price relative
-        df['log_price_relative'] = np.log(df['second_sale_price'] / df['first_sale_price'])
+        df['log_price_relative'] = log_ratio
         
         # Calculate time between sales in years
-        df['years_between_sales'] = (
-            (df['second_sale_date'] - df['first_sale_date']).dt.days / 365.25
-        )
+        df['years_between_sales'] = years
         
-        # Calculate compound annual growth rate
-        df['annual_growth_rate'] = (
-            (df['second_sale_price'] / df['first_sale_price']) ** 
-            (1 / df['years_between_sales']) - 1
-        )
+        # Calculate compound annual growth rate, exp(log(ratio) / years) - 1
+        # from the log already taken (no pow; expm1 keeps small rates exact)
+        with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+            df['annual_growth_rate'] = np.expm1(log_ratio / years)
         
         # Calculate cumulative appreciation
-        df['cumulative_appreciation'] = (
-            df['second_sale_price'] / df['first_sale_price']
-        )
+        df['cumulative_appreciation'] = ratio
+        
+        # Sale years (int16), stored once for the half-pair counts and BMN
+        # design matrices downstream
+        df['first_year'] = datetime_years(df['first_sale_date'])
+        df['second_year'] = datetime_years(df['second_sale_date'])
         
         return df
     
@@ -148,28 +466,27 @@ class RepeatSalesProcessor:
         logger.info("Applying filters to repeat sales pairs")
         initial_count = len(repeat_sales_df)
         
-        df = repeat_sales_df.copy()
-        
-        # Filter 1: Remove same-year transactions
-        months_between = (
-            (df['second_sale_date'] - df['first_sale_date']).dt.days / 30.44
-        )
-        df = df[months_between >= self.min_period_months]
-        logger.info(f"After same-period filter: {len(df)} pairs")
+        # Evaluate all conditions on raw numpy arrays, accumulating into a
+        # single boolean buffer (no per-condition Series allocations)
+        years = repeat_sales_df['years_between_sales'].to_numpy(dtype=np.float64)
+        growth = repeat_sales_df['annual_growth_rate'].to_numpy(dtype=np.float64)
+        appreciation = repeat_sales_df['cumulative_appreciation'].to_numpy(dtype=np.float64)
         
-        # Filter 2: Remove excessive annual growth
-        df = df[abs(df['annual_growth_rate']) <= self.max_annual_growth]
-        logger.info(f"After growth rate filter: {len(df)} pairs")
+        # Same-period, growth rate and appreciation filters
+        # (reuses years_between_sales from calculate_price_relatives)
+        mask, (after_period, after_growth, after_appreciation) = \
+            self._get_pair_filter()(years, growth, appreciation)
+        logger.info(f"After same-period filter: {after_period} pairs")
+        logger.info(f"After growth rate filter: {after_growth} pairs")
+        logger.info(f"After appreciation filter: {after_appreciation} pairs")
         
-        # Filter 3: Remove extreme cumulative appreciation
-        df = df[
-            (df['cumulative_appreciation'] <= self.max_appreciation_factor) &
-            (df['cumulative_appreciation'] >= self.min_appreciation_factor)
-        ]
-        logger.info(f"After appreciation filter: {len(df)} pairs")
+        # Materialize the filtered frame once, by position (no label or
+        # boolean-indexer alignment)
+        df = repeat_sales_df.iloc[np.flatnonzero(mask)]
         
         final_count = len(df)
-        logger.info(f"Filtered {initial_count - final_count} pairs ({(initial_count - final_count) / initial_count * 100:.1f}%)")
+        filtered_share = (initial_count - final_count) / initial_count if initial_count else 0.0
+        logger.info(f"Filtered {initial_count - final_count} pairs ({filtered_share * 100:.1f}%)")
         
         return df
     
@@ -178,10 +495,12 @@ class RepeatSalesProcessor:
         # Identify repeat sales
         repeat_sales_df = self.identify_repeat_sales(transactions_df)
         
-        # Calculate price relatives and metrics
-        repeat_sales_df = self.calculate_price_relatives(repeat_sales_df)
+        # Calculate price relatives and metrics (the pairs frame is ours, so
+        # add the columns in place rather than copying every column)
+        repeat_sales_df = self.calculate_price_relatives(repeat_sales_df, copy=False)
         
         # Apply filters
         filtered_df = self.apply_filters(repeat_sales_df)
+        self.repeat_sales_arrays = repeat_sales_arrays(filtered_df)
         
         return filtered_df
\ No newline at end of file
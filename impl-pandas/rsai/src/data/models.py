@@ -2,7 +2,7 @@
 
 from datetime import date
 from typing import Optional
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, TypeAdapter, field_validator, model_validator
 
 
 class Transaction(BaseModel):
@@ -12,12 +12,6 @@ class Transaction(BaseModel):
     transaction_price: float = Field(..., gt=0, description="Sale price in USD")
     census_tract_2010: str = Field(..., description="The 2010 Census Tract ID for the property")
     cbsa_id: str = Field(..., description="The Core-Based Statistical Area ID")
-    
-    @field_validator('transaction_price')
-    def validate_price(cls, v):
-        if v <= 0:
-            raise ValueError('Transaction price must be positive')
-        return v
 
 
 class RepeatSalePair(BaseModel):
@@ -33,11 +27,11 @@ class RepeatSalePair(BaseModel):
     annual_growth_rate: float = Field(..., description="Compound annual growth rate")
     years_between_sales: float = Field(..., gt=0, description="Years between transactions")
     
-    @field_validator('second_sale_date')
-    def validate_sale_order(cls, v, info):
-        if 'first_sale_date' in info.data and v <= info.data['first_sale_date']:
+    @model_validator(mode='after')
+    def validate_sale_order(self):
+        if self.second_sale_date <= self.first_sale_date:
             raise ValueError('Second sale must be after first sale')
-        return v
+        return self
 
 
 class GeographicData(BaseModel):
@@ -67,7 +61,8 @@ class SupertractDefinition(BaseModel):
     component_tracts: list[str] = Field(..., min_length=1, description="List of census tracts in this supertract")
     half_pairs_count: int = Field(..., ge=0, description="Number of half-pairs in this supertract")
     
-    @field_validator('component_tracts')
+    @field_validator('component_tracts', mode='after')
+    @classmethod
     def validate_unique_tracts(cls, v):
         if len(v) != len(set(v)):
             raise ValueError('Component tracts must be unique')
@@ -81,4 +76,13 @@ class IndexValue(BaseModel):
     index_value: float = Field(..., gt=0, description="Index value (base year = 100)")
     appreciation_rate: float = Field(..., description="Annual appreciation rate")
     weighting_scheme: str = Field(..., description="Weighting scheme used")
-    observations: int = Field(..., ge=0, description="Number of observations used")
\ No newline at end of file
+    observations: int = Field(..., ge=0, description="Number of observations used")
+
+
+# Compiled once at import so bulk validation does not rebuild the schema
+TransactionListAdapter = TypeAdapter(list[Transaction])
+
+
+def bulk_validate_transactions(records: list[dict]) -> list[Transaction]:
+    """Validate a batch of transaction records (e.g. df.to_dict(orient='records'))"""
+    return TransactionListAdapter.validate_python(records)
@@ -20,28 +20,35 @@ class DataValidator:
             'statistics': {}
         }
         
-        # Check for missing values
-        for col in ['property_id', 'transaction_date', 'transaction_price', 
-                    'census_tract_2010', 'cbsa_id']:
-            missing_count = df[col].isna().sum()
-            if missing_count > 0:
-                issues['missing_values'][col] = missing_count
+        # Check for missing values (one reduction over all required columns)
+        required_cols = ['property_id', 'transaction_date', 'transaction_price', 
+                         'census_tract_2010', 'cbsa_id']
+        missing_counts = df[required_cols].isna().sum()
+        issues['missing_values'] = {
+            col: int(count) for col, count in missing_counts.items() if count > 0
+        }
+        
+        # Date and price extremes, reduced once for both the checks and the
+        # statistics below
+        dates, prices = df['transaction_date'], df['transaction_price']
+        first_date, last_date = dates.min(), dates.max()
+        min_price, max_price = prices.min(), prices.max()
         
         # Check for negative or zero prices
-        invalid_prices = (df['transaction_price'] <= 0).sum()
+        invalid_prices = int((prices.to_numpy() <= 0).sum())
         if invalid_prices > 0:
             issues['data_quality']['invalid_prices'] = invalid_prices
         
         # Check for future dates
-        if pd.Timestamp.now() < df['transaction_date'].max():
+        if pd.Timestamp.now() < last_date:
             issues['data_quality']['future_dates'] = True
         
         # Basic statistics
         issues['statistics'] = {
             'total_records': len(df),
             'unique_properties': df['property_id'].nunique(),
-            'date_range': f"{df['transaction_date'].min()} to {df['transaction_date'].max()}",
-            'price_range': f"${df['transaction_price'].min():,.0f} to ${df['transaction_price'].max():,.0f}",
+            'date_range': f"{first_date} to {last_date}",
+            'price_range': f"${min_price:,.0f} to ${max_price:,.0f}",
             'unique_cbsas': df['cbsa_id'].nunique(),
             'unique_tracts': df['census_tract_2010'].nunique()
         }
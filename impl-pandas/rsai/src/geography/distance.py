@@ -1,9 +1,10 @@
 """Geographic distance calculations for RSAI"""
 
+import math
 import numpy as np
 import pandas as pd
-from typing import Tuple, Dict
-from scipy.spatial import cKDTree
+from typing import Tuple, Dict, List, Optional
+from sklearn.neighbors import BallTree
 
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -23,13 +24,18 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
         Distance in kilometers
     """
     # Convert to radians
-    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
     
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
-    c = 2 * np.arcsin(np.sqrt(a))
+    return _haversine_radians_scalar(lat1, lon1, lat2, lon2)
+
+
+def _haversine_radians_scalar(lat1: float, lon1: float,
+                              lat2: float, lon2: float) -> float:
+    """Scalar haversine distance in kilometers for coordinates in radians"""
+    # Haversine formula (math module, no numpy array allocation)
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    c = 2 * math.asin(math.sqrt(a))
     
     # Earth's radius in kilometers
     r = 6371
@@ -57,16 +63,38 @@ def haversine_vectorized(lat1: np.ndarray, lon1: np.ndarray,
     # Convert to radians
     lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
     
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
-    c = 2 * np.arcsin(np.sqrt(a))
+    return _haversine_radians(lat1, lon1, lat2, lon2)
+
+
+def _haversine_radians(lat1, lon1, lat2, lon2):
+    """Haversine distance in kilometers for coordinates already in radians"""
+    shape = np.broadcast_shapes(np.shape(lat1), np.shape(lon1),
+                                np.shape(lat2), np.shape(lon2))
+    
+    # Haversine formula, evaluated in place in two buffers:
+    # a = sin^2(dlat/2) + cos(lat1) * cos(lat2) * sin^2(dlon/2)
+    a = np.subtract(lat2, lat1, out=np.empty(shape))
+    a *= 0.5
+    np.sin(a, out=a)
+    np.square(a, out=a)
+    
+    b = np.subtract(lon2, lon1, out=np.empty(shape))
+    b *= 0.5
+    np.sin(b, out=b)
+    np.square(b, out=b)
+    b *= np.cos(lat1)
+    b *= np.cos(lat2)
+    a += b
+    
+    # c = 2 * arcsin(sqrt(a))
+    np.sqrt(a, out=a)
+    np.arcsin(a, out=a)
     
     # Earth's radius in kilometers
     r = 6371
     
-    return r * c
+    a *= 2 * r
+    return a[()]
 
 
 class GeographicDistanceCalculator:
@@ -87,15 +115,92 @@ class GeographicDistanceCalculator:
     def _build_spatial_index(self):
         """Build spatial index for efficient nearest neighbor queries"""
         # Convert lat/lon to radians for more accurate distance calculations
-        coords_rad = np.radians(self.geographic_df[['centroid_lat', 'centroid_lon']].values)
+        self.coords_rad = np.radians(
+            self.geographic_df[['centroid_lat', 'centroid_lon']].to_numpy(dtype=np.float64)
+        )
+        
+        # Build BallTree with the haversine metric so queries return exact
+        # great-circle distances (in radians)
+        self.tree = BallTree(self.coords_rad, metric='haversine')
+        
+        # Per-tract trig terms reused by every one-to-all distance query
+        self.lat_rad = np.ascontiguousarray(self.coords_rad[:, 0])
+        self.lon_rad = np.ascontiguousarray(self.coords_rad[:, 1])
+        self.cos_lat = np.cos(self.lat_rad)
+        
+        # Tract ID <-> positional index lookups (hashed in C by pandas).
+        # Duplicate tract IDs resolve to their last occurrence.
+        self.tracts_arr = self.geographic_df['census_tract_2010'].to_numpy()
+        keep = ~pd.Index(self.tracts_arr).duplicated(keep='last')
+        self.tract_index = pd.Index(self.tracts_arr[keep])
+        self._tract_positions = np.flatnonzero(keep)
+    
+    def _tract_position(self, tract_id: str) -> int:
+        """Positional index of a tract in the geographic data"""
+        return self._tract_positions[self.tract_index.get_loc(tract_id)]
+    
+    def distances_from(self, idx: int) -> np.ndarray:
+        """
+        Haversine distances from the tract at position idx to every tract.
+        
+        Parameters:
+        -----------
+        idx: int
+            Positional index of the source tract
+            
+        Returns:
+        --------
+        np.ndarray
+            Distances in kilometers, aligned with geographic_df rows
+        """
+        # Same formula as _haversine_radians, with cos(lat) taken from the cache
+        a = np.subtract(self.lat_rad, self.lat_rad[idx])
+        a *= 0.5
+        np.sin(a, out=a)
+        np.square(a, out=a)
+        
+        b = np.subtract(self.lon_rad, self.lon_rad[idx])
+        b *= 0.5
+        np.sin(b, out=b)
+        np.square(b, out=b)
+        b *= self.cos_lat
+        b *= self.cos_lat[idx]
+        a += b
+        
+        np.sqrt(a, out=a)
+        np.arcsin(a, out=a)
+        a *= 2 * 6371  # Earth's radius
+        return a
+    
+    def distance_matrix(self, tract_ids: List[str]) -> np.ndarray:
+        """
+        Pairwise haversine distances between the given tracts.
         
-        # Build KDTree for efficient spatial queries
-        self.tree = cKDTree(coords_rad)
+        Parameters:
+        -----------
+        tract_ids: List[str]
+            Census tract IDs
+            
+        Returns:
+        --------
+        np.ndarray
+            (n, n) matrix of distances in kilometers, in tract_ids order
+        """
+        tract_ids = np.asarray(tract_ids, dtype=object)
+        positions = self.tract_index.get_indexer(tract_ids)
+        if (positions < 0).any():
+            missing = tract_ids[positions < 0].tolist()
+            raise ValueError(f"Tracts {missing} not found in geographic data")
+        positions = self._tract_positions[positions]
         
-        # Create tract ID to index mapping
-        self.tract_to_idx = {tract: idx for idx, tract in 
-                            enumerate(self.geographic_df['census_tract_2010'])}
-        self.idx_to_tract = {idx: tract for tract, idx in self.tract_to_idx.items()}
+        lat = self.lat_rad[positions]
+        lon = self.lon_rad[positions]
+        return _haversine_radians(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+    
+    def _positions(self, tract_ids) -> np.ndarray:
+        """Positional indices of the known tracts among tract_ids"""
+        positions = self.tract_index.get_indexer(np.asarray(tract_ids, dtype=object))
+        return self._tract_positions[positions[positions >= 0]]
     
     def get_nearest_neighbor(self, tract_id: str, exclude_tracts: set = None) -> Tuple[str, float]:
         """
@@ -113,12 +218,12 @@ class GeographicDistanceCalculator:
         tuple
             (nearest_tract_id, distance_km)
         """
-        if tract_id not in self.tract_to_idx:
+        if tract_id not in self.tract_index:
             raise ValueError(f"Tract {tract_id} not found in geographic data")
         
         # Get coordinates for the query tract
-        idx = self.tract_to_idx[tract_id]
-        query_point = np.radians(self.geographic_df.iloc[idx][['centroid_lat', 'centroid_lon']].values)
+        idx = self._tract_position(tract_id)
+        query_point = self.coords_rad[idx]
         
         # Find k nearest neighbors (k=len to ensure we can skip excluded)
         k = min(len(self.geographic_df), 20)  # Limit search for efficiency
@@ -126,7 +231,7 @@ class GeographicDistanceCalculator:
         
         # Find first non-excluded neighbor
         for dist, neighbor_idx in zip(distances[0], indices[0]):
-            neighbor_tract = self.idx_to_tract[neighbor_idx]
+            neighbor_tract = self.tracts_arr[neighbor_idx]
             
             # Skip self and excluded tracts
             if neighbor_tract == tract_id:
@@ -134,13 +239,58 @@ class GeographicDistanceCalculator:
             if exclude_tracts and neighbor_tract in exclude_tracts:
                 continue
             
-            # Convert distance to kilometers (approximate)
+            # Convert great-circle distance to kilometers
             distance_km = dist * 6371  # Earth's radius
             
             return neighbor_tract, distance_km
         
         raise ValueError(f"No valid neighbor found for tract {tract_id}")
     
+    def get_nearest_neighbors(self, tract_ids: List[str],
+                              exclude_tracts: set = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the nearest neighbor for many census tracts with one tree query.
+        
+        Parameters:
+        -----------
+        tract_ids: List[str]
+            Census tract IDs to find neighbors for
+        exclude_tracts: set, optional
+            Set of tract IDs to exclude from search
+        
+        Returns:
+        --------
+        tuple
+            (nearest_tract_ids, distances_km) arrays aligned with tract_ids.
+            Tracts without a valid neighbor get None and NaN.
+        """
+        tract_ids = np.asarray(tract_ids, dtype=object)
+        positions = self.tract_index.get_indexer(tract_ids)
+        if (positions < 0).any():
+            missing = tract_ids[positions < 0].tolist()
+            raise ValueError(f"Tracts {missing} not found in geographic data")
+        positions = self._tract_positions[positions]
+        
+        # Query all points at once (same search limit as get_nearest_neighbor)
+        k = min(len(self.geographic_df), 20)
+        distances, indices = self.tree.query(self.coords_rad[positions], k=k)
+        
+        # Mask out self and excluded tracts, then take the first valid column
+        neighbor_tracts = self.tracts_arr[indices]
+        valid = neighbor_tracts != tract_ids[:, None]
+        if exclude_tracts:
+            valid &= ~np.isin(neighbor_tracts, list(exclude_tracts))
+        
+        rows = np.arange(len(tract_ids))
+        first_valid = valid.argmax(axis=1)
+        found = valid[rows, first_valid]
+        
+        nearest = np.where(found, neighbor_tracts[rows, first_valid], None)
+        # Convert great-circle distance to kilometers
+        distances_km = np.where(found, distances[rows, first_valid] * 6371, np.nan)
+        
+        return nearest, distances_km
+    
     def get_distance_between_tracts(self, tract1: str, tract2: str) -> float:
         """
         Calculate distance between two census tracts.
@@ -153,21 +303,21 @@ class GeographicDistanceCalculator:
         Returns:
         --------
         float
-            Distance in kilometers
+            Distance in kilometers (inf if either tract is unknown)
         """
-        if tract1 not in self.tract_to_idx or tract2 not in self.tract_to_idx:
-            raise ValueError("One or both tracts not found in geographic data")
+        # Unknown tracts are infinitely far away, so callers taking minima
+        # over many pairs need no per-pair exception handling
+        if tract1 not in self.tract_index or tract2 not in self.tract_index:
+            return float('inf')
         
-        idx1 = self.tract_to_idx[tract1]
-        idx2 = self.tract_to_idx[tract2]
+        idx1 = self._tract_position(tract1)
+        idx2 = self._tract_position(tract2)
         
-        row1 = self.geographic_df.iloc[idx1]
-        row2 = self.geographic_df.iloc[idx2]
+        # Use the cached radians coordinates (no pandas row access)
+        lat1, lon1 = self.coords_rad[idx1]
+        lat2, lon2 = self.coords_rad[idx2]
         
-        return haversine_distance(
-            row1['centroid_lat'], row1['centroid_lon'],
-            row2['centroid_lat'], row2['centroid_lon']
-        )
+        return _haversine_radians_scalar(lat1, lon1, lat2, lon2)
     
     def get_all_distances_from_tract(self, tract_id: str) -> pd.DataFrame:
         """
@@ -183,25 +333,110 @@ class GeographicDistanceCalculator:
         pd.DataFrame
             DataFrame with columns: census_tract_2010, distance_km
         """
-        if tract_id not in self.tract_to_idx:
+        if tract_id not in self.tract_index:
             raise ValueError(f"Tract {tract_id} not found in geographic data")
         
-        idx = self.tract_to_idx[tract_id]
-        source = self.geographic_df.iloc[idx]
-        
         # Calculate distances to all other tracts
-        distances = haversine_vectorized(
-            source['centroid_lat'], source['centroid_lon'],
-            self.geographic_df['centroid_lat'].values,
-            self.geographic_df['centroid_lon'].values
-        )
+        distances = self.distances_from(self._tract_position(tract_id))
         
-        result_df = pd.DataFrame({
-            'census_tract_2010': self.geographic_df['census_tract_2010'],
-            'distance_km': distances
-        })
+        # Sort the float distances only, then drop the source tract
+        order = np.argsort(distances, kind='stable')
+        order = order[self.tracts_arr[order] != tract_id]
         
-        # Sort by distance
-        result_df = result_df.sort_values('distance_km')
+        return pd.DataFrame({
+            'census_tract_2010': self.tracts_arr[order],
+            'distance_km': distances[order]
+        }, index=self.geographic_df.index[order])
+
+
+class TractNeighborSearch:
+    """
+    Nearest-available-tract search within one set of tracts (e.g. a CBSA).
+    
+    Small sets use a dense pairwise distance matrix. Sets larger than
+    max_matrix_tracts use a haversine BallTree instead, so memory stays
+    linear in the number of tracts.
+    """
+    
+    MAX_MATRIX_TRACTS = 2000
+    
+    def __init__(self, calculator: GeographicDistanceCalculator,
+                 tract_ids: List[str], max_matrix_tracts: int = None):
+        """
+        Initialize the search over a set of tracts.
+        
+        Parameters:
+        -----------
+        calculator: GeographicDistanceCalculator
+            Calculator holding the tract centroids
+        tract_ids: List[str]
+            Tracts to search; positions in this list identify tracts
+        max_matrix_tracts: int, optional
+            Largest set searched with a dense matrix (default MAX_MATRIX_TRACTS)
+        """
+        if max_matrix_tracts is None:
+            max_matrix_tracts = self.MAX_MATRIX_TRACTS
+        
+        self.n_tracts = len(tract_ids)
+        if self.n_tracts <= max_matrix_tracts:
+            self.distances = calculator.distance_matrix(tract_ids)
+            self.tree = None
+        else:
+            positions = calculator._positions(tract_ids)
+            if len(positions) != self.n_tracts:
+                raise ValueError("One or more tracts not found in geographic data")
+            self.distances = None
+            self.coords_rad = calculator.coords_rad[positions]
+            self.tree = BallTree(self.coords_rad, metric='haversine')
+    
+    def nearest(self, members: np.ndarray, available: np.ndarray) -> Optional[int]:
+        """
+        Position of the available tract closest to any member tract.
         
-        return result_df[result_df['census_tract_2010'] != tract_id]
\ No newline at end of file
+        Parameters:
+        -----------
+        members: np.ndarray
+            Positions of the tracts to measure from
+        available: np.ndarray
+            Boolean mask over all positions of tracts that may be returned
+            
+        Returns:
+        --------
+        int or None
+            Position of the nearest available tract, or None if none is available.
+            Equal distances resolve to the earliest member, then the lowest
+            position, in both the matrix and the tree mode.
+        """
+        if not available.any():
+            return None
+        
+        if self.tree is None:
+            # Row-major argmin: ties go to the earliest member, then the
+            # earliest candidate
+            candidates = np.flatnonzero(available)
+            sub = self.distances[np.ix_(members, candidates)]
+            _, j = np.unravel_index(np.argmin(sub), sub.shape)
+            return int(candidates[j])
+        
+        # Query the k nearest tracts of every member, widening k until the
+        # best available hit (and any exact ties with it) is provably found.
+        # Distances are recomputed with _haversine_radians so ties resolve
+        # exactly as in the dense matrix path.
+        query_points = self.coords_rad[members]
+        k = min(32, self.n_tracts)
+        while True:
+            _, ind = self.tree.query(query_points, k=k)
+            dist = _haversine_radians(
+                query_points[:, :1], query_points[:, 1:],
+                self.coords_rad[ind, 0], self.coords_rad[ind, 1]
+            )
+            masked = np.where(available[ind], dist, np.inf)
+            best_dist = masked.min()
+            
+            # Tracts beyond each member's k-th neighbor are at least as far
+            # as that neighbor, so stop once every row reaches past best_dist
+            if k == self.n_tracts or (dist.max(axis=1) > best_dist).all():
+                rows, cols = np.nonzero(masked == best_dist)
+                first = np.lexsort((ind[rows, cols], rows))[0]
+                return int(ind[rows[first], cols[first]])
+            k = min(2 * k, self.n_tracts)
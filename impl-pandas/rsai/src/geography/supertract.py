@@ -2,15 +2,99 @@
 
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Set, Tuple
+import pyarrow as pa
+from typing import Dict, List, Optional, Tuple
 import logging
+import os
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
-from .distance import GeographicDistanceCalculator
+from ..data.ingestion import MISSING_YEAR, sale_years
+from .distance import GeographicDistanceCalculator, TractNeighborSearch
 
 logger = logging.getLogger(__name__)
 
 
+def _sale_years(repeat_sales_df: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+    """First and second sale years, using stored year columns when present"""
+    first_years, second_years = sale_years(repeat_sales_df)
+    return (pd.Series(first_years, index=repeat_sales_df.index),
+            pd.Series(second_years, index=repeat_sales_df.index))
+
+
+def _tract_codes(tracts: pd.Series, tract_index: pd.Index) -> np.ndarray:
+    """int32 positions of tract IDs in tract_index (-1 for unknown tracts)"""
+    if isinstance(tracts.dtype, pd.CategoricalDtype):
+        # Look up each category once, then gather by the categorical codes
+        # (code -1, a missing value, picks up the trailing -1)
+        category_codes = np.append(tract_index.get_indexer(tracts.cat.categories), -1)
+        return category_codes[tracts.cat.codes.to_numpy()].astype(np.int32)
+    return tract_index.get_indexer(tracts).astype(np.int32)
+
+
+def _half_pairs_table(tract_codes: np.ndarray, n_tracts: int, first_years: np.ndarray,
+                      second_years: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    Half-pairs per (tract code, year) as a dense n_tracts x n_years array,
+    built with two bincounts over the flat index code * n_years + year offset.
+    Sales with code -1 (tract unknown) or a missing sale year are ignored.
+    Returns the array and the year of its first column.
+    """
+    known = ((tract_codes >= 0) & (first_years != MISSING_YEAR) &
+             (second_years != MISSING_YEAR))
+    codes = tract_codes[known].astype(np.int64)
+    first_years = first_years[known].astype(np.int64)
+    second_years = second_years[known].astype(np.int64)
+    if len(codes) == 0:
+        return np.zeros((n_tracts, 0), dtype=np.int64), 0
+    
+    first_year = int(min(first_years.min(), second_years.min()))
+    n_years = int(max(first_years.max(), second_years.max())) - first_year + 1
+    size = n_tracts * n_years
+    counts = (np.bincount(codes * n_years + (first_years - first_year), minlength=size) +
+              np.bincount(codes * n_years + (second_years - first_year), minlength=size))
+    return counts.reshape(n_tracts, n_years), first_year
+
+
+def _year_counts(table: np.ndarray, first_year: int, year: int) -> np.ndarray:
+    """Column of a _half_pairs_table for one year (zeros outside its range)"""
+    column = year - first_year
+    if 0 <= column < table.shape[1]:
+        return table[:, column]
+    return np.zeros(table.shape[0], dtype=np.int64)
+
+
+# Storage type of the component_tracts column: an Arrow list of strings
+# (flat offsets + values buffers rather than one Python list per row)
+COMPONENT_TRACTS_DTYPE = pd.ArrowDtype(pa.list_(pa.string()))
+
+# Columns (and compact dtypes) of the generate_all_supertracts output
+SUPERTRACT_COLUMNS = ['supertract_id', 'year', 'cbsa_id', 'component_tracts', 'half_pairs_count']
+SUPERTRACT_DTYPES = {
+    'year': np.int16,
+    'component_tracts': COMPONENT_TRACTS_DTYPE,
+    'half_pairs_count': np.int32
+}
+
+# Per-process generator used by CBSA worker processes (see
+# SupertractGenerator.generate_all_supertracts with n_jobs > 1)
+_worker_generator = None
+
+
+def _init_supertract_worker(geographic_df: pd.DataFrame, min_half_pairs: int):
+    """Build one SupertractGenerator per worker process"""
+    global _worker_generator
+    _worker_generator = SupertractGenerator(geographic_df, min_half_pairs)
+
+
+def _generate_cbsa_supertracts_in_worker(cbsa_sales: pd.DataFrame, cbsa_id: str,
+                                         start_year: int, end_year: int) -> List[Tuple]:
+    """Worker-process entry point for one CBSA"""
+    return _worker_generator._generate_cbsa_supertracts(
+        cbsa_sales, cbsa_id, start_year, end_year
+    )
+
+
 class SupertractGenerator:
     """
     Implements the dynamic supertract generation algorithm.
@@ -37,6 +121,24 @@ class SupertractGenerator:
             self.distance_calc = GeographicDistanceCalculator(geographic_df)
         else:
             self.distance_calc = None
+        # Row positions of each CBSA's tracts (one groupby instead of a
+        # boolean mask per CBSA and year)
+        if 'cbsa_id' in geographic_df.columns:
+            self._cbsa_tract_rows = geographic_df.groupby(
+                'cbsa_id', sort=False, observed=True
+            ).indices
+        else:
+            self._cbsa_tract_rows = {}
+        # Integer code for every tract ID; the merge loop works on these
+        # codes and only translates back to IDs for the output
+        if 'census_tract_2010' in geographic_df.columns:
+            codes, uniques = pd.factorize(geographic_df['census_tract_2010'])
+            self._geo_tract_codes = codes.astype(np.int32)
+            self.code_to_tract = np.asarray(uniques, dtype=object)
+        else:
+            self._geo_tract_codes = np.empty(0, dtype=np.int32)
+            self.code_to_tract = np.empty(0, dtype=object)
+        self._tract_index = pd.Index(self.code_to_tract)
     
     def calculate_half_pairs(self, repeat_sales_df: pd.DataFrame, 
                            year: int, tract: str) -> int:
@@ -63,15 +165,13 @@ class SupertractGenerator:
         # Filter for the specific tract
         tract_sales = repeat_sales_df[repeat_sales_df['census_tract_2010'] == tract]
         
+        first_years, second_years = _sale_years(tract_sales)
+        
         # Count transactions where first sale is in the given year
-        first_sale_count = (
-            (tract_sales['first_sale_date'].dt.year == year).sum()
-        )
+        first_sale_count = (first_years == year).sum()
         
         # Count transactions where second sale is in the given year
-        second_sale_count = (
-            (tract_sales['second_sale_date'].dt.year == year).sum()
-        )
+        second_sale_count = (second_years == year).sum()
         
         return first_sale_count + second_sale_count
     
@@ -97,18 +197,42 @@ class SupertractGenerator:
         # Filter for the specific tracts
         tract_sales = repeat_sales_df[repeat_sales_df['census_tract_2010'].isin(tracts)]
         
+        first_years, second_years = _sale_years(tract_sales)
+        
         # Count transactions where first sale is in the given year
-        first_sale_count = (
-            (tract_sales['first_sale_date'].dt.year == year).sum()
-        )
+        first_sale_count = (first_years == year).sum()
         
         # Count transactions where second sale is in the given year
-        second_sale_count = (
-            (tract_sales['second_sale_date'].dt.year == year).sum()
-        )
+        second_sale_count = (second_years == year).sum()
         
         return first_sale_count + second_sale_count
     
+    def calculate_half_pairs_matrix(self, repeat_sales_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calculate half-pairs for every tract and year in one pass.
+        
+        Parameters:
+        -----------
+        repeat_sales_df: pd.DataFrame
+            DataFrame of repeat sales pairs
+            
+        Returns:
+        --------
+        pd.DataFrame
+            Half-pair counts indexed by census_tract_2010, one column per year
+            from the earliest to the latest sale year
+        """
+        first_years, second_years = _sale_years(repeat_sales_df)
+        codes, tracts = pd.factorize(repeat_sales_df['census_tract_2010'], sort=True)
+        table, first_year = _half_pairs_table(
+            codes, len(tracts), first_years.to_numpy(), second_years.to_numpy()
+        )
+        return pd.DataFrame(
+            table,
+            index=pd.Index(tracts, name='census_tract_2010'),
+            columns=pd.RangeIndex(first_year, first_year + table.shape[1], name='year')
+        )
+    
     def generate_supertracts_for_year(self, repeat_sales_df: pd.DataFrame,
                                     year: int, cbsa_id: str) -> Dict[str, List[str]]:
         """
@@ -128,61 +252,105 @@ class SupertractGenerator:
         Dict[str, List[str]]
             Mapping of supertract_id to list of component census tracts
         """
+        cbsa_tracts = self._prepare_cbsa(
+            repeat_sales_df[repeat_sales_df['cbsa_id'] == cbsa_id], cbsa_id
+        )
+        supertracts, _ = self._build_supertracts(cbsa_tracts, year, cbsa_id)
+        return supertracts
+    
+    def _prepare_cbsa(self, cbsa_sales: pd.DataFrame,
+                      cbsa_id: str) -> Tuple[List[str], np.ndarray, int,
+                                              Optional[TractNeighborSearch]]:
+        """
+        Year-independent inputs for one CBSA's supertracts: its tract IDs in
+        geographic order, the (tract position x year) half-pairs table with
+        the year of its first column, and the neighbor search over its tracts.
+        """
+        # CBSA tracts as codes, in geographic order; local position i is
+        # used for the count arrays and the neighbor search
+        cbsa_codes = pd.unique(
+            self._geo_tract_codes[self._cbsa_tract_rows.get(cbsa_id, [])]
+        )
+        n_tracts = len(cbsa_codes)
+        tract_list = self.code_to_tract[cbsa_codes].tolist()
+        # (one spare slot so unknown sale tracts, code -1, map to -1)
+        local_position = np.full(len(self.code_to_tract) + 1, -1, dtype=np.int32)
+        local_position[cbsa_codes] = np.arange(n_tracts, dtype=np.int32)
+        
+        # Half-pairs for every tract and year from a single
+        # (local tract code) x year count table
+        first_years, second_years = _sale_years(cbsa_sales)
+        sale_positions = local_position[_tract_codes(
+            cbsa_sales['census_tract_2010'], self._tract_index
+        )]
+        halfpairs, first_year = _half_pairs_table(
+            sale_positions, n_tracts, first_years.to_numpy(), second_years.to_numpy()
+        )
+        
+        # Neighbor search over the CBSA's tracts (dense distance matrix, or a
+        # BallTree for large CBSAs), shared by every year's merges
+        neighbor_search = (TractNeighborSearch(self.distance_calc, tract_list)
+                           if self.distance_calc is not None and tract_list else None)
+        
+        return tract_list, halfpairs, first_year, neighbor_search
+    
+    def _build_supertracts(self, cbsa_tracts: Tuple[List[str], np.ndarray, int,
+                                                    Optional[TractNeighborSearch]],
+                           year: int, cbsa_id: str) -> Tuple[Dict[str, List[str]], Dict[str, int]]:
+        """
+        Supertracts for a CBSA and year from _prepare_cbsa's output, plus each
+        supertract's half-pairs count in the year (the running total from
+        the merge loop).
+        """
         logger.info(f"Generating supertracts for CBSA {cbsa_id}, year {year}")
         
-        # Filter data for this CBSA
-        cbsa_sales = repeat_sales_df[repeat_sales_df['cbsa_id'] == cbsa_id]
-        cbsa_tracts = self.geographic_df[self.geographic_df['cbsa_id'] == cbsa_id]
+        tract_list, halfpairs, first_year, neighbor_search = cbsa_tracts
+        n_tracts = len(tract_list)
         
-        # Calculate half-pairs for each tract in current and previous year
-        tract_halfpairs = {}
-        for tract in cbsa_tracts['census_tract_2010']:
-            halfpairs_current = self.calculate_half_pairs(cbsa_sales, year, tract)
-            halfpairs_previous = self.calculate_half_pairs(cbsa_sales, year - 1, tract)
-            
-            # Tract must meet threshold in both years
-            meets_threshold = (halfpairs_current >= self.min_half_pairs and 
-                             halfpairs_previous >= self.min_half_pairs)
-            
-            tract_halfpairs[tract] = {
-                'current': halfpairs_current,
-                'previous': halfpairs_previous,
-                'meets_threshold': meets_threshold
-            }
+        # Half-pairs for each tract in current and previous year
+        current_counts = _year_counts(halfpairs, first_year, year)
+        previous_counts = _year_counts(halfpairs, first_year, year - 1)
+        
+        # Tract must meet threshold in both years
+        meets_threshold = ((current_counts >= self.min_half_pairs) &
+                           (previous_counts >= self.min_half_pairs))
         
         # Initialize supertracts
         supertracts = {}
-        processed_tracts = set()
+        half_pairs = {}
+        # Tracts not yet assigned to a supertract, updated in place as tracts
+        # are assigned (the neighbor search reads it directly)
+        available = np.ones(n_tracts, dtype=bool)
         supertract_counter = 0
         
         # First pass: tracts that meet threshold independently
-        for tract, info in tract_halfpairs.items():
-            if info['meets_threshold'] and tract not in processed_tracts:
-                supertract_id = f"{cbsa_id}_{year}_ST{supertract_counter:04d}"
-                supertracts[supertract_id] = [tract]
-                processed_tracts.add(tract)
-                supertract_counter += 1
+        for tract in np.flatnonzero(meets_threshold).tolist():
+            supertract_id = f"{cbsa_id}_{year}_ST{supertract_counter:04d}"
+            supertracts[supertract_id] = [tract_list[tract]]
+            half_pairs[supertract_id] = int(current_counts[tract])
+            supertract_counter += 1
+        available[meets_threshold] = False
         
         # Second pass: iteratively merge tracts that don't meet threshold
-        unprocessed = [t for t in tract_halfpairs.keys() if t not in processed_tracts]
+        unprocessed = np.flatnonzero(~meets_threshold).tolist()
         
-        while unprocessed:
+        # (single ordered pass; tracts already merged into an earlier
+        # supertract are skipped instead of removed from the list)
+        for current_tract in unprocessed:
+            if not available[current_tract]:
+                continue
+            
             # Start with the first unprocessed tract
-            current_tract = unprocessed[0]
             current_supertract = [current_tract]
-            processed_tracts.add(current_tract)
-            unprocessed.remove(current_tract)
+            available[current_tract] = False
+            
+            # Half-pairs are additive over disjoint tracts, so keep running
+            # totals instead of re-summing the supertract after each merge
+            current_halfpairs = current_counts[current_tract]
+            previous_halfpairs = previous_counts[current_tract]
             
             # Keep merging until threshold is met
             while True:
-                # Calculate current half-pairs
-                current_halfpairs = self.calculate_half_pairs_multi(
-                    cbsa_sales, year, current_supertract
-                )
-                previous_halfpairs = self.calculate_half_pairs_multi(
-                    cbsa_sales, year - 1, current_supertract
-                )
-                
                 # Check if threshold is met
                 if (current_halfpairs >= self.min_half_pairs and 
                     previous_halfpairs >= self.min_half_pairs):
@@ -190,73 +358,83 @@ class SupertractGenerator:
                 
                 # Find nearest unprocessed neighbor
                 nearest_neighbor = self._find_nearest_unprocessed_neighbor(
-                    current_supertract, processed_tracts, cbsa_tracts
+                    current_supertract, available, neighbor_search
                 )
                 
                 if nearest_neighbor is None:
                     # No more neighbors to merge, accept as is
-                    logger.warning(f"Supertract with tracts {current_supertract} "
+                    logger.warning(f"Supertract with tracts "
+                                 f"{[tract_list[t] for t in current_supertract]} "
                                  f"does not meet threshold but no neighbors available")
                     break
                 
                 # Merge the neighbor
                 current_supertract.append(nearest_neighbor)
-                processed_tracts.add(nearest_neighbor)
-                if nearest_neighbor in unprocessed:
-                    unprocessed.remove(nearest_neighbor)
+                available[nearest_neighbor] = False
+                current_halfpairs += current_counts[nearest_neighbor]
+                previous_halfpairs += previous_counts[nearest_neighbor]
             
             # Save the supertract
             supertract_id = f"{cbsa_id}_{year}_ST{supertract_counter:04d}"
-            supertracts[supertract_id] = current_supertract
+            supertracts[supertract_id] = [tract_list[t] for t in current_supertract]
+            half_pairs[supertract_id] = int(current_halfpairs)
             supertract_counter += 1
         
         logger.info(f"Created {len(supertracts)} supertracts for CBSA {cbsa_id}, year {year}")
-        return supertracts
+        return supertracts, half_pairs
     
-    def _find_nearest_unprocessed_neighbor(self, current_supertract: List[str],
-                                         processed_tracts: Set[str],
-                                         cbsa_tracts: pd.DataFrame) -> str:
+    def _find_nearest_unprocessed_neighbor(self, current_supertract: List[int],
+                                         available: np.ndarray,
+                                         neighbor_search: TractNeighborSearch) -> Optional[int]:
         """
         Find the nearest unprocessed neighbor to a supertract.
         
         Parameters:
         -----------
-        current_supertract: List[str]
-            List of tracts in the current supertract
-        processed_tracts: Set[str]
-            Set of already processed tract IDs
-        cbsa_tracts: pd.DataFrame
-            DataFrame of tracts in the current CBSA
+        current_supertract: List[int]
+            Codes (CBSA tract positions) of the tracts in the current supertract
+        available: np.ndarray
+            Boolean mask over the CBSA's tract codes, True for unprocessed tracts
+        neighbor_search: TractNeighborSearch
+            Neighbor search over the current CBSA's tracts
             
         Returns:
         --------
-        str or None
-            ID of nearest unprocessed tract, or None if none available
+        int or None
+            Code of nearest unprocessed tract, or None if none available
         """
-        # Get all unprocessed tracts
-        available_tracts = set(cbsa_tracts['census_tract_2010']) - processed_tracts
+        # Find minimum distance from any tract in supertract to any available tract
+        return neighbor_search.nearest(np.asarray(current_supertract), available)
+    
+    def _generate_cbsa_supertracts(self, cbsa_sales: pd.DataFrame, cbsa_id: str,
+                                   start_year: int, end_year: int) -> List[Tuple]:
+        """Supertract records (SUPERTRACT_COLUMNS tuples) for every year of one CBSA"""
+        logger.info(f"Processing CBSA {cbsa_id}")
+        records = []
         
-        if not available_tracts:
-            return None
+        # Tract codes, half-pairs matrix and neighbor search do not depend on
+        # the year, so build them once for the CBSA
+        cbsa_tracts = self._prepare_cbsa(cbsa_sales, cbsa_id)
         
-        # Find minimum distance from any tract in supertract to any available tract
-        min_distance = float('inf')
-        nearest_tract = None
-        
-        for tract in current_supertract:
-            for candidate in available_tracts:
-                try:
-                    distance = self.distance_calc.get_distance_between_tracts(tract, candidate)
-                    if distance < min_distance:
-                        min_distance = distance
-                        nearest_tract = candidate
-                except ValueError:
-                    continue
-        
-        return nearest_tract
+        for year in range(start_year, end_year + 1):
+            # Generate supertracts for this CBSA and year
+            # (the final half-pairs counts come from the merge loop)
+            supertracts, half_pairs = self._build_supertracts(
+                cbsa_tracts, year, cbsa_id
+            )
+            
+            # Convert to dataframe format
+            for supertract_id, component_tracts in supertracts.items():
+                records.append((
+                    supertract_id, year, cbsa_id, component_tracts,
+                    half_pairs[supertract_id]
+                ))
+        
+        return records
     
     def generate_all_supertracts(self, repeat_sales_df: pd.DataFrame,
-                               start_year: int, end_year: int) -> pd.DataFrame:
+                               start_year: int, end_year: int,
+                               n_jobs: Optional[int] = 1) -> pd.DataFrame:
         """
         Generate supertracts for all CBSAs and years.
         
@@ -268,6 +446,9 @@ class SupertractGenerator:
             First year to generate supertracts for
         end_year: int
             Last year to generate supertracts for
+        n_jobs: int, optional
+            Number of worker processes for CBSAs (CBSAs are independent).
+            1 runs in-process; None uses all CPUs.
             
         Returns:
         --------
@@ -276,32 +457,42 @@ class SupertractGenerator:
         """
         all_supertracts = []
         
-        # Get unique CBSAs
+        # Extract sale years once (int16) for all half-pair counts below,
+        # unless the repeat sales processor already stored them
+        if not {'first_year', 'second_year'} <= set(repeat_sales_df.columns):
+            first_years, second_years = sale_years(repeat_sales_df)
+            repeat_sales_df = repeat_sales_df.assign(
+                first_year=first_years, second_year=second_years
+            )
+        
+        # Get unique CBSAs and the row positions of each CBSA's sales
         cbsas = repeat_sales_df['cbsa_id'].unique()
+        cbsa_rows = repeat_sales_df.groupby('cbsa_id', sort=False, observed=True).indices
+        cbsa_slices = [repeat_sales_df.iloc[cbsa_rows.get(cbsa_id, [])] for cbsa_id in cbsas]
         
-        for cbsa_id in cbsas:
-            logger.info(f"Processing CBSA {cbsa_id}")
-            
-            for year in range(start_year, end_year + 1):
-                # Generate supertracts for this CBSA and year
-                supertracts = self.generate_supertracts_for_year(
-                    repeat_sales_df, year, cbsa_id
-                )
-                
-                # Convert to dataframe format
-                for supertract_id, component_tracts in supertracts.items():
-                    # Calculate final half-pairs count
-                    cbsa_sales = repeat_sales_df[repeat_sales_df['cbsa_id'] == cbsa_id]
-                    half_pairs = self.calculate_half_pairs_multi(
-                        cbsa_sales, year, component_tracts
-                    )
-                    
-                    all_supertracts.append({
-                        'supertract_id': supertract_id,
-                        'year': year,
-                        'cbsa_id': cbsa_id,
-                        'component_tracts': component_tracts,
-                        'half_pairs_count': half_pairs
-                    })
-        
-        return pd.DataFrame(all_supertracts)
\ No newline at end of file
+        if n_jobs is None:
+            n_jobs = os.cpu_count() or 1
+        n_jobs = min(n_jobs, len(cbsas))
+        
+        if n_jobs <= 1:
+            for cbsa_id, cbsa_sales in zip(cbsas, cbsa_slices):
+                all_supertracts.extend(self._generate_cbsa_supertracts(
+                    cbsa_sales, cbsa_id, start_year, end_year
+                ))
+        else:
+            # Each worker builds its own generator once; tasks only ship the
+            # CBSA's sales slice. map() keeps results in CBSA order.
+            with ProcessPoolExecutor(
+                max_workers=n_jobs,
+                initializer=_init_supertract_worker,
+                initargs=(self.geographic_df, self.min_half_pairs)
+            ) as executor:
+                for records in executor.map(
+                    _generate_cbsa_supertracts_in_worker, cbsa_slices, cbsas,
+                    [start_year] * len(cbsas), [end_year] * len(cbsas)
+                ):
+                    all_supertracts.extend(records)
+        
+        return pd.DataFrame.from_records(
+            all_supertracts, columns=SUPERTRACT_COLUMNS
+        ).astype(SUPERTRACT_DTYPES)
@@ -2,14 +2,25 @@
 
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 import logging
 
-from .bmn_regression import run_bmn_for_supertract
+from ..data.ingestion import RepeatSalesArrays
+from ..geography.supertract import COMPONENT_TRACTS_DTYPE
+from .bmn_regression import BMNCache, run_bmn_for_supertracts
 from .weights import WeightCalculator
 
 logger = logging.getLogger(__name__)
 
+# Columns of the aggregate_to_city_level output
+CITY_RESULT_COLUMNS = ['cbsa_id', 'year', 'weighting_scheme', 'appreciation_rate',
+                       'n_supertracts', 'total_observations']
+CITY_INDEX_LEVELS = ['cbsa_id', 'year', 'weighting_scheme']
+
+# The series keys of the process_all_years output are categoricals, so the
+# index chaining and export group on their integer codes
+CITY_KEY_DTYPES = {'cbsa_id': 'category', 'weighting_scheme': 'category'}
+
 
 class CityLevelAggregator:
     """
@@ -32,12 +43,24 @@ class CityLevelAggregator:
         """
         self.weight_calculator = weight_calculator or WeightCalculator()
         self.supertract_results = {}
-        self.city_results = {}
+        # BMN coefficients per supertract composition, reused across years
+        # while the same repeat sales frame is passed in
+        self._bmn_cache = None
+        # City-level results of each aggregate_to_city_level call, flattened
+        # on demand into one frame (see city_results)
+        self._city_frames = []
+        self._city_df = None
+        # (weights with one column per scheme, failed schemes) per
+        # (cbsa_id, year), valid for the definitions and weighting frames
+        # they were computed from
+        self._weight_cache = {}
+        self._weight_cache_inputs = (None, None)
     
     def calculate_supertract_appreciation(self, 
                                         repeat_sales_df: pd.DataFrame,
                                         supertracts_df: pd.DataFrame,
-                                        year: int) -> pd.DataFrame:
+                                        year: int,
+                                        n_jobs: Optional[int] = 1) -> pd.DataFrame:
         """
         Calculate appreciation rates for all supertracts in a year.
         
@@ -49,6 +72,9 @@ class CityLevelAggregator:
             Supertract definitions
         year: int
             Year to calculate appreciation for
+        n_jobs: int, optional
+            Number of worker processes for the supertract regressions.
+            1 runs in-process; None uses all CPUs.
             
         Returns:
         --------
@@ -58,36 +84,82 @@ class CityLevelAggregator:
         logger.info(f"Calculating appreciation rates for year {year}")
         
         year_supertracts = supertracts_df[supertracts_df['year'] == year]
-        results = []
         
-        for _, row in year_supertracts.iterrows():
-            supertract_id = row['supertract_id']
-            component_tracts = row['component_tracts']
-            
-            # Run BMN regression for this supertract
-            appreciation_rate, _ = run_bmn_for_supertract(
-                repeat_sales_df, component_tracts, year
-            )
-            
-            # Count observations
-            n_obs = len(repeat_sales_df[
-                repeat_sales_df['census_tract_2010'].isin(component_tracts)
-            ])
-            
-            results.append({
-                'supertract_id': supertract_id,
-                'cbsa_id': row['cbsa_id'],
-                'appreciation_rate': appreciation_rate,
-                'n_observations': n_obs
-            })
+        # Count observations for every supertract at once: pairs per tract,
+        # summed over each supertract's component tracts. The Arrow list
+        # column is flattened in one step (values buffer + list lengths)
+        component_tracts = year_supertracts['component_tracts'].astype(
+            COMPONENT_TRACTS_DTYPE
+        )
+        tract_counts = repeat_sales_df['census_tract_2010'].value_counts()
+        mapping = pd.DataFrame({
+            'supertract_id': np.repeat(
+                year_supertracts['supertract_id'].to_numpy(),
+                component_tracts.list.len().to_numpy(dtype=np.int64)
+            ),
+            'component_tracts': component_tracts.list.flatten().to_numpy(dtype=object)
+        }).drop_duplicates()
+        n_obs_by_supertract = (
+            mapping['component_tracts'].map(tract_counts).fillna(0)
+            .groupby(mapping['supertract_id']).sum()
+            .astype(np.int64)
+        )
+        
+        # Run BMN regressions for all supertracts of the year in one batch
+        # (compositions already regressed for another year are not re-fit)
+        appreciation_rates = run_bmn_for_supertracts(
+            repeat_sales_df, component_tracts.tolist(), year,
+            cache=self._get_bmn_cache(repeat_sales_df), n_jobs=n_jobs
+        )
         
-        results_df = pd.DataFrame(results)
+        # The results are already columnar, so assemble the frame directly
+        results_df = pd.DataFrame({
+            'supertract_id': year_supertracts['supertract_id'].to_numpy(),
+            'cbsa_id': year_supertracts['cbsa_id'].to_numpy(),
+            'appreciation_rate': np.asarray(appreciation_rates, dtype=np.float64),
+            'n_observations': n_obs_by_supertract.reindex(
+                year_supertracts['supertract_id'], fill_value=0
+            ).to_numpy(dtype=np.int64)
+        })
         
         # Store for later use
         self.supertract_results[year] = results_df
         
         return results_df
     
+    def _get_bmn_cache(self, repeat_sales_df: pd.DataFrame,
+                       arrays: Optional[RepeatSalesArrays] = None) -> BMNCache:
+        """
+        BMN cache over repeat_sales_df, rebuilt when a new frame is passed
+        (from arrays, its repeat_sales_arrays, when given)
+        """
+        if self._bmn_cache is None or self._bmn_cache.repeat_sales_df is not repeat_sales_df:
+            self._bmn_cache = BMNCache(repeat_sales_df, arrays)
+        return self._bmn_cache
+    
+    def _cbsa_weights(self, schemes: List[str], cbsa_id: str,
+                      cbsa_definitions: pd.DataFrame, year: int,
+                      weighting_data: Optional[pd.DataFrame]) -> Tuple[pd.DataFrame, Set[str]]:
+        """
+        Weights for one CBSA and year, one column per scheme, and the
+        schemes among them that failed. Schemes not cached yet are computed
+        together by one calculate_scheme_weights call.
+        """
+        key = (cbsa_id, year)
+        weights, failed = self._weight_cache.get(key, (None, set()))
+        missing = [scheme for scheme in schemes
+                   if weights is None or scheme not in weights.columns]
+        if missing:
+            new_weights, new_failed = self.weight_calculator.calculate_scheme_weights(
+                cbsa_definitions, year, weighting_data, schemes=missing
+            )
+            weights = new_weights if weights is None else pd.concat(
+                [weights, new_weights], axis=1
+            )
+            failed = failed | set(new_failed)
+            self._weight_cache[key] = (weights, failed)
+        return weights[schemes], failed.intersection(schemes)
+    
     def aggregate_to_city_level(self,
                               supertract_appreciation: pd.DataFrame,
                               supertracts_df: pd.DataFrame,
@@ -121,76 +193,107 @@ class CityLevelAggregator:
         # Get unique CBSAs
         cbsas = supertract_appreciation['cbsa_id'].unique()
         
+        # Row positions per CBSA, computed once instead of a mask per CBSA
+        year_definitions = supertracts_df[supertracts_df['year'] == year]
+        appreciation_rows = supertract_appreciation.groupby(
+            'cbsa_id', sort=False, observed=True
+        ).indices
+        definition_rows = year_definitions.groupby(
+            'cbsa_id', sort=False, observed=True
+        ).indices
+        
+        # Cached weights are only reused while the definitions and weighting
+        # data are the same objects (frames are not expected to be mutated)
+        inputs = (supertracts_df, weighting_data)
+        if any(new is not old for new, old in zip(inputs, self._weight_cache_inputs)):
+            self._weight_cache = {}
+            self._weight_cache_inputs = inputs
+        
+        unknown = [scheme for scheme in weighting_schemes
+                   if scheme not in self.weight_calculator.schemes]
+        for scheme in unknown:
+            logger.error(f"Unknown weighting scheme: {scheme}")
+        known_schemes = [scheme for scheme in weighting_schemes if scheme not in unknown]
+        
         results = []
         
         for cbsa_id in cbsas:
             # Filter for this CBSA
-            cbsa_supertracts = supertract_appreciation[
-                supertract_appreciation['cbsa_id'] == cbsa_id
+            cbsa_supertracts = supertract_appreciation.iloc[
+                appreciation_rows.get(cbsa_id, [])
             ]
-            cbsa_definitions = supertracts_df[
-                (supertracts_df['cbsa_id'] == cbsa_id) & 
-                (supertracts_df['year'] == year)
+            cbsa_definitions = year_definitions.iloc[
+                definition_rows.get(cbsa_id, [])
             ]
             
-            # Calculate weights for each scheme
+            n_supertracts = len(cbsa_supertracts)
+            total_observations = cbsa_supertracts['n_observations'].sum()
+            
+            # Calculate the weights of all schemes at once
+            weights, failed = self._cbsa_weights(
+                known_schemes, cbsa_id, cbsa_definitions, year, weighting_data
+            )
+            for scheme in weights.columns.intersection(failed):
+                logger.error(f"Failed to calculate {scheme} weights for "
+                           f"CBSA {cbsa_id}, year {year}")
+            scheme_weights = weights.drop(columns=list(failed))
+            
+            # Align every scheme's weights with the appreciation rates in a
+            # single reindex (one column per scheme), then take all weighted
+            # averages in one matrix-vector product
+            aligned_weights = (
+                scheme_weights
+                .reindex(cbsa_supertracts['supertract_id']).fillna(0)
+                .to_numpy(dtype=np.float64)
+            )
+            weighted_appreciation = dict(zip(
+                scheme_weights,
+                aligned_weights.T @ cbsa_supertracts['appreciation_rate'].to_numpy(dtype=np.float64)
+            ))
+            
             for scheme in weighting_schemes:
-                try:
-                    weights = self.weight_calculator.calculate_weights(
-                        scheme, cbsa_definitions, year, weighting_data
-                    )
-                    
-                    # Align weights with appreciation rates
-                    aligned_weights = weights.reindex(
-                        cbsa_supertracts['supertract_id']
-                    ).fillna(0)
-                    
-                    # Calculate weighted average appreciation
-                    weighted_appreciation = np.sum(
-                        aligned_weights.values * 
-                        cbsa_supertracts['appreciation_rate'].values
-                    )
-                    
-                    results.append({
-                        'cbsa_id': cbsa_id,
-                        'year': year,
-                        'weighting_scheme': scheme,
-                        'appreciation_rate': weighted_appreciation,
-                        'n_supertracts': len(cbsa_supertracts),
-                        'total_observations': cbsa_supertracts['n_observations'].sum()
-                    })
-                    
-                except Exception as e:
-                    logger.error(f"Failed to calculate {scheme} weights for "
-                               f"CBSA {cbsa_id}, year {year}: {str(e)}")
-                    # Add zero appreciation as fallback
-                    results.append({
-                        'cbsa_id': cbsa_id,
-                        'year': year,
-                        'weighting_scheme': scheme,
-                        'appreciation_rate': 0.0,
-                        'n_supertracts': len(cbsa_supertracts),
-                        'total_observations': cbsa_supertracts['n_observations'].sum()
-                    })
+                # Failed schemes get zero appreciation as fallback
+                results.append((
+                    cbsa_id, year, scheme, float(weighted_appreciation.get(scheme, 0.0)),
+                    n_supertracts, total_observations
+                ))
         
-        results_df = pd.DataFrame(results)
+        results_df = pd.DataFrame.from_records(results, columns=CITY_RESULT_COLUMNS)
         
         # Store for later use
-        if year not in self.city_results:
-            self.city_results[year] = {}
-        for scheme in weighting_schemes:
-            scheme_results = results_df[results_df['weighting_scheme'] == scheme]
-            self.city_results[year][scheme] = scheme_results
+        self._city_frames.append(results_df)
+        self._city_df = None
         
         return results_df
     
+    @property
+    def city_results(self) -> pd.DataFrame:
+        """
+        All stored city-level results in one long-form frame indexed by
+        (cbsa_id, year, weighting_scheme). If a CBSA, year and scheme was
+        aggregated more than once, the latest result is kept.
+        """
+        if self._city_df is None:
+            if self._city_frames:
+                city_df = pd.concat(self._city_frames, ignore_index=True)
+            else:
+                city_df = pd.DataFrame(columns=CITY_RESULT_COLUMNS)
+            self._city_df = (
+                city_df.drop_duplicates(CITY_INDEX_LEVELS, keep='last')
+                .set_index(CITY_INDEX_LEVELS)
+                .sort_index()
+            )
+        return self._city_df
+    
     def process_all_years(self,
                          repeat_sales_df: pd.DataFrame,
                          supertracts_df: pd.DataFrame,
                          start_year: int,
                          end_year: int,
                          weighting_data: Optional[pd.DataFrame] = None,
-                         weighting_schemes: Optional[List[str]] = None) -> pd.DataFrame:
+                         weighting_schemes: Optional[List[str]] = None,
+                         n_jobs: Optional[int] = 1,
+                         repeat_sales_arrays: Optional[RepeatSalesArrays] = None) -> pd.DataFrame:
         """
         Process all years and generate city-level appreciation rates.
         
@@ -208,13 +311,29 @@ class CityLevelAggregator:
             Data for calculating weights
         weighting_schemes: List[str], optional
             List of weighting schemes to use
+        n_jobs: int, optional
+            Number of worker processes for the supertract regressions.
+            1 runs in-process; None uses all CPUs.
+        repeat_sales_arrays: RepeatSalesArrays, optional
+            Array view of repeat_sales_df (RepeatSalesProcessor.repeat_sales_arrays),
+            used instead of extracting the regression inputs again
             
         Returns:
         --------
         pd.DataFrame
-            All city-level appreciation rates
+            All city-level appreciation rates (cbsa_id and weighting_scheme
+            as categoricals)
         """
         all_results = []
+        cache = self._get_bmn_cache(repeat_sales_df, repeat_sales_arrays)
+        
+        # Regress every supertract composition of the period up front, so
+        # one worker pool serves all years (the yearly calls hit the cache)
+        if n_jobs != 1:
+            in_period = supertracts_df['year'].between(start_year, end_year)
+            cache.prefetch(
+                supertracts_df.loc[in_period, 'component_tracts'].tolist(), n_jobs
+            )
         
         for year in range(start_year, end_year + 1):
             logger.info(f"Processing year {year}")
@@ -232,7 +351,7 @@ class CityLevelAggregator:
             
             all_results.append(city_results)
         
-        return pd.concat(all_results, ignore_index=True)
+        return pd.concat(all_results, ignore_index=True).astype(CITY_KEY_DTYPES)
     
     def get_appreciation_matrix(self, cbsa_id: str, 
                               weighting_scheme: str) -> pd.DataFrame:
@@ -251,18 +370,18 @@ class CityLevelAggregator:
         pd.DataFrame
             Time series of appreciation rates
         """
-        data = []
-        
-        for year, year_results in self.city_results.items():
-            if weighting_scheme in year_results:
-                scheme_df = year_results[weighting_scheme]
-                cbsa_data = scheme_df[scheme_df['cbsa_id'] == cbsa_id]
-                
-                if not cbsa_data.empty:
-                    data.append({
-                        'year': year,
-                        'appreciation_rate': cbsa_data.iloc[0]['appreciation_rate'],
-                        'n_observations': cbsa_data.iloc[0]['total_observations']
-                    })
+        # One MultiIndex selection on the flattened results (already sorted
+        # by year within each CBSA and scheme)
+        city_df = self.city_results
+        try:
+            cbsa_data = city_df.xs(
+                (cbsa_id, weighting_scheme), level=('cbsa_id', 'weighting_scheme')
+            )
+        except KeyError:
+            cbsa_data = city_df.iloc[:0].droplevel(['cbsa_id', 'weighting_scheme'])
         
-        return pd.DataFrame(data).sort_values('year')
\ No newline at end of file
+        return pd.DataFrame({
+            'year': cbsa_data.index.to_numpy(),
+            'appreciation_rate': cbsa_data['appreciation_rate'].to_numpy(),
+            'n_observations': cbsa_data['total_observations'].to_numpy()
+        })
\ No newline at end of file
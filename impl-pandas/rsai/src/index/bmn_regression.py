@@ -2,13 +2,281 @@
 
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
-from typing import Dict, List, Tuple, Optional
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Tuple, Optional, Union
 import logging
-from scipy import sparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from scipy import linalg, sparse
+
+from ..data.ingestion import (
+    RepeatSalesArrays, check_sale_years, repeat_sales_arrays, sale_years
+)
+
+# statsmodels is slow to import and only run_regression's fallback fit
+# needs it, so it is imported there rather than at module load
+if TYPE_CHECKING:
+    from statsmodels.regression.linear_model import RegressionResults
 
 logger = logging.getLogger(__name__)
 
+# Smallest ratio of Cholesky factor diagonals (roughly 1/sqrt(cond(X'X)))
+# for which the normal-equations solve is trusted
+CHOLESKY_RATIO_TOL = 1e-6
+
+# Number of supertract regressions stacked into one batched solve (see
+# _supertract_coefficients_batch); bounds the (batch, K, K) X'X stack
+BMN_BATCH_SIZE = 256
+
+# Storage dtype of the sparse time-dummy design. Its entries are only -1/+1
+# and X'X holds integer pair counts, both exact in float32 (up to 2**24
+# pairs), so half the bytes of float64 are moved for X'X and X'y
+DESIGN_DTYPE = np.float32
+
+
+class BMNFit(NamedTuple):
+    """Coefficients-only BMN fit (see BMNRegression.fit_fast)"""
+    params: np.ndarray
+
+
+def _cholesky_factor(XtX: np.ndarray) -> Optional[Tuple[np.ndarray, bool]]:
+    """
+    Cholesky factor of X'X for linalg.cho_solve, or None if X'X is not
+    positive definite or too ill conditioned (see CHOLESKY_RATIO_TOL).
+    """
+    try:
+        factor = linalg.cho_factor(XtX)
+    except np.linalg.LinAlgError:
+        return None
+    diag = np.abs(np.diag(factor[0]))
+    return factor if diag.min() > diag.max() * CHOLESKY_RATIO_TOL else None
+
+
+class BMNResults:
+    """
+    OLS fit statistics of a full-rank BMN regression, named as on
+    statsmodels' RegressionResults (params, bse, nobs, df_model, df_resid,
+    ssr, rsquared, rsquared_adj, fvalue, f_pvalue, llf, aic, bic,
+    mse_resid). The parameter covariance is only solved for when bse or
+    cov_params() is first used.
+    """
+    
+    def __init__(self, params: np.ndarray, factor: Tuple[np.ndarray, bool],
+                 y: np.ndarray, ssr: float, k_constant: int):
+        self.params = params
+        self._factor = factor
+        self._normalized_cov_params = None
+        self._bse = None
+        
+        self.nobs = float(len(y))
+        self.k_constant = k_constant
+        self.df_model = float(len(params) - k_constant)
+        self.df_resid = float(len(y) - len(params))
+        self.ssr = ssr
+        
+        if k_constant:
+            centered = y - y.mean()
+            tss = float(centered @ centered)
+        else:
+            tss = float(y @ y)
+        self.rsquared = 1 - ssr / tss
+        self.rsquared_adj = 1 - (self.nobs - k_constant) / self.df_resid * (1 - self.rsquared)
+        self.mse_resid = ssr / self.df_resid
+        self.mse_model = (tss - ssr) / self.df_model if self.df_model else np.nan
+        self.fvalue = self.mse_model / self.mse_resid
+        
+        nobs2 = self.nobs / 2.0
+        self.llf = -nobs2 * np.log(2 * np.pi) - nobs2 * np.log(ssr / self.nobs) - nobs2
+        k_params = self.df_model + k_constant
+        self.aic = -2 * self.llf + 2 * k_params
+        self.bic = -2 * self.llf + np.log(self.nobs) * k_params
+    
+    @property
+    def f_pvalue(self) -> float:
+        from scipy import stats
+        return stats.f.sf(self.fvalue, self.df_model, self.df_resid)
+    
+    @property
+    def normalized_cov_params(self) -> np.ndarray:
+        """(X'X)^-1, solved from the Cholesky factor on first use"""
+        if self._normalized_cov_params is None:
+            self._normalized_cov_params = linalg.cho_solve(
+                self._factor, np.eye(len(self.params))
+            )
+        return self._normalized_cov_params
+    
+    def cov_params(self) -> np.ndarray:
+        """Nonrobust covariance of the coefficients"""
+        return self.normalized_cov_params * self.mse_resid
+    
+    @property
+    def bse(self) -> np.ndarray:
+        if self._bse is None:
+            self._bse = np.sqrt(np.diag(self.cov_params()))
+        return self._bse
+
+
+def _k_constant(X: sparse.csr_matrix, factor: Tuple[np.ndarray, bool]) -> int:
+    """
+    1 if the columns of X span a constant (explicitly, or implicitly as
+    when every pair starts in the base period), else 0, as statsmodels
+    determines k_constant.
+    """
+    ones = np.ones(X.shape[0])
+    resid = ones - X @ linalg.cho_solve(factor, np.asarray(X.T @ ones).ravel())
+    return int(resid @ resid <= 1e-16 * X.shape[0])
+
+
+def _ols_results(X: sparse.csr_matrix,
+                 y: np.ndarray) -> Union[BMNResults, 'RegressionResults']:
+    """
+    OLS results for the sparse design X.
+    
+    The coefficients come from the normal equations, formed from sparse X
+    in O(nnz) and solved by Cholesky, and the fit statistics from the
+    residuals, without building a statsmodels model on the dense N x K
+    design (see BMNResults), so the small per-supertract regressions never
+    touch statsmodels. Its pinv fit is only used when X'X is ill
+    conditioned (rank deficient) or there are no residual degrees of
+    freedom. Either way the results object has the usual statistics.
+    """
+    n_obs, n_params = X.shape
+    factor = None
+    if 0 < n_params < n_obs:
+        if X.dtype != np.float64 and n_obs >= 2 ** 24:
+            # Pair counts in X'X would no longer be exact in float32
+            X = X.astype(np.float64)
+        factor = _cholesky_factor((X.T @ X).toarray().astype(np.float64, copy=False))
+    
+    if factor is None:
+        import statsmodels.api as sm
+        return sm.OLS(y, X.toarray(order='F').astype(np.float64, copy=False)).fit()
+    
+    y = np.asarray(y, dtype=np.float64)
+    params = linalg.cho_solve(factor, np.asarray(X.T @ y).ravel())
+    resid = y - X @ params
+    return BMNResults(params, factor, y, float(resid @ resid), _k_constant(X, factor))
+
+
+def _solve_normal_equations(XtX: np.ndarray, Xty: np.ndarray,
+                            design: Callable[[], object], y: np.ndarray) -> np.ndarray:
+    """
+    Solve X'X b = X'y by Cholesky when well conditioned; otherwise (e.g. a
+    period without sales) return the minimum-norm lstsq solution, which is
+    what the pseudoinverse gives. design() returns X and is only called
+    for the fallback.
+    """
+    # The K x K system itself is solved in float64
+    XtX = XtX.astype(np.float64, copy=False)
+    if XtX.shape[0] == 0:
+        return np.zeros(0)
+    
+    factor = _cholesky_factor(XtX)
+    if factor is not None:
+        return linalg.cho_solve(factor, Xty)
+    
+    X = design()
+    X_dense = X.toarray(order='F') if sparse.issparse(X) else np.asarray(X)
+    return np.linalg.lstsq(X_dense.astype(np.float64, copy=False), y, rcond=None)[0]
+
+
+def _least_squares(X, y: np.ndarray) -> np.ndarray:
+    """
+    Least-squares coefficients of y on X (dense or sparse) via the normal
+    equations. X'X is only (periods x periods) and costs O(nnz) to form for
+    the sparse BMN design.
+    """
+    if X.dtype != np.float64 and X.shape[0] >= 2 ** 24:
+        # Pair counts in X'X would no longer be exact in float32
+        X = X.astype(np.float64)
+    
+    XtX = X.T @ X
+    XtX = XtX.toarray() if sparse.issparse(XtX) else np.asarray(XtX)
+    return _solve_normal_equations(XtX, np.asarray(X.T @ y).ravel(), lambda: X, y)
+
+
+def _dummy_entries(first_idx: np.ndarray, second_idx: np.ndarray,
+                   n_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rows of the BMN design with a -1 (first sale) and a +1 (second sale)
+    dummy. Pairs outside [0, n_periods) have neither and the base period
+    (offset 0) has no column. A same-period pair keeps only its +1 (the
+    second sale's dummy is written last, as in an element-wise fill).
+    """
+    in_range = (first_idx >= 0) & (second_idx < n_periods)
+    has_first = in_range & (first_idx > 0) & (first_idx != second_idx)
+    has_second = in_range & (second_idx > 0)
+    return has_first, has_second
+
+
+def _time_dummy_design(first_idx: np.ndarray, second_idx: np.ndarray,
+                       n_periods: int) -> sparse.csr_matrix:
+    """
+    BMN time-dummy design matrix from period offsets of each pair's sales.
+    
+    Row i has -1 in the column of the first sale's period and +1 in the
+    column of the second sale's period; the base period (offset 0) has no
+    column. Pairs outside [0, n_periods) get an all-zero row. Built from
+    COO triplets in one step (no per-row element assignment), stored as
+    DESIGN_DTYPE.
+    """
+    n_obs = len(first_idx)
+    rows = np.arange(n_obs)
+    has_first, has_second = _dummy_entries(first_idx, second_idx, n_periods)
+    
+    X = sparse.coo_matrix(
+        (np.concatenate([np.full(has_first.sum(), -1, dtype=DESIGN_DTYPE),
+                         np.ones(has_second.sum(), dtype=DESIGN_DTYPE)]),
+         (np.concatenate([rows[has_first], rows[has_second]]),
+          np.concatenate([first_idx[has_first] - 1, second_idx[has_second] - 1]))),
+        shape=(n_obs, n_periods - 1)
+    )
+    return X.tocsr()
+
+
+def _time_dummy_array(first_idx: np.ndarray, second_idx: np.ndarray,
+                      n_periods: int) -> np.ndarray:
+    """
+    _time_dummy_design as a dense float64 array, written into zeros by two
+    fancy-index assignments (no sparse intermediate or dtype copy). The
+    array is column-major, the layout LAPACK's least-squares and SVD
+    routines work on, so they need no transposed copy of it.
+    """
+    rows = np.arange(len(first_idx))
+    has_first, has_second = _dummy_entries(first_idx, second_idx, n_periods)
+    
+    X = np.zeros((len(first_idx), n_periods - 1), order='F')
+    X[rows[has_first], first_idx[has_first] - 1] = -1.0
+    X[rows[has_second], second_idx[has_second] - 1] = 1.0
+    return X
+
+
+def _time_dummy_normal_equations(first_idx: np.ndarray, second_idx: np.ndarray,
+                                 y: np.ndarray,
+                                 n_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    X'X and X'y of the _time_dummy_design, accumulated straight from the
+    period offsets with bincount (the design matrix is never built).
+    
+    Each -1/+1 dummy adds 1 to its diagonal entry of X'X and -/+y to its
+    entry of X'y; a pair with both dummies also adds -1 to the two
+    off-diagonal entries linking its periods.
+    """
+    k = n_periods - 1
+    has_first, has_second = _dummy_entries(first_idx, second_idx, n_periods)
+    first_cols = first_idx[has_first] - 1
+    second_cols = second_idx[has_second] - 1
+    
+    both = has_first & has_second
+    links = np.bincount(
+        (first_idx[both] - 1) * k + (second_idx[both] - 1), minlength=k * k
+    ).reshape(k, k)
+    XtX = np.diag(
+        np.bincount(first_cols, minlength=k) + np.bincount(second_cols, minlength=k)
+    ) - links - links.T
+    Xty = (np.bincount(second_cols, weights=y[has_second], minlength=k) -
+           np.bincount(first_cols, weights=y[has_first], minlength=k))
+    return XtX.astype(np.float64), Xty
+
 
 class BMNRegression:
     """
@@ -25,7 +293,8 @@ class BMNRegression:
     
     def prepare_regression_data(self, repeat_sales_df: pd.DataFrame,
                               start_year: int = None, 
-                              end_year: int = None) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+                              end_year: int = None,
+                              dense: bool = True) -> Tuple[np.ndarray, np.ndarray, List[int]]:
         """
         Prepare data for BMN regression by creating time dummy variables.
         
@@ -37,65 +306,52 @@ class BMNRegression:
             Start year for the analysis (if None, uses minimum year in data)
         end_year: int, optional
             End year for the analysis (if None, uses maximum year in data)
+        dense: bool
+            Return X as a dense float64 array (for statsmodels); if False,
+            X is returned as a scipy.sparse CSR matrix of DESIGN_DTYPE
             
         Returns:
         --------
         tuple
             (X matrix of time dummies, y vector of log price relatives, list of years)
         """
-        df = repeat_sales_df.copy()
-        
-        # Extract years from sale dates
-        df['first_year'] = df['first_sale_date'].dt.year
-        df['second_year'] = df['second_sale_date'].dt.year
+        # Sale years as int16 arrays (stored year columns are read as is;
+        # the input frame is neither copied nor modified)
+        first_years, second_years = sale_years(repeat_sales_df)
+        check_sale_years(first_years, second_years)
         
         # Determine time range
         if start_year is None:
-            start_year = df['first_year'].min()
+            start_year = int(first_years.min())
         if end_year is None:
-            end_year = df['second_year'].max()
+            end_year = int(second_years.max())
         
         years = list(range(start_year, end_year + 1))
         n_years = len(years)
-        n_obs = len(df)
-        
-        # Create sparse matrix for efficiency with large datasets
-        # Each row represents a repeat sale pair
-        # Columns are time dummies (excluding base period)
-        X = sparse.lil_matrix((n_obs, n_years - 1))
         
         # Set base period as first year
         self.base_period = start_year
         
-        # Fill the design matrix
-        for i, row in df.iterrows():
-            first_year_idx = row['first_year'] - start_year
-            second_year_idx = row['second_year'] - start_year
-            
-            # Skip if outside our time range
-            if first_year_idx < 0 or second_year_idx >= n_years:
-                continue
-            
-            # Set dummy variables
-            # -1 for first sale period, +1 for second sale period
-            if first_year_idx > 0:  # Not base period
-                X[i, first_year_idx - 1] = -1
-            if second_year_idx > 0:  # Not base period
-                X[i, second_year_idx - 1] = 1
-        
-        # Convert to dense array for statsmodels
-        X_dense = X.toarray()
+        # Each row represents a repeat sale pair; columns are time dummies
+        # (excluding base period), built directly from the year offsets
+        # (dense float64 for statsmodels)
+        build_design = _time_dummy_array if dense else _time_dummy_design
+        X = build_design(
+            first_years.astype(np.int64) - start_year,
+            second_years.astype(np.int64) - start_year,
+            n_years
+        )
         
         # Log price relatives
-        y = df['log_price_relative'].values
+        y = np.ascontiguousarray(repeat_sales_df['log_price_relative'].to_numpy(), dtype=np.float64)
         
         self.time_periods = years
         
-        return X_dense, y, years
+        return X, y, years
     
     def run_regression(self, repeat_sales_df: pd.DataFrame,
                       start_year: int = None,
-                      end_year: int = None) -> sm.regression.linear_model.RegressionResults:
+                      end_year: int = None) -> Union[BMNResults, 'RegressionResults']:
         """
         Run the BMN regression on repeat sales data.
         
@@ -110,13 +366,16 @@ class BMNRegression:
             
         Returns:
         --------
-        RegressionResults
-            Statsmodels regression results object
+        BMNResults or RegressionResults
+            Fit statistics with statsmodels' attribute names (a statsmodels
+            results object for rank-deficient or very small designs)
         """
         logger.info("Running BMN regression")
         
-        # Prepare data
-        X, y, years = self.prepare_regression_data(repeat_sales_df, start_year, end_year)
+        # Prepare data (sparse design, densified only for the results)
+        X, y, years = self.prepare_regression_data(
+            repeat_sales_df, start_year, end_year, dense=False
+        )
         
         # Check for sufficient observations
         if len(y) == 0:
@@ -127,8 +386,7 @@ class BMNRegression:
         
         # Run OLS regression (no constant term in BMN)
         try:
-            model = sm.OLS(y, X)
-            self.results = model.fit()
+            self.results = _ols_results(X, y)
             
             logger.info(f"Regression completed. R-squared: {self.results.rsquared:.4f}")
             
@@ -141,6 +399,41 @@ class BMNRegression:
             logger.error(f"Regression failed: {str(e)}")
             raise
     
+    def fit_fast(self, repeat_sales_df: pd.DataFrame,
+                 start_year: int = None,
+                 end_year: int = None) -> BMNFit:
+        """
+        Estimate the BMN coefficients only, without statsmodels.
+        
+        Solves the sparse design's normal equations directly (no covariance,
+        rank check or fit statistics). The result supports
+        get_coefficient_for_year and get_appreciation_rates; use
+        run_regression when standard errors or diagnostics are needed.
+        
+        Parameters:
+        -----------
+        repeat_sales_df: pd.DataFrame
+            DataFrame with repeat sales pairs
+        start_year: int, optional
+            Start year for the analysis
+        end_year: int, optional
+            End year for the analysis
+            
+        Returns:
+        --------
+        BMNFit
+            Fit holding the coefficient vector as params
+        """
+        X, y, years = self.prepare_regression_data(
+            repeat_sales_df, start_year, end_year, dense=False
+        )
+        
+        if len(y) == 0:
+            raise ValueError("No observations available for regression")
+        
+        self.results = BMNFit(params=_least_squares(X, y))
+        return self.results
+    
     def get_index_values(self, base_value: float = 100.0) -> pd.DataFrame:
         """
         Extract index values from regression results.
@@ -158,37 +451,18 @@ class BMNRegression:
         if self.results is None:
             raise ValueError("Must run regression before extracting index values")
         
-        # Get coefficients and standard errors
-        coefficients = self.results.params
-        std_errors = self.results.bse
-        
-        # Build index series
-        index_data = []
-        
-        # Base period
-        index_data.append({
-            'year': self.base_period,
-            'coefficient': 0.0,  # Base period coefficient is 0
-            'std_error': 0.0,
-            'index_value': base_value
+        # Coefficients and standard errors of every period, base period
+        # (coefficient 0, index value base_value) first
+        coefficients = np.concatenate([[0.0], np.asarray(self.results.params, dtype=np.float64)])
+        std_errors = np.concatenate([[0.0], np.asarray(self.results.bse, dtype=np.float64)])
+        
+        # Index value is base * exp(coefficient)
+        return pd.DataFrame({
+            'year': np.asarray(self.time_periods, dtype=np.int64),
+            'coefficient': coefficients,
+            'std_error': std_errors,
+            'index_value': base_value * np.exp(coefficients)
         })
-        
-        # Other periods
-        for i, year in enumerate(self.time_periods[1:]):
-            coef = coefficients[i]
-            se = std_errors[i]
-            
-            # Index value is base * exp(coefficient)
-            index_value = base_value * np.exp(coef)
-            
-            index_data.append({
-                'year': year,
-                'coefficient': coef,
-                'std_error': se,
-                'index_value': index_value
-            })
-        
-        return pd.DataFrame(index_data)
     
     def get_appreciation_rates(self) -> pd.DataFrame:
         """
@@ -205,18 +479,11 @@ class BMNRegression:
         # Get coefficients
         coefficients = np.concatenate([[0.0], self.results.params])  # Include base period
         
-        # Calculate year-over-year differences
-        appreciation_rates = []
-        
-        for i in range(1, len(self.time_periods)):
-            rate = coefficients[i] - coefficients[i-1]
-            
-            appreciation_rates.append({
-                'year': self.time_periods[i],
-                'appreciation_rate': rate
-            })
-        
-        return pd.DataFrame(appreciation_rates)
+        # Year-over-year differences
+        return pd.DataFrame({
+            'year': np.asarray(self.time_periods[1:], dtype=np.int64),
+            'appreciation_rate': np.diff(coefficients)
+        })
     
     def get_coefficient_for_year(self, year: int) -> float:
         """
@@ -277,7 +544,9 @@ class BMNRegression:
 
 def run_bmn_for_supertract(repeat_sales_df: pd.DataFrame,
                           supertract_tracts: List[str],
-                          year: int) -> Tuple[float, float]:
+                          year: int,
+                          cache: Optional['BMNCache'] = None,
+                          bmn: Optional[BMNRegression] = None) -> Tuple[float, float]:
     """
     Convenience function to run BMN regression for a supertract and extract appreciation.
     
@@ -289,12 +558,30 @@ def run_bmn_for_supertract(repeat_sales_df: pd.DataFrame,
         List of census tracts in the supertract
     year: int
         Year to calculate appreciation for
+    cache: BMNCache, optional
+        Cache over repeat_sales_df; the supertract's pairs are then read
+        from its per-tract groups instead of scanning the frame
+    bmn: BMNRegression, optional
+        Regression object to fit with (its results and periods are
+        replaced), so loops over supertracts can reuse one instance
+        instead of constructing one per call
         
     Returns:
     --------
     tuple
         (appreciation_rate, coefficient_year_t)
     """
+    if cache is not None and cache.repeat_sales_df is repeat_sales_df:
+        coefficients = cache.get_coefficients(supertract_tracts)
+        if coefficients is None:
+            return 0.0, 0.0
+        start_year, coefs = coefficients
+        # Both year and year - 1 must be regression periods
+        if year - 1 < start_year or year - start_year >= len(coefs):
+            return 0.0, 0.0
+        return (float(coefs[year - start_year] - coefs[year - 1 - start_year]),
+                float(coefs[year - start_year]))
+    
     # Filter for supertract
     supertract_sales = repeat_sales_df[
         repeat_sales_df['census_tract_2010'].isin(supertract_tracts)
@@ -305,10 +592,11 @@ def run_bmn_for_supertract(repeat_sales_df: pd.DataFrame,
         return 0.0, 0.0
     
     # Run regression
-    bmn = BMNRegression()
+    if bmn is None:
+        bmn = BMNRegression()
     
     try:
-        bmn.run_regression(supertract_sales)
+        bmn.fit_fast(supertract_sales)
         
         # Get coefficients for current and previous year
         coef_t = bmn.get_coefficient_for_year(year)
@@ -321,4 +609,391 @@ def run_bmn_for_supertract(repeat_sales_df: pd.DataFrame,
         
     except Exception as e:
         logger.error(f"Regression failed for supertract: {str(e)}")
-        return 0.0, 0.0
\ No newline at end of file
+        return 0.0, 0.0
+
+
+def _bmn_coefficients(first_years: np.ndarray, second_years: np.ndarray,
+                      log_price_relatives: np.ndarray) -> Tuple[int, np.ndarray]:
+    """
+    BMN coefficients from one supertract's pairs.
+    
+    Solves the same time-dummy regression as BMNRegression.prepare_regression_data
+    (base period = earliest first-sale year) through its normal equations,
+    without the statsmodels overhead. Returns the base year
+    and the coefficient of every period from it (0 for the base period).
+    """
+    start_year = int(first_years.min())
+    end_year = int(second_years.max())
+    
+    # -1 for first sale period, +1 for second sale period (base period
+    # omitted); the normal equations are accumulated without building X,
+    # which is only needed if the system is ill conditioned
+    first_idx = first_years.astype(np.int64) - start_year
+    second_idx = second_years.astype(np.int64) - start_year
+    n_periods = end_year - start_year + 1
+    XtX, Xty = _time_dummy_normal_equations(
+        first_idx, second_idx, log_price_relatives, n_periods
+    )
+    
+    params = _solve_normal_equations(
+        XtX, Xty, lambda: _time_dummy_design(first_idx, second_idx, n_periods),
+        log_price_relatives
+    )
+    return start_year, np.concatenate([[0.0], params])
+
+
+def _supertract_coefficients(first_years: np.ndarray, second_years: np.ndarray,
+                             log_price_relatives: np.ndarray,
+                             tract_slices: Dict[str, slice],
+                             tracts: frozenset) -> Optional[Tuple[int, np.ndarray]]:
+    """
+    _bmn_coefficients over the pairs of a set of tracts (None on failure).
+    The arrays are grouped by tract, so each tract is one contiguous slice.
+    """
+    # Tracts in sorted order, so the pair order does not depend on set
+    # iteration order
+    slices = [tract_slices[t] for t in sorted(tracts) if t in tract_slices]
+    if not slices:
+        logger.warning(f"No sales data for supertract with tracts {sorted(tracts)}")
+        return None
+    
+    def gather(values: np.ndarray) -> np.ndarray:
+        return values[slices[0]] if len(slices) == 1 else np.concatenate(
+            [values[rows] for rows in slices]
+        )
+    
+    try:
+        return _bmn_coefficients(
+            gather(first_years), gather(second_years), gather(log_price_relatives)
+        )
+    except np.linalg.LinAlgError as e:
+        logger.error(f"Regression failed for supertract: {str(e)}")
+        return None
+
+
+def _batch_coefficients(first_years: np.ndarray, second_years: np.ndarray,
+                        log_price_relatives: np.ndarray,
+                        lengths: np.ndarray) -> List[Optional[Tuple[int, np.ndarray]]]:
+    """
+    _bmn_coefficients for consecutive groups of pairs (group i is the next
+    lengths[i] entries of the arrays), solved together.
+    
+    Every group's X'X and X'y are accumulated by one bincount into a
+    (groups, K, K) stack, K the most periods of any group; a group with
+    fewer periods gets an identity block for the columns it does not
+    have (its coefficients there solve to 0). One stacked Cholesky then
+    applies the CHOLESKY_RATIO_TOL check to each group and one stacked
+    linalg.solve gives the coefficients. A group that fails the check
+    (e.g. a period without sales) gets None, for the caller to solve
+    through _bmn_coefficients' fallback.
+    """
+    n_groups = len(lengths)
+    group_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    group = np.repeat(np.arange(n_groups), lengths)
+    
+    start_years = np.minimum.reduceat(first_years, group_starts).astype(np.int64)
+    n_params = np.maximum.reduceat(second_years, group_starts).astype(np.int64) - start_years
+    k = int(n_params.max())
+    if k == 0:
+        # Every group has a single period: only the base coefficient
+        return [(int(start_year), np.zeros(1)) for start_year in start_years]
+    
+    # Period offsets from each group's base year; as in _dummy_entries
+    # (every pair is in its group's range)
+    first_idx = first_years.astype(np.int64) - start_years[group]
+    second_idx = second_years.astype(np.int64) - start_years[group]
+    has_first = (first_idx > 0) & (first_idx != second_idx)
+    has_second = second_idx > 0
+    both = has_first & has_second
+    
+    first_cols = group[has_first] * k + (first_idx[has_first] - 1)
+    second_cols = group[has_second] * k + (second_idx[has_second] - 1)
+    counts = (np.bincount(first_cols, minlength=n_groups * k) +
+              np.bincount(second_cols, minlength=n_groups * k)).reshape(n_groups, k)
+    links = np.bincount(
+        (group[both] * k + (first_idx[both] - 1)) * k + (second_idx[both] - 1),
+        minlength=n_groups * k * k
+    ).reshape(n_groups, k, k)
+    Xty = (np.bincount(second_cols, weights=log_price_relatives[has_second],
+                       minlength=n_groups * k) -
+           np.bincount(first_cols, weights=log_price_relatives[has_first],
+                       minlength=n_groups * k)).reshape(n_groups, k)
+    
+    # Identity block for the columns past each group's own periods
+    in_group = np.arange(k) < n_params[:, None]
+    XtX = -(links + links.transpose(0, 2, 1)).astype(np.float64)
+    XtX.reshape(n_groups, k * k)[:, ::k + 1] += np.where(in_group, counts, 1)
+    
+    # A period without sales (zero count) is singular; the rest are
+    # checked on their Cholesky factors
+    solvable = ~np.any(in_group & (counts == 0), axis=1)
+    if solvable.any():
+        try:
+            factors = np.linalg.cholesky(XtX[solvable])
+        except np.linalg.LinAlgError:
+            # Some group is not positive definite: factor one at a time
+            factors = np.zeros((int(solvable.sum()), k, k))
+            for j, i in enumerate(np.flatnonzero(solvable).tolist()):
+                try:
+                    factors[j] = np.linalg.cholesky(XtX[i])
+                except np.linalg.LinAlgError:
+                    pass
+        factor_diag = np.abs(np.diagonal(factors, axis1=1, axis2=2))
+        masked = in_group[solvable]
+        well_conditioned = (
+            np.where(masked, factor_diag, np.inf).min(axis=1) >
+            np.where(masked, factor_diag, 0.0).max(axis=1) * CHOLESKY_RATIO_TOL
+        )
+        solvable[np.flatnonzero(solvable)[~well_conditioned]] = False
+    
+    results = [None] * n_groups
+    if solvable.any():
+        params = np.linalg.solve(XtX[solvable], Xty[solvable][..., None])[..., 0]
+        for i, coefs in zip(np.flatnonzero(solvable).tolist(), params):
+            results[i] = (int(start_years[i]),
+                          np.concatenate([[0.0], coefs[:n_params[i]]]))
+    return results
+
+
+def _supertract_coefficients_batch(first_years: np.ndarray, second_years: np.ndarray,
+                                   log_price_relatives: np.ndarray,
+                                   tract_slices: Dict[str, slice],
+                                   keys: List[frozenset]) -> List[Optional[Tuple[int, np.ndarray]]]:
+    """
+    _supertract_coefficients for many tract sets, with the well-conditioned
+    regressions solved together by _batch_coefficients in batches of
+    BMN_BATCH_SIZE tract sets; the others go through
+    _supertract_coefficients one at a time.
+    """
+    results = [None] * len(keys)
+    fallback = []
+    for batch_start in range(0, len(keys), BMN_BATCH_SIZE):
+        batch = range(batch_start, min(batch_start + BMN_BATCH_SIZE, len(keys)))
+        
+        # Rows of each tract set: its tracts' slices in sorted tract order,
+        # as _supertract_coefficients gathers them
+        positions, slices = [], []
+        for i in batch:
+            key_slices = [tract_slices[t] for t in sorted(keys[i]) if t in tract_slices]
+            if key_slices:
+                positions.append(i)
+                slices.append(key_slices)
+            else:
+                fallback.append(i)
+        if not positions:
+            continue
+        
+        slice_starts = np.array([sl.start for key_slices in slices for sl in key_slices])
+        slice_lengths = np.array([sl.stop - sl.start for key_slices in slices for sl in key_slices])
+        lengths = np.array([sum(sl.stop - sl.start for sl in key_slices) for key_slices in slices])
+        offsets = np.cumsum(slice_lengths) - slice_lengths
+        rows = np.arange(slice_lengths.sum()) + np.repeat(slice_starts - offsets, slice_lengths)
+        
+        batch_results = _batch_coefficients(
+            first_years[rows], second_years[rows], log_price_relatives[rows], lengths
+        )
+        for i, coefficients in zip(positions, batch_results):
+            if coefficients is None:
+                fallback.append(i)
+            results[i] = coefficients
+    
+    for i in sorted(fallback):
+        results[i] = _supertract_coefficients(
+            first_years, second_years, log_price_relatives, tract_slices, keys[i]
+        )
+    return results
+
+
+# Per-process regression inputs used by BMN worker processes (see
+# BMNCache.prefetch with n_jobs > 1)
+_worker_arrays = None
+
+
+def _init_bmn_worker(first_years: np.ndarray, second_years: np.ndarray,
+                     log_price_relatives: np.ndarray, tract_slices: Dict[str, slice]):
+    """Keep the regression inputs once per worker process"""
+    global _worker_arrays
+    _worker_arrays = (first_years, second_years, log_price_relatives, tract_slices)
+
+
+def _supertract_coefficients_in_worker(
+        keys: List[frozenset]) -> List[Optional[Tuple[int, np.ndarray]]]:
+    """Worker-process entry point for one chunk of tract sets"""
+    return _supertract_coefficients_batch(*_worker_arrays, keys)
+
+
+class BMNCache:
+    """
+    Memoized BMN regressions over one repeat sales frame.
+    
+    A supertract's coefficients depend only on its set of component tracts,
+    not on the year asked for, so each distinct tract set is regressed once
+    and every year's appreciation is read from the cached coefficients.
+    Compositions that recur across years hit the cache.
+    """
+    
+    def __init__(self, repeat_sales_df: pd.DataFrame,
+                 arrays: Optional[RepeatSalesArrays] = None):
+        """
+        Initialize the cache.
+        
+        Parameters:
+        -----------
+        repeat_sales_df: pd.DataFrame
+            Repeat sales data all regressions are run on
+        arrays: Optional[RepeatSalesArrays]
+            repeat_sales_arrays(repeat_sales_df), if already extracted
+            (e.g. RepeatSalesProcessor.repeat_sales_arrays)
+        """
+        self.repeat_sales_df = repeat_sales_df
+        if arrays is None:
+            arrays = repeat_sales_arrays(repeat_sales_df)
+        # Regression inputs reordered so each tract's pairs are contiguous
+        # (a stable sort keeps frame order within a tract); a supertract
+        # then reads slices instead of scanning or fancy-indexing the frame
+        codes, tracts = arrays.tract_code, arrays.tracts
+        order = np.argsort(codes, kind='stable')
+        self._first_years = arrays.first_year[order]
+        self._second_years = arrays.second_year[order]
+        self._log_price_relatives = arrays.log_price_relative[order]
+        
+        # Pairs without a tract (code -1) sort first and belong to no slice;
+        # tracts without pairs (unused categories) get no slice either
+        counts = np.bincount(codes[codes >= 0], minlength=len(tracts))
+        ends = np.cumsum(counts) + np.count_nonzero(codes < 0)
+        starts = ends - counts
+        self._tract_slices = {
+            tract: slice(start, end)
+            for tract, start, end, count in zip(tracts, starts.tolist(), ends.tolist(),
+                                                counts.tolist())
+            if count
+        }
+        self._coefficients = {}
+    
+    def get_coefficients(self, supertract_tracts: List[str]) -> Optional[Tuple[int, np.ndarray]]:
+        """
+        BMN coefficients for a set of tracts.
+        
+        Parameters:
+        -----------
+        supertract_tracts: List[str]
+            Component census tracts of the supertract
+            
+        Returns:
+        --------
+        tuple or None
+            (base year, coefficient per period from the base year), or None
+            if the tracts have no sales or the regression failed
+        """
+        key = frozenset(supertract_tracts)
+        if key not in self._coefficients:
+            self._coefficients[key] = _supertract_coefficients(
+                self._first_years, self._second_years, self._log_price_relatives,
+                self._tract_slices, key
+            )
+        return self._coefficients[key]
+    
+    def prefetch(self, supertract_tracts: List[List[str]], n_jobs: Optional[int] = 1):
+        """
+        Regress every tract set not yet cached, optionally in parallel.
+        
+        Parameters:
+        -----------
+        supertract_tracts: List[List[str]]
+            Component census tracts of each supertract
+        n_jobs: int, optional
+            Number of worker processes (the regressions are independent).
+            1 runs in-process; None uses all CPUs.
+        """
+        missing = list(dict.fromkeys(
+            key for key in map(frozenset, supertract_tracts)
+            if key not in self._coefficients
+        ))
+        
+        if n_jobs is None:
+            n_jobs = os.cpu_count() or 1
+        n_jobs = min(n_jobs, len(missing))
+        
+        if n_jobs <= 1:
+            self._coefficients.update(zip(missing, _supertract_coefficients_batch(
+                self._first_years, self._second_years, self._log_price_relatives,
+                self._tract_slices, missing
+            )))
+            return
+        
+        # Workers receive the NumPy arrays once (no pandas in the workers);
+        # tasks only ship chunks of tract sets, each solved as batches.
+        # map() keeps results in key order.
+        chunk_size = max(1, -(-len(missing) // (4 * n_jobs)))
+        chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_bmn_worker,
+            initargs=(self._first_years, self._second_years,
+                      self._log_price_relatives, self._tract_slices)
+        ) as executor:
+            for chunk, coefficients in zip(chunks, executor.map(
+                _supertract_coefficients_in_worker, chunks
+            )):
+                self._coefficients.update(zip(chunk, coefficients))
+    
+    def get_appreciation(self, supertract_tracts: List[str], year: int) -> float:
+        """
+        Appreciation rate for year (coefficient difference year vs year - 1).
+        
+        Returns 0 when the tracts have no usable regression or year and
+        year - 1 are not both regression periods.
+        """
+        coefficients = self.get_coefficients(supertract_tracts)
+        if coefficients is None:
+            return 0.0
+        
+        start_year, coefs = coefficients
+        
+        # Both year and year - 1 must be regression periods
+        if year - 1 < start_year or year - start_year >= len(coefs):
+            return 0.0
+        
+        return float(coefs[year - start_year] - coefs[year - 1 - start_year])
+
+
+def run_bmn_for_supertracts(repeat_sales_df: pd.DataFrame,
+                            supertract_tracts: List[List[str]],
+                            year: int,
+                            cache: Optional[BMNCache] = None,
+                            n_jobs: Optional[int] = 1) -> np.ndarray:
+    """
+    Run BMN regressions for many supertracts and extract appreciation rates.
+    
+    Equivalent to calling run_bmn_for_supertract for each supertract, but
+    sale years and log price relatives are grouped by tract and
+    extracted once for all of them, and each distinct tract set is
+    regressed only once.
+    
+    Parameters:
+    -----------
+    repeat_sales_df: pd.DataFrame
+        All repeat sales data
+    supertract_tracts: List[List[str]]
+        Component census tracts of each supertract
+    year: int
+        Year to calculate appreciation for
+    cache: BMNCache, optional
+        Cache over repeat_sales_df to reuse across calls (e.g. years)
+    n_jobs: int, optional
+        Number of worker processes for the regressions not yet cached.
+        1 runs in-process; None uses all CPUs.
+        
+    Returns:
+    --------
+    np.ndarray
+        Appreciation rates aligned with supertract_tracts
+    """
+    if cache is None or cache.repeat_sales_df is not repeat_sales_df:
+        cache = BMNCache(repeat_sales_df)
+    cache.prefetch(supertract_tracts, n_jobs)
+    
+    return np.array(
+        [cache.get_appreciation(tracts, year) for tracts in supertract_tracts],
+        dtype=np.float64
+    )
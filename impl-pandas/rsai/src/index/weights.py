@@ -2,17 +2,114 @@
 
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional
-from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from abc import ABC
 import logging
+from scipy import sparse
 
 logger = logging.getLogger(__name__)
 
 
+def tract_membership(supertract_data: pd.DataFrame, year: int) -> pd.DataFrame:
+    """
+    Long-form supertract membership for one year.
+    
+    Parameters:
+    -----------
+    supertract_data: pd.DataFrame
+        DataFrame with supertract information
+    year: int
+        Year of the supertracts
+        
+    Returns:
+    --------
+    pd.DataFrame
+        One row per (supertract_id, census_tract_2010) component pair
+    """
+    year_data = supertract_data[supertract_data['year'] == year]
+    membership = (
+        year_data[['supertract_id', 'component_tracts']]
+        .explode('component_tracts')
+        .rename(columns={'component_tracts': 'census_tract_2010'})
+    )
+    return membership.dropna().drop_duplicates()
+
+
+def index_weighting_data(weighting_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-tract totals of the numeric weighting columns, indexed once.
+    
+    Parameters:
+    -----------
+    weighting_df: pd.DataFrame
+        Weighting data with year and census_tract_2010 columns
+        
+    Returns:
+    --------
+    pd.DataFrame
+        Column sums with a sorted (year, census_tract_2010) MultiIndex
+    """
+    return (
+        weighting_df.groupby(['year', 'census_tract_2010'], observed=True)
+        .sum(numeric_only=True)
+        .sort_index()
+    )
+
+
+def _tract_totals(weighting_df: pd.DataFrame, year: int, column: str,
+                  weighting_index: Optional[pd.DataFrame] = None) -> pd.Series:
+    """Sum of a weighting column per census tract for one year"""
+    if weighting_index is not None:
+        if column not in weighting_index.columns:
+            raise KeyError(column)
+        try:
+            return weighting_index.xs(year, level='year')[column]
+        except KeyError:
+            return weighting_index[column].iloc[:0].droplevel('year')
+    year_rows = weighting_df[weighting_df['year'] == year]
+    return year_rows.groupby('census_tract_2010', observed=True)[column].sum()
+
+
+def _sum_over_tracts(supertract_data: pd.DataFrame, year: int,
+                     tract_values: pd.DataFrame,
+                     membership: pd.DataFrame) -> Tuple[pd.Index, np.ndarray]:
+    """
+    Sum every column of tract-level values over each supertract's tracts.
+    
+    The membership is turned into one sparse (supertract x tract)
+    incidence matrix, so all columns are summed by a single product.
+    Tracts missing from tract_values (or NaN values) count as 0.
+    
+    Returns:
+    --------
+    tuple
+        (supertract_id index in supertract_data order,
+         totals array of shape (n_supertracts, n_columns))
+    """
+    year_ids = supertract_data.loc[supertract_data['year'] == year, 'supertract_id'].to_numpy()
+    codes, unique_ids = pd.factorize(year_ids)
+    supertract_pos = pd.Index(unique_ids).get_indexer(membership['supertract_id'])
+    tract_pos = pd.Index(tract_values.index.to_numpy(dtype=object)).get_indexer(
+        membership['census_tract_2010'].to_numpy(dtype=object)
+    )
+    
+    known = (supertract_pos >= 0) & (tract_pos >= 0)
+    incidence = sparse.csr_matrix(
+        (np.ones(np.count_nonzero(known)), (supertract_pos[known], tract_pos[known])),
+        shape=(len(unique_ids), len(tract_values))
+    )
+    totals = incidence @ tract_values.to_numpy(dtype=np.float64, na_value=0.0)
+    return pd.Index(year_ids, name='supertract_id'), totals[codes]
+
+
 class WeightingScheme(ABC):
-    """Abstract base class for weighting schemes"""
+    """
+    Abstract base class for weighting schemes.
+    
+    Subclasses implement raw_weights (unnormalized weights), which
+    calculate_weights normalizes, or override calculate_weights directly.
+    """
     
-    @abstractmethod
     def calculate_weights(self, supertract_data: pd.DataFrame, 
                          year: int, **kwargs) -> pd.Series:
         """
@@ -32,155 +129,154 @@ class WeightingScheme(ABC):
         pd.Series
             Series with supertract_id as index and weights as values
         """
-        pass
+        return self.normalize_weights(self.raw_weights(supertract_data, year, **kwargs))
+    
+    def raw_weights(self, supertract_data: pd.DataFrame,
+                    year: int, **kwargs) -> pd.Series:
+        """Unnormalized weights, indexed by supertract_id in supertract_data order"""
+        raise NotImplementedError(
+            f"{type(self).__name__} must implement raw_weights or calculate_weights"
+        )
+    
+    def sum_over_tracts(self, supertract_data: pd.DataFrame, year: int,
+                        tract_values: pd.Series,
+                        membership: Optional[pd.DataFrame] = None) -> pd.Series:
+        """
+        Sum tract-level values over each supertract's component tracts.
+        
+        One pass over the long-form membership (see _sum_over_tracts),
+        wrapped in a Series once, instead of a filter of the tract data
+        per supertract.
+        
+        Parameters:
+        -----------
+        supertract_data: pd.DataFrame
+            DataFrame with supertract information
+        year: int
+            Year of the supertracts
+        tract_values: pd.Series
+            Values indexed by census tract (tracts not present count as 0)
+        membership: pd.DataFrame, optional
+            Precomputed tract_membership(supertract_data, year)
+            
+        Returns:
+        --------
+        pd.Series
+            Totals indexed by supertract_id, in supertract_data order
+        """
+        if membership is None:
+            membership = tract_membership(supertract_data, year)
+        
+        year_ids, totals = _sum_over_tracts(
+            supertract_data, year, tract_values.to_frame(), membership
+        )
+        return pd.Series(totals[:, 0], index=year_ids)
     
     def normalize_weights(self, weights: pd.Series) -> pd.Series:
         """Ensure weights sum to 1"""
-        weight_sum = weights.sum()
+        values = weights.to_numpy(dtype=np.float64)
+        weight_sum = values.sum()
         if weight_sum == 0:
             logger.warning("All weights are zero, using equal weights")
-            return pd.Series(1.0 / len(weights), index=weights.index)
-        return weights / weight_sum
+            return pd.Series(np.full(len(values), 1.0 / len(values)), index=weights.index)
+        return pd.Series(values * (1.0 / weight_sum), index=weights.index)
 
 
 class SampleWeighting(WeightingScheme):
     """Sample-based weighting using half-pairs count"""
     
-    def calculate_weights(self, supertract_data: pd.DataFrame, 
-                         year: int, **kwargs) -> pd.Series:
-        """Calculate weights based on share of half-pairs"""
+    def raw_weights(self, supertract_data: pd.DataFrame,
+                    year: int, **kwargs) -> pd.Series:
+        """Weights based on half-pairs count"""
         year_data = supertract_data[supertract_data['year'] == year]
         
         if 'half_pairs_count' not in year_data.columns:
             raise ValueError("half_pairs_count column required for sample weighting")
         
-        weights = year_data.set_index('supertract_id')['half_pairs_count']
-        return self.normalize_weights(weights)
+        return year_data.set_index('supertract_id')['half_pairs_count']
 
 
-class ValueWeighting(WeightingScheme):
-    """Value-based (Laspeyres) weighting using housing values"""
+class TractSumWeighting(WeightingScheme):
+    """
+    Base class for weightings that sum one tract-level column of the
+    weighting data over each supertract's component tracts.
+    """
     
-    def calculate_weights(self, supertract_data: pd.DataFrame, 
-                         year: int, **kwargs) -> pd.Series:
-        """Calculate weights based on aggregate housing value"""
+    # Scheme name used in error messages
+    label = 'tract'
+    # WeightCalculator.calculate_scheme_weights sums the tract_values of
+    # fusable schemes in one shared pass instead of calling the scheme;
+    # subclasses overriding raw_weights or calculate_weights set it to False
+    fusable = True
+    
+    def __init__(self, column: str):
+        self.column = column
+    
+    def values_year(self, year: int) -> int:
+        """Year of the weighting data used for supertracts of year"""
+        return year
+    
+    def tract_values(self, year: int, **kwargs) -> pd.Series:
+        """Totals of the weighting column per census tract"""
         weighting_df = kwargs.get('weighting_data')
         if weighting_df is None:
-            raise ValueError("weighting_data required for value weighting")
-        
-        year_data = supertract_data[supertract_data['year'] == year]
-        
-        # Calculate aggregate value for each supertract
-        weights = pd.Series(index=year_data['supertract_id'], dtype=float)
-        
-        # Use previous year's values (Laspeyres index)
-        value_year = year - 1
-        
-        for _, row in year_data.iterrows():
-            supertract_id = row['supertract_id']
-            component_tracts = row['component_tracts']
-            
-            # Sum values across component tracts
-            tract_values = weighting_df[
-                (weighting_df['census_tract_2010'].isin(component_tracts)) &
-                (weighting_df['year'] == value_year)
-            ]['total_housing_value'].sum()
-            
-            weights[supertract_id] = tract_values
+            raise ValueError(f"weighting_data required for {self.label} weighting")
         
-        return self.normalize_weights(weights)
+        return _tract_totals(weighting_df, self.values_year(year), self.column,
+                             kwargs.get('weighting_index'))
+    
+    def raw_weights(self, supertract_data: pd.DataFrame,
+                    year: int, **kwargs) -> pd.Series:
+        """Weights based on the column summed across component tracts"""
+        return self.sum_over_tracts(
+            supertract_data, year, self.tract_values(year, **kwargs),
+            kwargs.get('tract_membership')
+        )
+
+
+class ValueWeighting(TractSumWeighting):
+    """Value-based (Laspeyres) weighting using housing values"""
+    
+    label = 'value'
+    
+    def __init__(self):
+        super().__init__('total_housing_value')
+    
+    def values_year(self, year: int) -> int:
+        """Use previous year's values (Laspeyres index)"""
+        return year - 1
 
 
-class UnitWeighting(WeightingScheme):
+class UnitWeighting(TractSumWeighting):
     """Unit-based weighting using housing unit counts"""
     
-    def calculate_weights(self, supertract_data: pd.DataFrame, 
-                         year: int, **kwargs) -> pd.Series:
-        """Calculate weights based on number of housing units"""
-        weighting_df = kwargs.get('weighting_data')
-        if weighting_df is None:
-            raise ValueError("weighting_data required for unit weighting")
-        
-        year_data = supertract_data[supertract_data['year'] == year]
-        
-        weights = pd.Series(index=year_data['supertract_id'], dtype=float)
-        
-        for _, row in year_data.iterrows():
-            supertract_id = row['supertract_id']
-            component_tracts = row['component_tracts']
-            
-            # Sum units across component tracts
-            tract_units = weighting_df[
-                (weighting_df['census_tract_2010'].isin(component_tracts)) &
-                (weighting_df['year'] == year)
-            ]['total_housing_units'].sum()
-            
-            weights[supertract_id] = tract_units
-        
-        return self.normalize_weights(weights)
+    label = 'unit'
+    
+    def __init__(self):
+        super().__init__('total_housing_units')
 
 
-class UPBWeighting(WeightingScheme):
+class UPBWeighting(TractSumWeighting):
     """Unpaid Principal Balance weighting"""
     
-    def calculate_weights(self, supertract_data: pd.DataFrame, 
-                         year: int, **kwargs) -> pd.Series:
-        """Calculate weights based on aggregate UPB"""
-        weighting_df = kwargs.get('weighting_data')
-        if weighting_df is None:
-            raise ValueError("weighting_data required for UPB weighting")
-        
-        year_data = supertract_data[supertract_data['year'] == year]
-        
-        weights = pd.Series(index=year_data['supertract_id'], dtype=float)
-        
-        for _, row in year_data.iterrows():
-            supertract_id = row['supertract_id']
-            component_tracts = row['component_tracts']
-            
-            # Sum UPB across component tracts
-            tract_upb = weighting_df[
-                (weighting_df['census_tract_2010'].isin(component_tracts)) &
-                (weighting_df['year'] == year)
-            ]['total_upb'].sum()
-            
-            weights[supertract_id] = tract_upb
-        
-        return self.normalize_weights(weights)
+    label = 'UPB'
+    
+    def __init__(self):
+        super().__init__('total_upb')
 
 
-class DemographicWeighting(WeightingScheme):
+class DemographicWeighting(TractSumWeighting):
     """Base class for demographic-based weightings (College/Non-White)"""
     
+    label = 'demographic'
+    
     def __init__(self, demographic_column: str):
+        super().__init__(demographic_column)
         self.demographic_column = demographic_column
     
-    def calculate_weights(self, supertract_data: pd.DataFrame, 
-                         year: int, **kwargs) -> pd.Series:
-        """Calculate weights based on demographic data"""
-        weighting_df = kwargs.get('weighting_data')
-        if weighting_df is None:
-            raise ValueError("weighting_data required for demographic weighting")
-        
-        year_data = supertract_data[supertract_data['year'] == year]
-        
-        weights = pd.Series(index=year_data['supertract_id'], dtype=float)
-        
-        # Use static 2010 demographic data
-        demo_data = weighting_df[weighting_df['year'] == 2010]
-        
-        for _, row in year_data.iterrows():
-            supertract_id = row['supertract_id']
-            component_tracts = row['component_tracts']
-            
-            # Sum demographic values across component tracts
-            tract_demo = demo_data[
-                demo_data['census_tract_2010'].isin(component_tracts)
-            ][self.demographic_column].sum()
-            
-            weights[supertract_id] = tract_demo
-        
-        return self.normalize_weights(weights)
+    def values_year(self, year: int) -> int:
+        """Use static 2010 demographic data"""
+        return 2010
 
 
 class CollegeWeighting(DemographicWeighting):
@@ -209,11 +305,22 @@ class WeightCalculator:
             'college': CollegeWeighting(),
             'non_white': NonWhiteWeighting()
         }
+        # (weighting_data, index_weighting_data(weighting_data)) of the last
+        # frame seen, so the weighting data is grouped once for all schemes,
+        # years and CBSAs
+        self._weighting_index = (None, None)
+    
+    def weighting_index(self, weighting_data: pd.DataFrame) -> pd.DataFrame:
+        """Per (year, tract) totals of weighting_data, built once per frame"""
+        if self._weighting_index[0] is not weighting_data:
+            self._weighting_index = (weighting_data, index_weighting_data(weighting_data))
+        return self._weighting_index[1]
     
     def calculate_weights(self, scheme_name: str,
                          supertract_data: pd.DataFrame,
                          year: int,
-                         weighting_data: Optional[pd.DataFrame] = None) -> pd.Series:
+                         weighting_data: Optional[pd.DataFrame] = None,
+                         membership: Optional[pd.DataFrame] = None) -> pd.Series:
         """
         Calculate weights using specified scheme.
         
@@ -227,6 +334,9 @@ class WeightCalculator:
             Year to calculate weights for
         weighting_data: pd.DataFrame, optional
             Additional data needed for non-sample weighting schemes
+        membership: pd.DataFrame, optional
+            Precomputed tract_membership(supertract_data, year), shared by
+            the tract-summing schemes
             
         Returns:
         --------
@@ -238,42 +348,132 @@ class WeightCalculator:
         
         scheme = self.schemes[scheme_name]
         
+        return scheme.calculate_weights(
+            supertract_data, year, **self._scheme_kwargs(weighting_data, membership)
+        )
+    
+    def _scheme_kwargs(self, weighting_data: Optional[pd.DataFrame],
+                       membership: Optional[pd.DataFrame]) -> Dict:
+        """Keyword arguments passed to the schemes"""
         kwargs = {}
         if weighting_data is not None:
             kwargs['weighting_data'] = weighting_data
-        
-        return scheme.calculate_weights(supertract_data, year, **kwargs)
+            kwargs['weighting_index'] = self.weighting_index(weighting_data)
+        if membership is not None:
+            kwargs['tract_membership'] = membership
+        return kwargs
     
     def calculate_all_weights(self, supertract_data: pd.DataFrame,
                             year: int,
-                            weighting_data: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+                            weighting_data: Optional[pd.DataFrame] = None,
+                            schemes: Optional[List[str]] = None) -> pd.DataFrame:
         """
-        Calculate weights for all schemes.
+        Calculate weights for all schemes (see calculate_scheme_weights);
+        schemes that fail get equal weights.
         
         Returns:
         --------
         pd.DataFrame
             DataFrame with supertract_id as index and weight schemes as columns
         """
-        all_weights = {}
+        weights, _ = self.calculate_scheme_weights(supertract_data, year, weighting_data, schemes)
+        return weights
+    
+    def calculate_scheme_weights(self, supertract_data: pd.DataFrame,
+                                 year: int,
+                                 weighting_data: Optional[pd.DataFrame] = None,
+                                 schemes: Optional[List[str]] = None
+                                 ) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        Calculate weights for many schemes at once, reporting the schemes
+        that failed.
+        
+        Each scheme fills one column of a preallocated
+        (n_supertracts, n_schemes) array with its weights (supertracts a
+        scheme leaves out get 0); all columns are then normalized in one
+        broadcast.
+        
+        Parameters:
+        -----------
+        supertract_data: pd.DataFrame
+            DataFrame with supertract definitions
+        year: int
+            Year to calculate weights for
+        weighting_data: pd.DataFrame, optional
+            Additional data needed for non-sample weighting schemes
+        schemes: List[str], optional
+            Names of the schemes to calculate (if None, all schemes)
+            
+        Returns:
+        --------
+        tuple
+            (DataFrame with supertract_id as index and weight schemes as
+             columns, names of the schemes that failed and got equal weights)
+        """
+        if schemes is None:
+            schemes = list(self.schemes)
+        for scheme_name in schemes:
+            if scheme_name not in self.schemes:
+                raise ValueError(f"Unknown weighting scheme: {scheme_name}")
+        selected = {scheme_name: self.schemes[scheme_name] for scheme_name in schemes}
+        failed = []
+        
+        year_ids = pd.Index(
+            supertract_data.loc[supertract_data['year'] == year, 'supertract_id'].to_numpy(),
+            name='supertract_id'
+        )
+        n_supertracts = len(year_ids)
+        
+        # Explode the supertract -> tract membership once for all schemes
+        kwargs = self._scheme_kwargs(weighting_data, tract_membership(supertract_data, year))
+        
+        W = np.empty((n_supertracts, len(selected)), dtype=np.float64)
         
-        for scheme_name in self.schemes:
+        # Tract-summing schemes share one pass over the membership: their
+        # tract values are stacked as columns and summed together
+        fused = set()
+        tract_values = {}
+        for column, (scheme_name, scheme) in enumerate(selected.items()):
+            if not (isinstance(scheme, TractSumWeighting) and scheme.fusable):
+                continue
+            fused.add(column)
             try:
-                weights = self.calculate_weights(
-                    scheme_name, supertract_data, year, weighting_data
-                )
-                all_weights[scheme_name] = weights
+                tract_values[column] = scheme.tract_values(year, **kwargs)
             except Exception as e:
                 logger.warning(f"Failed to calculate {scheme_name} weights: {str(e)}")
                 # Use equal weights as fallback
-                year_data = supertract_data[supertract_data['year'] == year]
-                n_supertracts = len(year_data)
-                all_weights[scheme_name] = pd.Series(
-                    1.0 / n_supertracts,
-                    index=year_data['supertract_id']
-                )
+                failed.append(scheme_name)
+                W[:, column] = 1.0
+        if tract_values:
+            tract_table = pd.concat(tract_values, axis=1)
+            _, totals = _sum_over_tracts(
+                supertract_data, year, tract_table, kwargs['tract_membership']
+            )
+            W[:, list(tract_values)] = totals
+        
+        for column, (scheme_name, scheme) in enumerate(selected.items()):
+            if column in fused:
+                continue
+            try:
+                weights = scheme.calculate_weights(supertract_data, year, **kwargs)
+                if not weights.index.equals(year_ids):
+                    weights = weights.reindex(year_ids, fill_value=0)
+                W[:, column] = weights.to_numpy(dtype=np.float64)
+            except Exception as e:
+                logger.warning(f"Failed to calculate {scheme_name} weights: {str(e)}")
+                # Use equal weights as fallback
+                failed.append(scheme_name)
+                W[:, column] = 1.0
+        
+        weight_sums = W.sum(axis=0)
+        zero = weight_sums == 0
+        if zero.any():
+            logger.warning("All weights are zero, using equal weights")
+            W[:, zero] = 1.0
+            weight_sums[zero] = n_supertracts
+        W *= 1.0 / weight_sums
         
-        return pd.DataFrame(all_weights)
+        return pd.DataFrame(W, index=year_ids, columns=list(selected)), failed
     
     def add_custom_scheme(self, name: str, scheme: WeightingScheme):
         """Add a custom weighting scheme"""
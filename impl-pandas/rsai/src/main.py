@@ -96,10 +96,16 @@ class RSAIPipeline:
         if weighting_file:
             weighting_df = self.data_ingestion.load_weighting_data(weighting_file)
         
+        # One integer code space for the tract IDs of all inputs (without
+        # the weighting frame of an earlier load when none is given now)
+        if weighting_df is None:
+            self.data_ingestion.weighting_df = None
+        self.data_ingestion.share_tract_codes()
+        
         return {
-            'transactions': transactions_df,
-            'geographic': geographic_df,
-            'weighting': weighting_df
+            'transactions': self.data_ingestion.transactions_df,
+            'geographic': self.data_ingestion.geographic_df,
+            'weighting': self.data_ingestion.weighting_df
         }
     
     def run_pipeline(self,
@@ -111,7 +117,8 @@ class RSAIPipeline:
                     weighting_file: Optional[str] = None,
                     weighting_schemes: Optional[list[str]] = None,
                     output_format: str = 'csv',
-                    wide_format: bool = False) -> pd.DataFrame:
+                    wide_format: bool = False,
+                    include_summary: bool = True) -> pd.DataFrame:
         """
         Run the complete RSAI pipeline.
         
@@ -135,6 +142,8 @@ class RSAIPipeline:
             Output format ('csv' or 'parquet')
         wide_format: bool
             If True, outputs wide format CSV
+        include_summary: bool
+            If True, also writes summary_statistics.csv next to the output
             
         Returns:
         --------
@@ -179,7 +188,8 @@ class RSAIPipeline:
             start_year,
             end_year,
             data['weighting'],
-            weighting_schemes
+            weighting_schemes,
+            repeat_sales_arrays=self.repeat_sales_processor.repeat_sales_arrays
         )
         
         # Step 5: Chain indices and export
@@ -191,7 +201,7 @@ class RSAIPipeline:
             output_file,
             format=output_format,
             wide_format=wide_format,
-            include_summary=True
+            include_summary=include_summary
         )
         
         logger.info("RSAI pipeline completed successfully")
@@ -2,12 +2,288 @@
 
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional, Union
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 import logging
+import os
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Columns of the generate_summary_statistics output
+SUMMARY_COLUMNS = ['cbsa_id', 'weighting_scheme', 'start_year', 'end_year', 'n_years',
+                   'mean_appreciation', 'std_appreciation', 'total_appreciation',
+                   'min_annual_appreciation', 'max_annual_appreciation']
+
+
+# Series keys are grouped on as categoricals (integer codes, not string
+# hashes)
+SERIES_KEY_DTYPES = {'cbsa_id': 'category', 'weighting_scheme': 'category'}
+
+# Compact dtypes of the standard output's id and year columns
+STANDARD_OUTPUT_DTYPES = {'year': np.int16, **SERIES_KEY_DTYPES}
+
+# Parquet outputs are zstd-compressed (the Arrow writer dictionary-encodes
+# the repeated id columns by default)
+PARQUET_COMPRESSION = 'zstd'
+
+
+def _write_csv(df: pd.DataFrame, output_path: Union[str, Path]) -> None:
+    """
+    Write df (without its index) as CSV through Arrow's multi-threaded
+    writer instead of pandas' Python-level row formatting, in the format
+    to_csv writes: an unquoted header and unquoted values, missing values
+    as empty fields and floats formatted as to_csv does (numpy's shortest
+    round-trip repr, so integral floats keep their ".0"). Rows are
+    formatted and written in batches, so only one batch of text is held in
+    memory; categorical columns become dictionary arrays whose strings are
+    encoded once. Datetime columns of whole days are written as dates, as
+    to_csv does. Frames with text that needs quoting (a separator, quote
+    or line break) or with other datetime or duration columns are written
+    by to_csv.
+    """
+    if any(_needs_quoting(name) for name in df.columns.astype(str)):
+        df.to_csv(output_path, index=False)
+        return
+    
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type) and field.type.tz is None:
+            values = df.iloc[:, i].to_numpy()
+            days = values.astype('datetime64[D]')
+            missing = np.isnat(values)
+            if not (days == values)[~missing].all():
+                # Times of day: to_csv's timestamp format
+                df.to_csv(output_path, index=False)
+                return
+            table = table.set_column(i, field.name, pa.array(
+                days.astype(str), type=pa.string(), mask=missing
+            ))
+        elif pa.types.is_timestamp(field.type) or pa.types.is_duration(field.type):
+            df.to_csv(output_path, index=False)
+            return
+        elif pa.types.is_floating(field.type):
+            values = df.iloc[:, i].to_numpy(dtype=field.type.to_pandas_dtype(),
+                                            na_value=np.nan)
+            table = table.set_column(i, field.name, pa.array(
+                values.astype(str), type=pa.string(), mask=np.isnan(values)
+            ))
+        elif pa.types.is_boolean(field.type) and table.column(i).null_count == 0:
+            # True/False, as to_csv writes them (Arrow writes true/false)
+            table = table.set_column(i, field.name, pa.array(
+                df.iloc[:, i].to_numpy(dtype=bool).astype(str), type=pa.string()
+            ))
+    
+    header = (','.join(df.columns.astype(str)) + '\n').encode()
+    options = pacsv.WriteOptions(include_header=False, quoting_style='none')
+    try:
+        with open(output_path, 'wb') as f:
+            f.write(header)
+            pacsv.write_csv(table, f, options)
+    except pa.ArrowInvalid:
+        # A string value needs quoting
+        df.to_csv(output_path, index=False)
+
+
+def _needs_quoting(text: str) -> bool:
+    """True if to_csv quotes a field with this text"""
+    return any(char in text for char in ',"\r\n')
+
+
+def _wide_index_values(index_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Index values as a (cbsa_id, year) x weighting_scheme table.
+    
+    Each (cbsa_id, year, weighting_scheme) has a single index value, so this
+    is a plain reshape (pivot), not a pivot_table aggregation. Rows with a
+    missing key or value are left out first, which leaves the same cells,
+    rows and columns pivot_table produced (it drops all-missing ones).
+    """
+    columns = ['cbsa_id', 'year', 'weighting_scheme', 'index_value']
+    # Only the pivoted columns are copied by the dropna
+    return index_df[columns].dropna().pivot(
+        index=['cbsa_id', 'year'], columns='weighting_scheme', values='index_value'
+    )
+
+
+def _series_changes(codes: np.ndarray,
+                    index_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Year-over-year and cumulative percentage changes of many index series.
+    
+    Rows are gathered by series (keeping their order within a series; rows
+    that already come grouped by series are used in place), both changes
+    are computed in one pass over the gathered values, and the results are
+    scattered back to the input rows. The yoy change matches
+    groupby pct_change (missing values are forward-filled within a series
+    first); the cumulative change is relative to each series' first row.
+    Rows with code -1 (no series) get NaN.
+    
+    Parameters:
+    -----------
+    codes: np.ndarray
+        Series code of each row (groupby ngroup)
+    index_values: np.ndarray
+        Index value of each row
+        
+    Returns:
+    --------
+    Tuple[np.ndarray, np.ndarray]
+        yoy_change and cumulative_change in percent, aligned with the rows
+    """
+    if (codes[1:] >= codes[:-1]).all():
+        # Rows already grouped by series (as chain_all_indices returns
+        # them, with ngroup codes in order of appearance): no reordering
+        order = slice(None)
+    else:
+        order = np.argsort(codes, kind='stable')
+    values = index_values[order]
+    positions = np.arange(len(values))
+    series_start = np.ones(len(values), dtype=bool)
+    series_start[1:] = codes[order][1:] != codes[order][:-1]
+    
+    # Forward-fill missing values within each series (a series start is its
+    # own fill source, so nothing carries over from the previous series)
+    fill_from = np.maximum.accumulate(
+        np.where(series_start | ~np.isnan(values), positions, 0)
+    )
+    filled = values[fill_from]
+    previous = np.empty_like(filled)
+    previous[0:1] = np.nan
+    previous[1:] = filled[:-1]
+    previous[series_start] = np.nan
+    
+    first = values[np.maximum.accumulate(np.where(series_start, positions, 0))]
+    
+    yoy_change = np.empty_like(values)
+    cumulative_change = np.empty_like(values)
+    yoy_change[order] = (filled / previous - 1) * 100
+    cumulative_change[order] = (values / first - 1) * 100
+    
+    no_series = codes < 0
+    yoy_change[no_series] = np.nan
+    cumulative_change[no_series] = np.nan
+    return yoy_change, cumulative_change
+
+
+def _chain_index_values(factors: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                        base_positions: np.ndarray, base_value: float) -> np.ndarray:
+    """
+    Chain many index series at once.
+    
+    The series are stored back to back: series g occupies
+    factors[starts[g]:ends[g]] and is anchored at base_value at
+    base_positions[g]. The recursion runs one year step at a time across
+    every series still extending that far, so the Python-level work grows
+    with the longest series, not with the number of series, and each value
+    is computed by the same single multiply (or divide) as in the
+    year-by-year recursion.
+    
+    Parameters:
+    -----------
+    factors: np.ndarray
+        Growth factors exp(p_t), grouped by series and sorted by year
+    starts, ends: np.ndarray
+        Row range of each series
+    base_positions: np.ndarray
+        Row of each series' base year
+    base_value: float
+        Index value in the base year
+        
+    Returns:
+    --------
+    np.ndarray
+        Index values aligned with factors
+    """
+    index_values = np.empty(len(factors))
+    index_values[base_positions] = base_value
+    
+    def longest_first(steps: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Base rows ordered by number of steps (descending), so the series
+        # still running at any step are a prefix of the order, and the
+        # prefix length of each step
+        order = np.argsort(-steps, kind='stable')
+        active = np.searchsorted(-steps[order], -np.arange(1, steps.max(initial=0) + 1),
+                                 side='right')
+        return base_positions[order], active
+    
+    # Forward from the base year: P_t = P_{t-1} * exp(p_t)
+    bases, active = longest_first(ends - base_positions - 1)
+    for step, n_active in enumerate(active.tolist(), start=1):
+        rows = bases[:n_active] + step
+        index_values[rows] = index_values[rows - 1] * factors[rows]
+    
+    # Backward from the base year: P_t = P_{t+1} / exp(p_{t+1})
+    bases, active = longest_first(base_positions - starts)
+    for step, n_active in enumerate(active.tolist(), start=1):
+        rows = bases[:n_active] - step
+        index_values[rows] = index_values[rows + 1] / factors[rows + 1]
+    
+    return index_values
+
+
+class _ChainInputs(NamedTuple):
+    """Rates of many series, sorted by series and year, with their layout"""
+    years: np.ndarray
+    appreciation_rates: np.ndarray
+    factors: np.ndarray
+    starts: np.ndarray
+    ends: np.ndarray
+    # Series keys per row, in the input's dtypes (Categorical for
+    # categorical key columns, else object arrays)
+    cbsa_ids: Union[np.ndarray, pd.Categorical]
+    schemes: Union[np.ndarray, pd.Categorical]
+    # Series number of each (cbsa_id, weighting_scheme) key
+    series: Dict[Tuple, int]
+
+
+class _SeriesBlock(NamedTuple):
+    """Rows start:end of a chain_all_indices result (one series)"""
+    frame: pd.DataFrame
+    start: int
+    end: int
+
+
+class _ChainedIndices(MutableMapping):
+    """
+    Chained series frames by (cbsa_id, weighting_scheme). Series from
+    chain_all_indices are stored as row ranges of its result and only
+    sliced out (and kept) when first looked up.
+    """
+    
+    def __init__(self):
+        self._series = {}
+    
+    def add_blocks(self, frame: pd.DataFrame, series: Dict[Tuple, int],
+                   starts: np.ndarray, ends: np.ndarray) -> None:
+        """Store series g of frame (rows starts[g]:ends[g]) under its key"""
+        starts, ends = starts.tolist(), ends.tolist()
+        self._series.update(
+            (key, _SeriesBlock(frame, starts[g], ends[g])) for key, g in series.items()
+        )
+    
+    def __getitem__(self, key) -> pd.DataFrame:
+        value = self._series[key]
+        if isinstance(value, _SeriesBlock):
+            value = value.frame.iloc[value.start:value.end].reset_index(drop=True)
+            self._series[key] = value
+        return value
+    
+    def __setitem__(self, key, value: pd.DataFrame) -> None:
+        self._series[key] = value
+    
+    def __delitem__(self, key) -> None:
+        del self._series[key]
+    
+    def __iter__(self):
+        return iter(self._series)
+    
+    def __len__(self) -> int:
+        return len(self._series)
+
 
 class IndexChainer:
     """
@@ -30,7 +306,7 @@ class IndexChainer:
         """
         self.base_value = base_value
         self.base_year = base_year
-        self.chained_indices = {}
+        self.chained_indices = _ChainedIndices()
     
     def chain_appreciation_rates(self, appreciation_df: pd.DataFrame,
                                cbsa_id: str,
@@ -56,52 +332,64 @@ class IndexChainer:
         filtered_df = appreciation_df[
             (appreciation_df['cbsa_id'] == cbsa_id) &
             (appreciation_df['weighting_scheme'] == weighting_scheme)
-        ].sort_values('year')
+        ].sort_values('year', kind='mergesort')
         
         if filtered_df.empty:
             logger.warning(f"No data found for CBSA {cbsa_id}, scheme {weighting_scheme}")
             return pd.DataFrame()
         
-        # Initialize index series
-        years = filtered_df['year'].values
         appreciation_rates = filtered_df['appreciation_rate'].values
-        
+        # Keys keep the input's dtypes, as in chain_all_indices
+        cbsa_ids, schemes = (
+            filtered_df[key].array
+            if isinstance(filtered_df[key].dtype, pd.CategoricalDtype)
+            else filtered_df[key].to_numpy()
+            for key in ['cbsa_id', 'weighting_scheme']
+        )
+        return self._chain_group(filtered_df['year'].values, appreciation_rates,
+                                 np.exp(appreciation_rates), cbsa_ids, schemes)
+    
+    def _chain_group(self, years: np.ndarray, appreciation_rates: np.ndarray,
+                     factors: np.ndarray, cbsa_ids: Union[np.ndarray, pd.Categorical],
+                     schemes: Union[np.ndarray, pd.Categorical]) -> pd.DataFrame:
+        """Chain the rates of one CBSA/scheme series (sorted by year)"""
         # Set base year
         if self.base_year is None:
             self.base_year = years[0]
         
-        # Calculate index values
-        index_values = np.zeros(len(years))
-        
-        # Find base year position
-        if self.base_year in years:
-            base_idx = np.where(years == self.base_year)[0][0]
-            index_values[base_idx] = self.base_value
-            
-            # Forward chaining from base year
-            for i in range(base_idx + 1, len(years)):
-                index_values[i] = index_values[i-1] * np.exp(appreciation_rates[i])
-            
-            # Backward chaining from base year
-            for i in range(base_idx - 1, -1, -1):
-                index_values[i] = index_values[i+1] / np.exp(appreciation_rates[i+1])
-        else:
-            # Base year not in data, start from first year
-            index_values[0] = self.base_value
-            for i in range(1, len(years)):
-                index_values[i] = index_values[i-1] * np.exp(appreciation_rates[i])
+        # Find base year position (the first year if the base year is not
+        # in the data); years are sorted, so binary search for it
+        base_idx = 0
+        pos = np.searchsorted(years, self.base_year)
+        if pos < len(years) and years[pos] == self.base_year:
+            base_idx = pos
+        
+        # Chain with running products of the growth factors exp(p_t):
+        # forward from the base year by multiplying, backward by dividing.
+        # The accumulations apply one factor per step in the same order as
+        # the year-by-year recursion, so the values are identical to it.
+        # Both run in place on views of the output (the backward one on a
+        # reversed view), seeded with the base value, so no temporaries
+        index_values = np.empty(len(years))
+        forward = index_values[base_idx:]
+        forward[0] = self.base_value
+        forward[1:] = factors[base_idx + 1:]
+        np.multiply.accumulate(forward, out=forward)
+        backward = index_values[base_idx::-1]
+        backward[1:] = factors[base_idx:0:-1]
+        np.divide.accumulate(backward, out=backward)
         
         # Create result DataFrame
         result_df = pd.DataFrame({
             'year': years,
             'index_value': index_values,
             'appreciation_rate': appreciation_rates,
-            'cbsa_id': cbsa_id,
-            'weighting_scheme': weighting_scheme
+            'cbsa_id': cbsa_ids,
+            'weighting_scheme': schemes
         })
         
         # Store for later use
-        key = (cbsa_id, weighting_scheme)
+        key = (cbsa_ids[0], schemes[0])
         self.chained_indices[key] = result_df
         
         return result_df
@@ -120,19 +408,78 @@ class IndexChainer:
         pd.DataFrame
             All chained index series
         """
-        all_indices = []
+        inputs = self._get_chain_inputs(appreciation_df)
+        if inputs is None:
+            return pd.DataFrame()
+        years, appreciation_rates, factors, starts, ends, cbsa_ids, schemes, series = inputs
+        
+        # Set base year
+        if self.base_year is None:
+            self.base_year = years[0]
+        
+        # Base row of each series: its first base-year row, else its first row
+        rows = np.arange(len(years))
+        base_rows = np.minimum.reduceat(
+            np.where(years == self.base_year, rows, len(years)), starts
+        )
+        base_positions = np.where(base_rows < ends, base_rows, starts)
         
-        # Get unique combinations
-        combinations = appreciation_df.groupby(['cbsa_id', 'weighting_scheme']).size()
+        index_values = _chain_index_values(
+            factors, starts, ends, base_positions, self.base_value
+        )
         
-        for (cbsa_id, weighting_scheme), _ in combinations.items():
-            index_df = self.chain_appreciation_rates(
-                appreciation_df, cbsa_id, weighting_scheme
+        all_indices = pd.DataFrame({
+            'year': years,
+            'index_value': index_values,
+            'appreciation_rate': appreciation_rates,
+            'cbsa_id': cbsa_ids,
+            'weighting_scheme': schemes
+        })
+        
+        # Store each series for later use (sliced out on first lookup)
+        self.chained_indices.add_blocks(all_indices, series, starts, ends)
+        
+        return all_indices
+    
+    def _get_chain_inputs(self, appreciation_df: pd.DataFrame) -> Optional['_ChainInputs']:
+        """
+        Series layout and growth factors of appreciation_df (None if it has
+        no series), built once per chain_all_indices call
+        """
+        keys = ['cbsa_id', 'weighting_scheme']
+        
+        # Sort once by series and year so each series is a contiguous block
+        # (series come out in the sorted key order); rows without a key
+        # belong to no series
+        sorted_df = appreciation_df.astype(SERIES_KEY_DTYPES).dropna(subset=keys).sort_values(
+            keys + ['year'], kind='mergesort'
+        )
+        inputs = None
+        if not sorted_df.empty:
+            codes = sorted_df.groupby(keys, sort=False, observed=True).ngroup().to_numpy()
+            starts = np.flatnonzero(np.diff(codes, prepend=-1))
+            appreciation_rates = sorted_df['appreciation_rate'].values
+            # Keys keep the input's dtypes, so categorical keys (as
+            # process_all_years returns them) stay categorical downstream
+            cbsa_ids, schemes = (
+                sorted_df[key].array
+                if isinstance(appreciation_df[key].dtype, pd.CategoricalDtype)
+                else sorted_df[key].to_numpy()
+                for key in keys
+            )
+            inputs = _ChainInputs(
+                years=sorted_df['year'].values,
+                appreciation_rates=appreciation_rates,
+                # Growth factors exp(p_t), computed once for every chaining
+                factors=np.exp(appreciation_rates),
+                starts=starts,
+                ends=np.append(starts[1:], len(codes)),
+                cbsa_ids=cbsa_ids,
+                schemes=schemes,
+                series={key: g for g, key in enumerate(zip(cbsa_ids[starts], schemes[starts]))}
             )
-            if not index_df.empty:
-                all_indices.append(index_df)
         
-        return pd.concat(all_indices, ignore_index=True) if all_indices else pd.DataFrame()
+        return inputs
 
 
 class OutputGenerator:
@@ -155,17 +502,19 @@ class OutputGenerator:
         pd.DataFrame
             Standardized output format
         """
-        output_df = index_df.copy()
-        
-        # Calculate year-over-year percentage change
-        output_df['yoy_change'] = output_df.groupby(
-            ['cbsa_id', 'weighting_scheme']
-        )['index_value'].pct_change() * 100
-        
-        # Calculate cumulative change from base
-        output_df['cumulative_change'] = output_df.groupby(
-            ['cbsa_id', 'weighting_scheme']
-        )['index_value'].transform(lambda x: (x / x.iloc[0] - 1) * 100)
+        # Compact copies of the id and year columns (lossless; the float
+        # columns stay float64 so exported index values keep full precision)
+        output_df = index_df.astype(STANDARD_OUTPUT_DTYPES)
+        
+        # Series code of each row, -1 for rows missing a key (series order
+        # does not matter for per-row results, so skip sorting the keys)
+        codes = output_df.groupby(['cbsa_id', 'weighting_scheme'], sort=False,
+                                  observed=True).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        yoy_change, cumulative_change = _series_changes(
+            codes, output_df['index_value'].to_numpy(dtype=np.float64)
+        )
+        output_df['yoy_change'] = yoy_change
+        output_df['cumulative_change'] = cumulative_change
         
         # Reorder columns
         column_order = [
@@ -195,18 +544,14 @@ class OutputGenerator:
         
         if wide_format:
             # Pivot to wide format
-            pivot_df = index_df.pivot_table(
-                index=['cbsa_id', 'year'],
-                columns='weighting_scheme',
-                values='index_value'
-            ).reset_index()
+            pivot_df = _wide_index_values(index_df).reset_index()
             
-            pivot_df.to_csv(output_path, index=False)
+            _write_csv(pivot_df, output_path)
             logger.info(f"Exported wide format data to {output_path}")
         else:
             # Long format
             standard_df = self.prepare_standard_output(index_df)
-            standard_df.to_csv(output_path, index=False)
+            _write_csv(standard_df, output_path)
             logger.info(f"Exported long format data to {output_path}")
     
     def export_to_parquet(self, index_df: pd.DataFrame,
@@ -216,7 +561,8 @@ class OutputGenerator:
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
         standard_df = self.prepare_standard_output(index_df)
-        standard_df.to_parquet(output_path, index=False)
+        standard_df.to_parquet(output_path, engine='pyarrow',
+                               compression=PARQUET_COMPRESSION, index=False)
         logger.info(f"Exported data to {output_path}")
     
     def generate_summary_statistics(self, index_df: pd.DataFrame) -> pd.DataFrame:
@@ -228,31 +574,44 @@ class OutputGenerator:
         pd.DataFrame
             Summary statistics including mean appreciation, volatility, etc.
         """
-        summary_stats = []
-        
-        grouped = index_df.groupby(['cbsa_id', 'weighting_scheme'])
-        
-        for (cbsa_id, scheme), group in grouped:
-            stats = {
-                'cbsa_id': cbsa_id,
-                'weighting_scheme': scheme,
-                'start_year': group['year'].min(),
-                'end_year': group['year'].max(),
-                'n_years': len(group),
-                'mean_appreciation': group['appreciation_rate'].mean(),
-                'std_appreciation': group['appreciation_rate'].std(),
-                'total_appreciation': (group['index_value'].iloc[-1] / 
-                                     group['index_value'].iloc[0] - 1) * 100,
-                'min_annual_appreciation': group['appreciation_rate'].min(),
-                'max_annual_appreciation': group['appreciation_rate'].max()
-            }
-            
-            summary_stats.append(stats)
-        
-        return pd.DataFrame(summary_stats)
+        keys = [index_df[key].astype(dtype) for key, dtype in SERIES_KEY_DTYPES.items()]
+        grouped = index_df.groupby(keys, observed=True)
+        
+        summary = grouped.agg(
+            start_year=('year', 'min'),
+            end_year=('year', 'max'),
+            n_years=('year', 'size'),
+            mean_appreciation=('appreciation_rate', 'mean'),
+            std_appreciation=('appreciation_rate', 'std'),
+            min_annual_appreciation=('appreciation_rate', 'min'),
+            max_annual_appreciation=('appreciation_rate', 'max')
+        )
+        
+        # Total appreciation from each series' first and last rows, found by
+        # position on the same grouping (like iloc[0]/iloc[-1], a missing
+        # endpoint gives a missing total, where 'first'/'last' would skip it)
+        codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        index_values = index_df['index_value'].to_numpy(dtype=np.float64)
+        
+        def endpoint_values(keep: str) -> np.ndarray:
+            # Value at each series' first (or last) row, in summary order
+            rows = np.flatnonzero(~pd.Index(codes).duplicated(keep=keep) & (codes >= 0))
+            values = np.empty(len(summary))
+            values[codes[rows]] = index_values[rows]
+            return values
+        
+        summary['total_appreciation'] = (endpoint_values('last') /
+                                         endpoint_values('first') - 1) * 100
+        
+        # Key columns back in the input's dtypes
+        summary = summary.reset_index().astype(
+            {key: index_df[key].dtype for key in SERIES_KEY_DTYPES}
+        )
+        return summary[SUMMARY_COLUMNS]
     
     def export_by_cbsa(self, index_df: pd.DataFrame,
-                      output_dir: Union[str, Path]) -> None:
+                      output_dir: Union[str, Path],
+                      n_jobs: Optional[int] = None) -> None:
         """
         Export separate files for each CBSA.
         
@@ -262,24 +621,34 @@ class OutputGenerator:
             All index data
         output_dir: str or Path
             Directory to save CBSA files
+        n_jobs: int, optional
+            Number of threads writing files concurrently (Arrow's CSV
+            writer releases the GIL). None uses up to 8 (CPU count);
+            1 writes in the calling thread.
         """
         output_dir = Path(output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
         
-        for cbsa_id in index_df['cbsa_id'].unique():
-            cbsa_data = index_df[index_df['cbsa_id'] == cbsa_id]
-            
-            # Pivot to wide format for CBSA file
-            pivot_df = cbsa_data.pivot_table(
-                index='year',
-                columns='weighting_scheme',
-                values='index_value'
-            ).reset_index()
-            
-            output_path = output_dir / f"hpi_{cbsa_id}.csv"
-            pivot_df.to_csv(output_path, index=False)
+        # Pivot every CBSA to wide format at once, then split the rows by
+        # CBSA; a CBSA's file only gets the schemes it has values for
+        wide_df = _wide_index_values(index_df)
+        files = [
+            (cbsa_wide.droplevel('cbsa_id').dropna(axis=1, how='all').reset_index(),
+             output_dir / f"hpi_{cbsa_id}.csv")
+            for cbsa_id, cbsa_wide in wide_df.groupby(level='cbsa_id', sort=False, observed=True)
+        ]
+        
+        # The files are independent, so write them concurrently
+        if n_jobs is None:
+            n_jobs = min(8, os.cpu_count() or 1)
+        if n_jobs > 1 and len(files) > 1:
+            with ThreadPoolExecutor(max_workers=min(n_jobs, len(files))) as executor:
+                list(executor.map(lambda file: _write_csv(*file), files))
+        else:
+            for pivot_df, output_path in files:
+                _write_csv(pivot_df, output_path)
         
-        logger.info(f"Exported {len(index_df['cbsa_id'].unique())} CBSA files to {output_dir}")
+        logger.info(f"Exported {len(files)} CBSA files to {output_dir}")
 
 
 class RSAIExporter:
@@ -331,7 +700,7 @@ class RSAIExporter:
         if include_summary:
             summary_df = self.output_gen.generate_summary_statistics(index_df)
             summary_path = Path(output_path).parent / "summary_statistics.csv"
-            summary_df.to_csv(summary_path, index=False)
+            _write_csv(summary_df, summary_path)
             logger.info(f"Exported summary statistics to {summary_path}")
         
         return index_df
\ No newline at end of file
@@ -6,8 +6,8 @@ from datetime import datetime, timedelta
 import os
 from pathlib import Path
 
-# Set random seed for reproducibility
-np.random.seed(42)
+# Random generator with a fixed seed, for reproducibility
+rng = np.random.default_rng(42)
 
 
 def generate_transaction_data(n_properties=1000, n_cbsas=3, years_range=(2015, 2021)):
@@ -20,72 +20,63 @@ def generate_transaction_data(n_properties=1000, n_cbsas=3, years_range=(2015, 2
         '47900': [f'08031{i:06d}' for i in range(300000, 300010)]   # Denver
     }
     
-    transactions = []
+    # Base price varies by CBSA
+    base_price_mults = {'31080': 1.0, '41860': 1.5, '47900': 0.8}
+    
+    # Each property gets up to 4 sales: a first sale plus up to
+    # max_resales resales, sampled for all properties of a CBSA at once
+    max_resales = 3
+    n = n_properties // n_cbsas
+    
+    # Column chunks per CBSA, concatenated into one frame at the end
+    columns = {name: [] for name in ['property_id', 'transaction_date', 'transaction_price',
+                                     'census_tract_2010', 'cbsa_id']}
     property_counter = 0
     
     for cbsa_id, tracts in cbsa_tracts.items():
-        n_props_cbsa = n_properties // n_cbsas
+        property_ids = np.char.add(
+            'PROP', np.char.zfill(np.arange(property_counter, property_counter + n).astype(str), 6)
+        )
+        property_counter += n
         
-        for _ in range(n_props_cbsa):
-            property_id = f'PROP{property_counter:06d}'
-            property_counter += 1
-            
-            # Assign to random tract
-            tract = np.random.choice(tracts)
-            
-            # Generate 1-4 transactions for this property
-            n_transactions = np.random.choice([1, 2, 3, 4], p=[0.3, 0.5, 0.15, 0.05])
-            
-            # First transaction
-            first_year = np.random.randint(years_range[0], years_range[1] - 1)
-            first_month = np.random.randint(1, 13)
-            first_date = datetime(first_year, first_month, 
-                                np.random.randint(1, 28))
-            
-            # Base price varies by CBSA
-            base_price_mult = {'31080': 1.0, '41860': 1.5, '47900': 0.8}[cbsa_id]
-            base_price = np.random.uniform(200000, 800000) * base_price_mult
-            
-            transactions.append({
-                'property_id': property_id,
-                'transaction_date': first_date,
-                'transaction_price': base_price,
-                'census_tract_2010': tract,
-                'cbsa_id': cbsa_id
-            })
-            
-            # Subsequent transactions
-            prev_date = first_date
-            prev_price = base_price
-            
-            for i in range(1, n_transactions):
-                # Time between sales: 1-5 years
-                years_gap = np.random.uniform(1, 5)
-                next_date = prev_date + timedelta(days=int(years_gap * 365))
-                
-                # Skip if beyond date range
-                if next_date.year > years_range[1]:
-                    break
-                
-                # Price appreciation: 2-8% per year with some noise
-                annual_appr = np.random.normal(0.05, 0.02)
-                # Clip to reasonable range
-                annual_appr = np.clip(annual_appr, -0.1, 0.15)
-                
-                price_mult = (1 + annual_appr) ** years_gap
-                next_price = prev_price * price_mult
-                
-                transactions.append({
-                    'property_id': property_id,
-                    'transaction_date': next_date,
-                    'transaction_price': next_price,
-                    'census_tract_2010': tract,
-                    'cbsa_id': cbsa_id
-                })
-                
-                prev_date = next_date
-                prev_price = next_price
-    
+        # Assign to random tract
+        tract = rng.choice(tracts, size=n)
+        
+        # Generate 1-4 transactions for each property
+        n_transactions = rng.choice([1, 2, 3, 4], size=n, p=[0.3, 0.5, 0.15, 0.05])
+        
+        # First transaction, dated by month offset from 1970 plus a day
+        first_year = rng.integers(years_range[0], years_range[1] - 1, size=n)
+        first_month = rng.integers(1, 13, size=n)
+        first_day = rng.integers(1, 28, size=n)
+        first_dates = (((first_year - 1970) * 12 + first_month - 1).astype('datetime64[M]')
+                       .astype('datetime64[D]') + (first_day - 1))
+        base_price = rng.uniform(200000, 800000, size=n) * base_price_mults[cbsa_id]
+        
+        # Subsequent transactions: 1-5 years apart, with 2-8% annual
+        # price appreciation plus some noise (clipped to a reasonable range)
+        years_gap = rng.uniform(1, 5, size=(n, max_resales))
+        annual_appr = np.clip(rng.normal(0.05, 0.02, size=(n, max_resales)), -0.1, 0.15)
+        days_gap = (years_gap * 365).astype(np.int64)
+        resale_dates = first_dates[:, None] + np.cumsum(days_gap, axis=1).astype('timedelta64[D]')
+        resale_prices = base_price[:, None] * np.cumprod((1 + annual_appr) ** years_gap, axis=1)
+        
+        # A property stops selling at its sale count or at the first sale
+        # beyond the date range (sale dates only increase)
+        resale_years = resale_dates.astype('datetime64[Y]').astype(np.int64) + 1970
+        keep = ((np.arange(1, max_resales + 1) < n_transactions[:, None]) &
+                (resale_years <= years_range[1]))
+        keep = np.hstack([np.ones((n, 1), dtype=bool), keep])
+        
+        # Rows in property order, each property's sales in date order
+        columns['property_id'].append(np.repeat(property_ids, max_resales + 1)[keep.ravel()])
+        columns['transaction_date'].append(np.hstack([first_dates[:, None], resale_dates])[keep])
+        columns['transaction_price'].append(np.hstack([base_price[:, None], resale_prices])[keep])
+        columns['census_tract_2010'].append(np.repeat(tract, max_resales + 1)[keep.ravel()])
+        columns['cbsa_id'].append(np.full(np.count_nonzero(keep), cbsa_id, dtype=object))
+    
+    transactions = {name: np.concatenate(chunks) for name, chunks in columns.items()}
+    transactions['transaction_date'] = transactions['transaction_date'].astype('datetime64[ns]')
     return pd.DataFrame(transactions)
 
 
@@ -104,22 +95,24 @@ def generate_geographic_data(cbsa_tracts):
     for cbsa_id, tracts in cbsa_tracts.items():
         center_lat, center_lon = cbsa_centers[cbsa_id]
         
-        for i, tract in enumerate(tracts):
-            # Create grid around center
-            row = i // 5
-            col = i % 5
-            
-            lat = center_lat + (row - 2) * 0.02  # ~2km spacing
-            lon = center_lon + (col - 2) * 0.02
-            
-            geographic_data.append({
-                'census_tract_2010': tract,
-                'centroid_lat': lat,
-                'centroid_lon': lon,
-                'cbsa_id': cbsa_id
-            })
-    
-    return pd.DataFrame(geographic_data)
+        # Create grid around center, 5 tracts per row
+        position = np.arange(len(tracts))
+        row = position // 5
+        col = position % 5
+        
+        geographic_data.append(pd.DataFrame({
+            'census_tract_2010': tracts,
+            'centroid_lat': center_lat + (row - 2) * 0.02,  # ~2km spacing
+            'centroid_lon': center_lon + (col - 2) * 0.02,
+            'cbsa_id': cbsa_id
+        }))
+    
+    return pd.concat(geographic_data, ignore_index=True)
+
+
+def _rows_by_tract(demographic, yearly):
+    """Each tract's 2010 value followed by its yearly values, as one column"""
+    return np.hstack([np.asarray(demographic, dtype=np.float64)[:, None], yearly]).ravel()
 
 
 def generate_weighting_data(cbsa_tracts, years_range=(2015, 2021)):
@@ -134,47 +127,44 @@ def generate_weighting_data(cbsa_tracts, years_range=(2015, 2021)):
         '47900': {'units': 1.2, 'value': 0.8, 'upb': 0.9}
     }
     
+    # Growth over time: 2% annual growth (values grow a further 3%)
+    years = np.arange(years_range[0], years_range[1] + 1)
+    years_from_base = years - years_range[0]
+    growth_factor = 1 + 0.02 * years_from_base
+    value_growth = growth_factor * (1 + 0.03 * years_from_base)
+    
     for cbsa_id, tracts in cbsa_tracts.items():
         mult = cbsa_multipliers[cbsa_id]
+        n = len(tracts)
+        
+        # Generate base values with some variation
+        base_units = rng.integers(800, 1500, size=n) * mult['units']
+        base_value = base_units * rng.uniform(400000, 600000, size=n) * mult['value']
+        base_upb = base_value * rng.uniform(0.7, 0.85, size=n) * mult['upb']
+        
+        # Demographics (static for 2010)
+        college_pop = rng.integers(1500, 3500, size=n)
+        non_white_pop = rng.integers(1000, 4000, size=n)
         
-        for i, tract in enumerate(tracts):
-            # Generate base values with some variation
-            base_units = np.random.randint(800, 1500) * mult['units']
-            base_value = base_units * np.random.uniform(400000, 600000) * mult['value']
-            base_upb = base_value * np.random.uniform(0.7, 0.85) * mult['upb']
-            
-            # Demographics (static for 2010)
-            college_pop = np.random.randint(1500, 3500)
-            non_white_pop = np.random.randint(1000, 4000)
-            
-            # Add 2010 demographic data
-            weighting_data.append({
-                'census_tract_2010': tract,
-                'year': 2010,
-                'total_housing_units': None,
-                'total_housing_value': None,
-                'total_upb': None,
-                'college_population': college_pop,
-                'non_white_population': non_white_pop
-            })
-            
-            # Add yearly data
-            for year in range(years_range[0], years_range[1] + 1):
-                # Apply growth over time
-                years_from_base = year - years_range[0]
-                growth_factor = 1 + 0.02 * years_from_base  # 2% annual growth
-                
-                weighting_data.append({
-                    'census_tract_2010': tract,
-                    'year': year,
-                    'total_housing_units': int(base_units * growth_factor),
-                    'total_housing_value': base_value * growth_factor * (1 + 0.03 * years_from_base),
-                    'total_upb': base_upb * growth_factor,
-                    'college_population': None,  # Only in 2010
-                    'non_white_population': None  # Only in 2010
-                })
-    
-    return pd.DataFrame(weighting_data)
+        # One 2010 demographic row and then the yearly rows for each tract
+        # (tract x year grids, flattened tract by tract)
+        no_demographics = np.full(n, np.nan)
+        no_yearly = np.full((n, len(years)), np.nan)
+        weighting_data.append(pd.DataFrame({
+            'census_tract_2010': np.repeat(tracts, len(years) + 1),
+            'year': np.tile(np.concatenate([[2010], years]), n),
+            'total_housing_units': _rows_by_tract(
+                no_demographics, np.floor(np.outer(base_units, growth_factor))
+            ),
+            'total_housing_value': _rows_by_tract(
+                no_demographics, np.outer(base_value, value_growth)
+            ),
+            'total_upb': _rows_by_tract(no_demographics, np.outer(base_upb, growth_factor)),
+            'college_population': _rows_by_tract(college_pop, no_yearly),  # Only in 2010
+            'non_white_population': _rows_by_tract(non_white_pop, no_yearly)  # Only in 2010
+        }))
+    
+    return pd.concat(weighting_data, ignore_index=True)
 
 
 def save_sample_data(output_dir='rsai/data/sample'):
@@ -0,0 +1,165 @@
+"""Unit tests for city-level aggregation"""
+
+import pytest
+import pandas as pd
+import numpy as np
+
+from rsai.src.index.aggregation import CityLevelAggregator
+from rsai.src.index.weights import SampleWeighting, WeightCalculator
+
+
+class CountingWeightCalculator(WeightCalculator):
+    """WeightCalculator that counts calculate_scheme_weights calls"""
+    
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+    
+    def calculate_scheme_weights(self, *args, **kwargs):
+        self.calls += 1
+        return super().calculate_scheme_weights(*args, **kwargs)
+
+
+class TestCityLevelAggregator:
+    """Test CityLevelAggregator class"""
+    
+    @pytest.fixture
+    def supertract_data(self):
+        """Create supertract definitions and appreciation rates for one CBSA"""
+        definitions = pd.DataFrame({
+            'supertract_id': [f'31080_2020_ST{i:04d}' for i in range(3)],
+            'year': 2020,
+            'cbsa_id': '31080',
+            'component_tracts': [[f'0603712345{i}'] for i in range(3)],
+            'half_pairs_count': [40, 60, 100]
+        })
+        appreciation = pd.DataFrame({
+            'supertract_id': definitions['supertract_id'],
+            'cbsa_id': '31080',
+            'appreciation_rate': [0.01, 0.02, 0.04],
+            'n_observations': [20, 30, 50]
+        })
+        
+        return definitions, appreciation
+    
+    def test_sample_weighted_appreciation(self, supertract_data):
+        """Test city appreciation is the half-pairs weighted average"""
+        definitions, appreciation = supertract_data
+        aggregator = CityLevelAggregator()
+        
+        result = aggregator.aggregate_to_city_level(
+            appreciation, definitions, 2020, weighting_schemes=['sample']
+        )
+        
+        expected = np.dot([0.2, 0.3, 0.5], [0.01, 0.02, 0.04])
+        assert len(result) == 1
+        assert abs(result['appreciation_rate'].iloc[0] - expected) < 1e-12
+        assert result['n_supertracts'].iloc[0] == 3
+        assert result['total_observations'].iloc[0] == 100
+    
+    def test_weights_cached_for_same_inputs(self, supertract_data):
+        """Test weights are reused for the same frames and recomputed for new ones"""
+        definitions, appreciation = supertract_data
+        calculator = CountingWeightCalculator()
+        aggregator = CityLevelAggregator(calculator)
+        
+        first = aggregator.aggregate_to_city_level(
+            appreciation, definitions, 2020, weighting_schemes=['sample']
+        )
+        second = aggregator.aggregate_to_city_level(
+            appreciation, definitions, 2020, weighting_schemes=['sample']
+        )
+        assert calculator.calls == 1
+        pd.testing.assert_frame_equal(first, second)
+        
+        changed = definitions.assign(half_pairs_count=[100, 60, 40])
+        third = aggregator.aggregate_to_city_level(
+            appreciation, changed, 2020, weighting_schemes=['sample']
+        )
+        assert calculator.calls == 2
+        assert third['appreciation_rate'].iloc[0] != first['appreciation_rate'].iloc[0]
+    
+    def test_weights_computed_once_per_cbsa_year(self, supertract_data):
+        """Test all requested schemes share one calculation; new schemes are added"""
+        definitions, appreciation = supertract_data
+        calculator = CountingWeightCalculator()
+        aggregator = CityLevelAggregator(calculator)
+        
+        aggregator.aggregate_to_city_level(
+            appreciation, definitions, 2020, weighting_schemes=['sample', 'value']
+        )
+        assert calculator.calls == 1
+        
+        aggregator.aggregate_to_city_level(
+            appreciation, definitions, 2020, weighting_schemes=['value', 'sample']
+        )
+        assert calculator.calls == 1
+        
+        result = aggregator.aggregate_to_city_level(
+            appreciation, definitions, 2020, weighting_schemes=['sample', 'unknown']
+        )
+        assert calculator.calls == 1
+        assert result['appreciation_rate'].iloc[1] == 0.0
+        
+        aggregator.aggregate_to_city_level(
+            appreciation, definitions, 2020, weighting_schemes=['unit', 'upb', 'sample']
+        )
+        assert calculator.calls == 2
+        assert list(aggregator._weight_cache[('31080', 2020)][0].columns) == [
+            'sample', 'value', 'unit', 'upb'
+        ]
+    
+    def test_multiple_schemes_with_failure(self, supertract_data):
+        """Test each scheme is aggregated and a failing scheme falls back to zero"""
+        definitions, appreciation = supertract_data
+        aggregator = CityLevelAggregator()
+        
+        # Value weighting needs weighting_data, so it fails here
+        result = aggregator.aggregate_to_city_level(
+            appreciation, definitions, 2020, weighting_schemes=['value', 'sample']
+        )
+        
+        assert result['weighting_scheme'].tolist() == ['value', 'sample']
+        assert result['appreciation_rate'].iloc[0] == 0.0
+        expected = np.dot([0.2, 0.3, 0.5], [0.01, 0.02, 0.04])
+        assert abs(result['appreciation_rate'].iloc[1] - expected) < 1e-12
+    
+    def test_partial_scheme_weights(self, supertract_data):
+        """Test a scheme covering only some supertracts weights the rest by 0"""
+        definitions, appreciation = supertract_data
+        
+        class PartialWeighting(SampleWeighting):
+            def calculate_weights(self, supertract_data, year, **kwargs):
+                return super().calculate_weights(supertract_data.iloc[:-1], year, **kwargs)
+        calculator = WeightCalculator()
+        calculator.add_custom_scheme('partial', PartialWeighting())
+        aggregator = CityLevelAggregator(calculator)
+        
+        result = aggregator.aggregate_to_city_level(
+            appreciation, definitions, 2020, weighting_schemes=['partial']
+        )
+        
+        expected = np.dot([0.4, 0.6], [0.01, 0.02])
+        assert abs(result['appreciation_rate'].iloc[0] - expected) < 1e-12
+    
+    def test_get_appreciation_matrix(self, supertract_data):
+        """Test per-CBSA time series from stored results; re-runs replace a year"""
+        definitions, appreciation = supertract_data
+        aggregator = CityLevelAggregator()
+        
+        for year in [2021, 2020]:
+            year_definitions = definitions.assign(year=year)
+            aggregator.aggregate_to_city_level(
+                appreciation, year_definitions, year, weighting_schemes=['sample']
+            )
+        aggregator.aggregate_to_city_level(
+            appreciation.assign(appreciation_rate=0.05), definitions, 2020,
+            weighting_schemes=['sample']
+        )
+        
+        matrix = aggregator.get_appreciation_matrix('31080', 'sample')
+        
+        assert matrix['year'].tolist() == [2020, 2021]
+        np.testing.assert_allclose(matrix['appreciation_rate'], [0.05, 0.028])
+        assert matrix['n_observations'].tolist() == [100, 100]
+        assert aggregator.get_appreciation_matrix('99999', 'sample').empty
@@ -4,83 +4,80 @@ import pytest
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from scipy import sparse
+import statsmodels.api as sm
 
-from rsai.src.index.bmn_regression import BMNRegression, run_bmn_for_supertract
+from rsai.src.index.bmn_regression import (
+    BMNCache, BMNRegression, BMNResults, run_bmn_for_supertract, run_bmn_for_supertracts,
+    _batch_coefficients, _bmn_coefficients, _time_dummy_design, _time_dummy_normal_equations
+)
+
+
+@pytest.fixture(scope="module")
+def simple_repeat_sales():
+    """Create simple repeat sales data for testing"""
+    # Create data with known appreciation pattern
+    # 5% annual appreciation
+    i = np.arange(50)  # Need enough observations
+    first_year = 2015 + (i % 3)
+    second_year = first_year + 2 + (i % 2)
+    
+    first_price = 200000 + i * 1000
+    # Apply compound appreciation
+    second_price = first_price * (1.05 ** (second_year - first_year))
+    
+    return pd.DataFrame({
+        'property_id': [f'PROP{j:03d}' for j in i],
+        'first_sale_date': pd.to_datetime({'year': first_year, 'month': 6, 'day': 1}),
+        'second_sale_date': pd.to_datetime({'year': second_year, 'month': 6, 'day': 1}),
+        'first_sale_price': first_price,
+        'second_sale_price': second_price,
+        'log_price_relative': np.log(second_price / first_price),
+        'census_tract_2010': '06037123456',
+        'cbsa_id': '31080'
+    })
+
+@pytest.fixture(scope="module")
+def volatile_repeat_sales():
+    """Create repeat sales with varying appreciation rates"""
+    # Different appreciation rates by year
+    appreciation_by_year = {
+        2016: 0.03,
+        2017: 0.08,
+        2018: 0.05,
+        2019: -0.02,
+        2020: 0.10
+    }
+    
+    i = np.arange(100)
+    first_year = 2015 + (i % 4)
+    second_year = np.minimum(first_year + 1 + (i % 3), 2020)
+    
+    first_price = 300000 + i * 2000
+    
+    # Calculate cumulative appreciation, compounding year by year
+    cumulative_appr = np.ones(len(i))
+    for year, rate in appreciation_by_year.items():
+        held = (first_year < year) & (year <= second_year)
+        cumulative_appr[held] *= (1 + rate)
+    
+    second_price = first_price * cumulative_appr
+    
+    return pd.DataFrame({
+        'property_id': [f'PROP{j:03d}' for j in i],
+        'first_sale_date': pd.to_datetime({'year': first_year, 'month': 6, 'day': 1}),
+        'second_sale_date': pd.to_datetime({'year': second_year, 'month': 6, 'day': 1}),
+        'first_sale_price': first_price,
+        'second_sale_price': second_price,
+        'log_price_relative': np.log(second_price / first_price),
+        'census_tract_2010': '06037123456',
+        'cbsa_id': '31080'
+    })
 
 
 class TestBMNRegression:
     """Test BMNRegression class"""
     
-    @pytest.fixture
-    def simple_repeat_sales(self):
-        """Create simple repeat sales data for testing"""
-        # Create data with known appreciation pattern
-        # 5% annual appreciation
-        data = []
-        
-        for i in range(50):  # Need enough observations
-            first_year = 2015 + (i % 3)
-            second_year = first_year + 2 + (i % 2)
-            
-            first_price = 200000 + i * 1000
-            # Apply compound appreciation
-            years_diff = second_year - first_year
-            second_price = first_price * (1.05 ** years_diff)
-            
-            data.append({
-                'property_id': f'PROP{i:03d}',
-                'first_sale_date': pd.to_datetime(f'{first_year}-06-01'),
-                'second_sale_date': pd.to_datetime(f'{second_year}-06-01'),
-                'first_sale_price': first_price,
-                'second_sale_price': second_price,
-                'log_price_relative': np.log(second_price / first_price),
-                'census_tract_2010': '06037123456',
-                'cbsa_id': '31080'
-            })
-        
-        return pd.DataFrame(data)
-    
-    @pytest.fixture
-    def volatile_repeat_sales(self):
-        """Create repeat sales with varying appreciation rates"""
-        data = []
-        
-        # Different appreciation rates by year
-        appreciation_by_year = {
-            2016: 0.03,
-            2017: 0.08,
-            2018: 0.05,
-            2019: -0.02,
-            2020: 0.10
-        }
-        
-        for i in range(100):
-            first_year = 2015 + (i % 4)
-            second_year = min(first_year + 1 + (i % 3), 2020)
-            
-            first_price = 300000 + i * 2000
-            
-            # Calculate cumulative appreciation
-            cumulative_appr = 1.0
-            for year in range(first_year + 1, second_year + 1):
-                if year in appreciation_by_year:
-                    cumulative_appr *= (1 + appreciation_by_year[year])
-            
-            second_price = first_price * cumulative_appr
-            
-            data.append({
-                'property_id': f'PROP{i:03d}',
-                'first_sale_date': pd.to_datetime(f'{first_year}-06-01'),
-                'second_sale_date': pd.to_datetime(f'{second_year}-06-01'),
-                'first_sale_price': first_price,
-                'second_sale_price': second_price,
-                'log_price_relative': np.log(second_price / first_price),
-                'census_tract_2010': '06037123456',
-                'cbsa_id': '31080'
-            })
-        
-        return pd.DataFrame(data)
-    
     def test_prepare_regression_data(self, simple_repeat_sales):
         """Test preparation of regression data"""
         bmn = BMNRegression()
@@ -107,6 +104,59 @@ class TestBMNRegression:
         if second_year > 2015:
             assert X[0, second_year - 2016] == 1
     
+    def test_prepare_regression_data_stored_years(self, simple_repeat_sales):
+        """Test stored year columns are used and the input frame is not modified"""
+        bmn = BMNRegression()
+        original = simple_repeat_sales.copy()
+        
+        X, y, _ = bmn.prepare_regression_data(simple_repeat_sales, 2015, 2020)
+        pd.testing.assert_frame_equal(simple_repeat_sales, original)
+        
+        # Stored years take precedence over the sale dates
+        with_years = simple_repeat_sales.assign(
+            first_year=simple_repeat_sales['first_sale_date'].dt.year.astype(np.int16),
+            second_year=simple_repeat_sales['second_sale_date'].dt.year.astype(np.int16)
+        )
+        X_stored, _, _ = bmn.prepare_regression_data(with_years, 2015, 2020)
+        np.testing.assert_array_equal(X_stored, X)
+        
+        shifted = with_years.assign(second_year=with_years['second_year'] - 1)
+        X_shifted, _, _ = bmn.prepare_regression_data(shifted, 2015, 2020)
+        assert not np.array_equal(X_shifted, X)
+    
+    def test_prepare_regression_data_sparse(self, volatile_repeat_sales):
+        """Test sparse design equals dense and an element-wise reference fill"""
+        bmn = BMNRegression()
+        
+        X_dense, y, years = bmn.prepare_regression_data(volatile_repeat_sales, 2016, 2019)
+        X_sparse, _, _ = bmn.prepare_regression_data(
+            volatile_repeat_sales, 2016, 2019, dense=False
+        )
+        
+        expected = np.zeros((len(volatile_repeat_sales), len(years) - 1))
+        sale_dates = volatile_repeat_sales[['first_sale_date', 'second_sale_date']]
+        for i, (first_date, second_date) in enumerate(
+            sale_dates.itertuples(index=False, name=None)
+        ):
+            first_idx = first_date.year - 2016
+            second_idx = second_date.year - 2016
+            # Pairs outside the time range keep an all-zero row
+            if first_idx < 0 or second_idx >= len(years):
+                continue
+            if first_idx > 0:
+                expected[i, first_idx - 1] = -1
+            if second_idx > 0:
+                expected[i, second_idx - 1] = 1
+        
+        assert sparse.issparse(X_sparse)
+        assert X_sparse.dtype == np.float32
+        assert X_dense.dtype == np.float64
+        assert X_dense.flags.f_contiguous
+        assert y.dtype == np.float64 and y.flags.c_contiguous
+        np.testing.assert_array_equal(X_sparse.toarray(), X_dense)
+        np.testing.assert_array_equal(X_dense, expected)
+        assert len(y) == len(volatile_repeat_sales)
+    
     def test_run_regression(self, simple_repeat_sales):
         """Test running BMN regression"""
         bmn = BMNRegression()
@@ -123,9 +173,73 @@ class TestBMNRegression:
         
         # With 5% annual appreciation, coefficients should roughly follow pattern
         # Check that coefficients are increasing (cumulative effect)
-        coeffs = results.params
-        for i in range(1, len(coeffs)):
-            assert coeffs[i] > coeffs[i-1]  # Should be increasing
+        coeffs = np.asarray(results.params)
+        assert (np.diff(coeffs) > 0).all()  # Should be increasing
+    
+    def test_run_regression_matches_statsmodels_fit(self, volatile_repeat_sales):
+        """Test the normal-equations results equal statsmodels' own OLS fit"""
+        # Noisy prices, so the residual statistics are not all ~0
+        noise = np.random.default_rng(0).normal(0, 0.02, len(volatile_repeat_sales))
+        df = volatile_repeat_sales.assign(
+            log_price_relative=volatile_repeat_sales['log_price_relative'] + noise
+        )
+        bmn = BMNRegression()
+        results = bmn.run_regression(df, 2015, 2020)
+        
+        X, y, _ = bmn.prepare_regression_data(df, 2015, 2020)
+        expected = sm.OLS(y, X).fit()
+        
+        np.testing.assert_allclose(results.params, expected.params, rtol=1e-10)
+        np.testing.assert_allclose(results.bse, expected.bse, rtol=1e-8)
+        for name in ['rsquared', 'rsquared_adj', 'fvalue', 'f_pvalue', 'nobs',
+                     'df_model', 'df_resid', 'aic', 'bic', 'mse_resid']:
+            assert getattr(results, name) == pytest.approx(getattr(expected, name), rel=1e-8)
+    
+    def test_run_regression_implicit_constant(self):
+        """Test the fit statistics when every pair starts in the base period"""
+        # The year dummies then sum to one, so R-squared is centered
+        n = 200
+        second_years = 2016 + np.arange(n) % 5
+        noise = np.random.default_rng(1).normal(0, 0.02, n)
+        df = pd.DataFrame({
+            'first_sale_date': pd.Timestamp('2015-06-01'),
+            'second_sale_date': pd.to_datetime({'year': second_years, 'month': 6, 'day': 1}),
+            'log_price_relative': 0.05 * (second_years - 2015) + noise
+        })
+        bmn = BMNRegression()
+        results = bmn.run_regression(df, 2015, 2020)
+        
+        X, y, _ = bmn.prepare_regression_data(df, 2015, 2020)
+        expected = sm.OLS(y, X).fit()
+        
+        assert expected.k_constant == 1
+        np.testing.assert_allclose(results.bse, expected.bse, rtol=1e-8)
+        for name in ['rsquared', 'rsquared_adj', 'fvalue', 'f_pvalue',
+                     'df_model', 'aic', 'bic']:
+            assert getattr(results, name) == pytest.approx(getattr(expected, name), rel=1e-8)
+    
+    def test_run_regression_small_design(self):
+        """Test a few pairs per parameter still skip statsmodels and match it"""
+        first_years = np.array([2015, 2015, 2016, 2016, 2017, 2017, 2018, 2018, 2019, 2015, 2016, 2017])
+        second_years = np.array([2016, 2018, 2017, 2020, 2018, 2019, 2019, 2020, 2020, 2017, 2019, 2020])
+        noise = np.random.default_rng(2).normal(0, 0.02, len(first_years))
+        df = pd.DataFrame({
+            'first_sale_date': pd.to_datetime({'year': first_years, 'month': 6, 'day': 1}),
+            'second_sale_date': pd.to_datetime({'year': second_years, 'month': 6, 'day': 1}),
+            'log_price_relative': 0.05 * (second_years - first_years) + noise
+        })
+        bmn = BMNRegression()
+        results = bmn.run_regression(df, 2015, 2020)
+        
+        X, y, _ = bmn.prepare_regression_data(df, 2015, 2020)
+        expected = sm.OLS(y, X).fit()
+        
+        assert isinstance(results, BMNResults)
+        assert X.shape[0] < 4 * X.shape[1]
+        np.testing.assert_allclose(results.params, expected.params, rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(results.bse, expected.bse, rtol=1e-8)
+        for name in ['rsquared', 'rsquared_adj', 'fvalue', 'f_pvalue', 'df_resid', 'aic', 'bic']:
+            assert getattr(results, name) == pytest.approx(getattr(expected, name), rel=1e-8)
     
     def test_get_index_values(self, simple_repeat_sales):
         """Test extraction of index values"""
@@ -147,9 +261,8 @@ class TestBMNRegression:
         assert base_row['coefficient'].iloc[0] == 0.0
         
         # Index values should be increasing (with 5% appreciation)
-        index_values = index_df.sort_values('year')['index_value'].values
-        for i in range(1, len(index_values)):
-            assert index_values[i] > index_values[i-1]
+        index_values = index_df.sort_values('year')['index_value'].to_numpy()
+        assert (np.diff(index_values) > 0).all()
     
     def test_get_appreciation_rates(self, volatile_repeat_sales):
         """Test calculation of appreciation rates"""
@@ -169,6 +282,23 @@ class TestBMNRegression:
         # Should be positive but reasonable
         assert -0.2 < first_appr < 0.2  # Within reasonable bounds
     
+    def test_index_values_and_rates_from_params(self, volatile_repeat_sales):
+        """Test index values and rates are read straight from the fitted params"""
+        bmn = BMNRegression()
+        results = bmn.run_regression(volatile_repeat_sales, 2015, 2020)
+        
+        index_df = bmn.get_index_values(base_value=50.0)
+        appr_df = bmn.get_appreciation_rates()
+        
+        coefficients = np.concatenate([[0.0], results.params])
+        assert index_df.columns.tolist() == ['year', 'coefficient', 'std_error', 'index_value']
+        assert index_df['year'].tolist() == list(range(2015, 2021))
+        np.testing.assert_array_equal(index_df['coefficient'], coefficients)
+        np.testing.assert_array_equal(index_df['std_error'], np.concatenate([[0.0], results.bse]))
+        np.testing.assert_allclose(index_df['index_value'], 50.0 * np.exp(coefficients))
+        assert appr_df['year'].tolist() == list(range(2016, 2021))
+        np.testing.assert_allclose(appr_df['appreciation_rate'], np.diff(coefficients))
+    
     def test_get_coefficient_for_year(self, simple_repeat_sales):
         """Test getting coefficient for specific year"""
         bmn = BMNRegression()
@@ -248,6 +378,14 @@ class TestBMNRegression:
         assert isinstance(coef_t, float)
         assert appreciation_rate > 0  # Should have positive appreciation
         
+        # Categorical tracts (as loaded) filter on their codes to the same pairs
+        categorical_sales = simple_repeat_sales.astype(
+            {'census_tract_2010': 'category', 'cbsa_id': 'category'}
+        )
+        assert run_bmn_for_supertract(
+            categorical_sales, ['06037123456'], 2018
+        ) == (appreciation_rate, coef_t)
+        
         # Test with no data for tract
         appreciation_rate, coef_t = run_bmn_for_supertract(
             simple_repeat_sales,
@@ -256,4 +394,158 @@ class TestBMNRegression:
         )
         
         assert appreciation_rate == 0.0
-        assert coef_t == 0.0
\ No newline at end of file
+        assert coef_t == 0.0
+    
+    def test_run_bmn_for_supertract_reuses_regression(self, volatile_repeat_sales):
+        """Test a passed-in regression object gives the same results on reuse"""
+        bmn = BMNRegression()
+        for year in [2017, 2019, 2018]:
+            expected = run_bmn_for_supertract(volatile_repeat_sales, ['06037123456'], year)
+            result = run_bmn_for_supertract(volatile_repeat_sales, ['06037123456'], year, bmn=bmn)
+            assert result == expected
+        assert bmn.results is not None
+    
+    def test_fit_fast_matches_ols(self, volatile_repeat_sales):
+        """Test the direct solver gives the statsmodels OLS coefficients"""
+        bmn = BMNRegression()
+        ols_params = bmn.run_regression(volatile_repeat_sales).params
+        ols_rates = bmn.get_appreciation_rates()
+        
+        fit = bmn.fit_fast(volatile_repeat_sales)
+        
+        np.testing.assert_allclose(fit.params, ols_params, rtol=1e-10, atol=1e-12)
+        pd.testing.assert_frame_equal(bmn.get_appreciation_rates(), ols_rates)
+    
+    def test_normal_equations_match_design(self):
+        """Test X'X and X'y accumulated from period offsets equal the design's"""
+        rng = np.random.default_rng(0)
+        # Includes same-period pairs and pairs outside [0, n_periods)
+        first_idx = rng.integers(-1, 6, size=200)
+        second_idx = first_idx + rng.integers(0, 3, size=200)
+        y = rng.normal(size=200)
+        
+        XtX, Xty = _time_dummy_normal_equations(first_idx, second_idx, y, 6)
+        X = _time_dummy_design(first_idx, second_idx, 6).toarray().astype(np.float64)
+        
+        np.testing.assert_array_equal(XtX, X.T @ X)
+        np.testing.assert_allclose(Xty, X.T @ y, rtol=1e-12, atol=1e-12)
+    
+    def test_batch_coefficients_match_single(self):
+        """Test stacked supertract solves equal one-at-a-time regressions"""
+        rng = np.random.default_rng(0)
+        groups = []
+        for start, n_periods, n_pairs in [(2000, 6, 80), (2005, 3, 40), (2010, 1, 5), (1995, 9, 150)]:
+            first = start + rng.integers(0, n_periods, n_pairs)
+            second = np.minimum(first + rng.integers(0, 4, n_pairs), start + n_periods - 1)
+            groups.append((first.astype(np.int16), second.astype(np.int16), rng.normal(0, 0.1, n_pairs)))
+        # A period without sales: left to the one-at-a-time fallback
+        first = np.array([2000, 2000, 2002, 2002, 2000], dtype=np.int16)
+        groups.append((first, first + 1 + (first == 2000), rng.normal(0, 0.1, 5)))
+        
+        results = _batch_coefficients(
+            *(np.concatenate(arrays) for arrays in zip(*groups)),
+            np.array([len(group[0]) for group in groups])
+        )
+        
+        for group, result in zip(groups[:-1], results):
+            start_year, coefs = _bmn_coefficients(*group)
+            assert result[0] == start_year
+            np.testing.assert_allclose(result[1], coefs, rtol=1e-12, atol=1e-14)
+        assert results[-1] is None
+    
+    def test_fit_fast_rank_deficient(self, volatile_repeat_sales):
+        """Test a period without sales falls back to the minimum-norm solution"""
+        bmn = BMNRegression()
+        
+        # 2021 has no sales, so its dummy column is all zero
+        bmn.fit_fast(volatile_repeat_sales, 2015, 2021)
+        X, y, _ = bmn.prepare_regression_data(volatile_repeat_sales, 2015, 2021)
+        
+        np.testing.assert_allclose(bmn.results.params, np.linalg.pinv(X) @ y, atol=1e-10)
+        assert bmn.get_coefficient_for_year(2021) == pytest.approx(0.0, abs=1e-10)
+    
+    def test_run_bmn_for_supertract_on_subset(self, volatile_repeat_sales):
+        """Test supertract regression on a filtered frame with non-contiguous index"""
+        df = volatile_repeat_sales.copy()
+        df.loc[df.index % 2 == 1, 'census_tract_2010'] = '06037123457'
+        
+        appreciation_rate, _ = run_bmn_for_supertract(df, ['06037123457'], 2018)
+        
+        assert appreciation_rate != 0.0
+    
+    def test_run_bmn_for_supertracts_matches_single(self, volatile_repeat_sales):
+        """Test batched supertract regressions match one-at-a-time results"""
+        df = volatile_repeat_sales.copy()
+        df.loc[df.index % 3 == 1, 'census_tract_2010'] = '06037123457'
+        df.loc[df.index % 3 == 2, 'census_tract_2010'] = '06037123458'
+        supertracts = [
+            ['06037123456'],
+            ['06037123457', '06037123458'],
+            ['06037999999']
+        ]
+        
+        for year in [2016, 2018, 2020]:
+            batched = run_bmn_for_supertracts(df, supertracts, year)
+            expected = [run_bmn_for_supertract(df, tracts, year)[0] for tracts in supertracts]
+            np.testing.assert_allclose(batched, expected, atol=1e-10)
+    
+    def test_run_bmn_for_supertract_with_tract_groups(self, volatile_repeat_sales):
+        """Test reading pairs from the cache's tract groups matches the frame scan"""
+        df = volatile_repeat_sales.copy()
+        df['census_tract_2010'] = pd.Categorical(
+            [f'0603712345{i % 3}' for i in range(len(df))]
+        )
+        df.loc[df.index % 7 == 0, 'census_tract_2010'] = np.nan
+        cache = BMNCache(df)
+        
+        for tracts in [['06037123450'], ['06037123452', '06037123451'], ['06037999999']]:
+            for year in [2015, 2017, 2020, 2021]:
+                expected = run_bmn_for_supertract(df, tracts, year)
+                result = run_bmn_for_supertract(df, tracts, year, cache=cache)
+                np.testing.assert_allclose(result, expected, atol=1e-12)
+    
+    def test_run_bmn_for_supertracts_parallel(self, volatile_repeat_sales):
+        """Test worker-process regressions match in-process results"""
+        df = volatile_repeat_sales.copy()
+        df['census_tract_2010'] = [f'0603712345{i % 4}' for i in range(len(df))]
+        supertracts = [
+            ['06037123450'],
+            ['06037123451', '06037123452'],
+            ['06037123452', '06037123451'],
+            ['06037123453', '06037123450'],
+            ['06037999999']
+        ]
+        
+        serial = run_bmn_for_supertracts(df, supertracts, 2018)
+        cache = BMNCache(df)
+        parallel = run_bmn_for_supertracts(df, supertracts, 2018, cache=cache, n_jobs=2)
+        
+        np.testing.assert_array_equal(parallel, serial)
+        # Repeated compositions are regressed once
+        assert len(cache._coefficients) == 4
+    
+    def test_bmn_cache_reuses_coefficients(self, volatile_repeat_sales):
+        """Test each tract set is regressed once and serves every year"""
+        df = volatile_repeat_sales.copy()
+        df.loc[df.index % 2 == 1, 'census_tract_2010'] = '06037123457'
+        cache = BMNCache(df)
+        tracts = ['06037123456', '06037123457']
+        
+        for year in range(2016, 2021):
+            expected, _ = run_bmn_for_supertract(df, tracts, year)
+            assert cache.get_appreciation(tracts, year) == pytest.approx(expected, abs=1e-12)
+        
+        # Same composition in another order is the same cache entry
+        assert cache.get_coefficients(tracts[::-1]) is cache.get_coefficients(tracts)
+        assert len(cache._coefficients) == 1
+        assert cache.get_appreciation(tracts, 2015) == 0.0
+        assert cache.get_appreciation(['06037999999'], 2018) == 0.0
+    
+    def test_import_does_not_load_statsmodels(self):
+        """Test statsmodels is only imported once an OLS fit needs it"""
+        import subprocess
+        import sys
+        
+        code = ("import sys; import rsai.src.main; "
+                "assert 'statsmodels' not in sys.modules")
+        subprocess.run([sys.executable, '-c', code], check=True)
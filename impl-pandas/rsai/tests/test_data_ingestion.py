@@ -1,13 +1,14 @@
 """Unit tests for data ingestion module"""
 
+import decimal
 import pytest
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import tempfile
-import os
 
-from rsai.src.data.ingestion import DataIngestion, RepeatSalesProcessor
+from rsai.src.data.ingestion import (
+    MISSING_YEAR, DataIngestion, RepeatSalesProcessor, datetime_years, repeat_sales_arrays
+)
 
 
 class TestDataIngestion:
@@ -16,15 +17,17 @@ class TestDataIngestion:
     @pytest.fixture
     def sample_transaction_data(self):
         """Create sample transaction data"""
-        dates = pd.date_range('2018-01-01', '2021-12-31', freq='D')
+        rng = np.random.default_rng(42)
+        start = np.datetime64('2018-01-01')
+        n_days = (np.datetime64('2021-12-31') - start).astype(int) + 1
         n_transactions = 1000
         
         data = {
-            'property_id': [f'PROP{i:04d}' for i in np.random.randint(1, 300, n_transactions)],
-            'transaction_date': np.random.choice(dates, n_transactions),
-            'transaction_price': np.random.uniform(100000, 1000000, n_transactions),
+            'property_id': [f'PROP{i:04d}' for i in rng.integers(1, 300, n_transactions)],
+            'transaction_date': start + rng.integers(0, n_days, n_transactions).astype('timedelta64[D]'),
+            'transaction_price': rng.uniform(100000, 1000000, n_transactions),
             'census_tract_2010': [f'0603712345{i%10}' for i in range(n_transactions)],
-            'cbsa_id': np.random.choice(['31080', '41860', '47900'], n_transactions)
+            'cbsa_id': rng.choice(['31080', '41860', '47900'], n_transactions)
         }
         
         return pd.DataFrame(data)
@@ -32,39 +35,93 @@ class TestDataIngestion:
     @pytest.fixture
     def sample_geographic_data(self):
         """Create sample geographic data"""
+        rng = np.random.default_rng(43)
         tracts = [f'0603712345{i}' for i in range(10)]
         
         data = {
             'census_tract_2010': tracts,
-            'centroid_lat': np.random.uniform(33.5, 34.5, 10),
-            'centroid_lon': np.random.uniform(-119, -117, 10),
+            'centroid_lat': rng.uniform(33.5, 34.5, 10),
+            'centroid_lon': rng.uniform(-119, -117, 10),
             'cbsa_id': ['31080'] * 4 + ['41860'] * 3 + ['47900'] * 3
         }
         
         return pd.DataFrame(data)
     
-    def test_load_transaction_data(self, sample_transaction_data):
+    def test_load_transaction_data(self, sample_transaction_data, tmp_path):
         """Test loading transaction data"""
         ingestion = DataIngestion()
         
         # Save to temp file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            sample_transaction_data.to_csv(f.name, index=False)
-            temp_file = f.name
+        temp_file = str(tmp_path / 'data.csv')
+        sample_transaction_data.to_csv(temp_file, index=False)
         
-        try:
-            # Load data
-            df = ingestion.load_transaction_data(temp_file)
-            
-            # Check data loaded correctly
-            assert len(df) == len(sample_transaction_data)
-            assert 'property_id' in df.columns
-            assert 'transaction_date' in df.columns
-            assert df['transaction_price'].min() > 0
-        finally:
-            os.unlink(temp_file)
+        # Load data
+        df = ingestion.load_transaction_data(temp_file)
+        
+        # Check data loaded correctly
+        assert len(df) == len(sample_transaction_data)
+        assert 'property_id' in df.columns
+        assert 'transaction_date' in df.columns
+        assert df['transaction_price'].min() > 0
+        
+        # Sorted by property and date for repeat sales identification
+        expected = df.sort_values(['property_id', 'transaction_date'], kind='mergesort')
+        pd.testing.assert_frame_equal(df, expected)
+    
+    def test_invalid_rows_dropped_and_ids_preserved(self, tmp_path):
+        """Test non-positive prices and nulls are dropped and IDs keep leading zeros"""
+        ingestion = DataIngestion()
+        
+        data = pd.DataFrame({
+            'property_id': ['PROP001', 'PROP002', 'PROP003', 'PROP004'],
+            'transaction_date': ['2020-01-01', '2020-02-01', '2020-03-01', None],
+            'transaction_price': [250000.0, -5.0, 300000.0, 200000.0],
+            'census_tract_2010': ['06037123456', '06037123456', '06037123457', '06037123458'],
+            'cbsa_id': ['01080', '01080', '01080', '01080']
+        })
+        
+        temp_file = str(tmp_path / 'data.csv')
+        data.to_csv(temp_file, index=False)
+        
+        df = ingestion.load_transaction_data(temp_file)
+        
+        assert df['property_id'].tolist() == ['PROP001', 'PROP003']
+        assert df['census_tract_2010'].tolist() == ['06037123456', '06037123457']
+        assert (df['cbsa_id'] == '01080').all()
+        assert isinstance(df['census_tract_2010'].dtype, pd.CategoricalDtype)
+        assert pd.api.types.is_datetime64_any_dtype(df['transaction_date'])
     
-    def test_missing_columns_error(self):
+    def test_datetime_years(self):
+        """Test year extraction matches the .dt.year accessor"""
+        dates = pd.Series(pd.to_datetime([
+            '1965-06-30', '1969-12-31 23:59:59', '1970-01-01', '2019-12-31 23:59:59',
+            '2020-01-01', '2020-02-29', '2038-07-04'
+        ], format='ISO8601'))
+        
+        years = datetime_years(dates)
+        
+        assert years.dtype == np.int16
+        np.testing.assert_array_equal(years, dates.dt.year.to_numpy())
+    
+    def test_datetime_years_missing_dates(self):
+        """Test missing dates map to MISSING_YEAR and are rejected downstream"""
+        dates = pd.Series(pd.to_datetime(['2019-05-01', None, '2020-01-01']))
+        
+        years = datetime_years(dates)
+        
+        assert years.dtype == np.int16
+        np.testing.assert_array_equal(years, [2019, MISSING_YEAR, 2020])
+        
+        pairs = pd.DataFrame({
+            'census_tract_2010': ['12345678901', '12345678901'],
+            'first_sale_date': pd.to_datetime(['2015-01-01', None]),
+            'second_sale_date': pd.to_datetime(['2019-01-01', '2020-01-01']),
+            'log_price_relative': [0.1, 0.2]
+        })
+        with pytest.raises(ValueError, match="missing sale dates"):
+            repeat_sales_arrays(pairs)
+    
+    def test_missing_columns_error(self, tmp_path):
         """Test error when required columns are missing"""
         ingestion = DataIngestion()
         
@@ -77,33 +134,70 @@ class TestDataIngestion:
             'cbsa_id': ['31080']
         })
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            bad_data.to_csv(f.name, index=False)
-            temp_file = f.name
+        temp_file = str(tmp_path / 'data.csv')
+        bad_data.to_csv(temp_file, index=False)
         
-        try:
-            with pytest.raises(ValueError, match="Missing required columns"):
-                ingestion.load_transaction_data(temp_file)
-        finally:
-            os.unlink(temp_file)
+        with pytest.raises(ValueError, match="Missing required columns"):
+            ingestion.load_transaction_data(temp_file)
     
-    def test_load_geographic_data(self, sample_geographic_data):
+    def test_load_geographic_data(self, sample_geographic_data, tmp_path):
         """Test loading geographic data"""
         ingestion = DataIngestion()
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            sample_geographic_data.to_csv(f.name, index=False)
-            temp_file = f.name
+        temp_file = str(tmp_path / 'data.csv')
+        sample_geographic_data.to_csv(temp_file, index=False)
         
-        try:
-            df = ingestion.load_geographic_data(temp_file)
-            
-            assert len(df) == len(sample_geographic_data)
-            assert all(-90 <= lat <= 90 for lat in df['centroid_lat'])
-            assert all(-180 <= lon <= 180 for lon in df['centroid_lon'])
-        finally:
-            os.unlink(temp_file)
-
+        df = ingestion.load_geographic_data(temp_file)
+        
+        assert len(df) == len(sample_geographic_data)
+        assert df['centroid_lat'].between(-90, 90).all()
+        assert df['centroid_lon'].between(-180, 180).all()
+    
+    
+    def test_share_tract_codes(self):
+        """Test all loaded frames get one tract categorical dtype"""
+        ingestion = DataIngestion()
+        ingestion.transactions_df = pd.DataFrame({
+            'census_tract_2010': pd.Categorical(['06037000300', '06037000100'])
+        })
+        ingestion.geographic_df = pd.DataFrame({
+            'census_tract_2010': pd.Categorical(['06037000100', '06037000200'])
+        })
+        ingestion.weighting_df = pd.DataFrame({
+            'census_tract_2010': ['06037000200', '06037000400']
+        })
+        
+        tract_code_map = ingestion.share_tract_codes()
+        
+        assert tract_code_map.tolist() == [
+            '06037000100', '06037000200', '06037000300', '06037000400'
+        ]
+        assert ingestion.tract_code_map is tract_code_map
+        for df in [ingestion.transactions_df, ingestion.geographic_df, ingestion.weighting_df]:
+            assert df['census_tract_2010'].cat.categories.equals(tract_code_map)
+        np.testing.assert_array_equal(ingestion.transactions_df['census_tract_2010'].cat.codes, [2, 0])
+        np.testing.assert_array_equal(ingestion.weighting_df['census_tract_2010'].cat.codes, [1, 3])
+        assert ingestion.geographic_df['census_tract_2010'].tolist() == ['06037000100', '06037000200']
+    
+    def test_loaders_are_order_independent(self, sample_transaction_data,
+                                           sample_geographic_data, tmp_path):
+        """Test each loader keeps the other frames; tract codes are rebuilt"""
+        ingestion = DataIngestion()
+        transaction_file = str(tmp_path / 'transactions.csv')
+        geographic_file = str(tmp_path / 'geographic.csv')
+        sample_transaction_data.to_csv(transaction_file, index=False)
+        sample_geographic_data.to_csv(geographic_file, index=False)
+        
+        geographic_df = ingestion.load_geographic_data(geographic_file)
+        ingestion.weighting_df = pd.DataFrame({'census_tract_2010': ['06037999999']})
+        ingestion.load_transaction_data(transaction_file)
+        assert ingestion.geographic_df is geographic_df
+        assert '06037999999' in ingestion.share_tract_codes()
+        
+        ingestion.weighting_df = None
+        tract_code_map = ingestion.share_tract_codes()
+        assert '06037999999' not in tract_code_map
+        assert ingestion.tract_code_map is tract_code_map
 
 class TestRepeatSalesProcessor:
     """Test RepeatSalesProcessor class"""
@@ -171,6 +265,58 @@ class TestRepeatSalesProcessor:
         # PROP003 should not appear
         assert 'PROP003' not in repeat_sales['property_id'].values
     
+    def test_identify_repeat_sales_preserves_dtypes(self, repeat_sales_transactions):
+        """Test pair columns keep the dtypes of the transaction columns"""
+        processor = RepeatSalesProcessor()
+        transactions = repeat_sales_transactions.astype(
+            {'property_id': 'category', 'census_tract_2010': 'category'}
+        )
+        
+        repeat_sales = processor.identify_repeat_sales(transactions)
+        expected = processor.identify_repeat_sales(repeat_sales_transactions)
+        
+        assert repeat_sales['first_sale_price'].dtype == transactions['transaction_price'].dtype
+        assert repeat_sales['second_sale_price'].dtype == transactions['transaction_price'].dtype
+        assert pd.api.types.is_datetime64_any_dtype(repeat_sales['first_sale_date'])
+        assert isinstance(repeat_sales['census_tract_2010'].dtype, pd.CategoricalDtype)
+        assert repeat_sales.index.equals(pd.RangeIndex(len(repeat_sales)))
+        
+        # Categorical ids pair on their codes exactly as the strings do
+        assert isinstance(repeat_sales['property_id'].dtype, pd.CategoricalDtype)
+        pd.testing.assert_frame_equal(repeat_sales.astype(str), expected.astype(str))
+    
+    def test_identify_repeat_sales_sort_order(self):
+        """Test pairs follow a stable (property_id, date) sort; missing ids never pair"""
+        rng = np.random.default_rng(3)
+        n = 200
+        dates = pd.Series(pd.to_datetime('2015-01-01') + pd.to_timedelta(rng.integers(0, 40, n), 'D'))
+        dates[rng.random(n) < 0.1] = pd.NaT
+        transactions = pd.DataFrame({
+            'property_id': rng.choice(np.array(['P2', 'P10', 'P1', 'é', None], dtype=object), n),
+            'transaction_date': dates,
+            'transaction_price': np.arange(n, dtype=np.float64),
+            'census_tract_2010': '06037123456',
+            'cbsa_id': '31080'
+        }, index=rng.permutation(n))
+        processor = RepeatSalesProcessor()
+        
+        # Whole days (packed sort key), times of day, and categorical ids
+        with_times = transactions.assign(
+            transaction_date=dates + pd.to_timedelta(rng.integers(0, 3, n), 'h')
+        )
+        for df in [transactions, with_times,
+                   transactions.astype({'property_id': pd.CategoricalDtype(['é', 'P2', 'P10', 'P1'])})]:
+            repeat_sales = processor.identify_repeat_sales(df)
+            
+            ordered = df.sort_values(['property_id', 'transaction_date'], kind='mergesort')
+            next_sale = ordered.shift(-1)
+            same = (ordered['property_id'] == next_sale['property_id']).to_numpy()
+            same[-1] = False
+            np.testing.assert_array_equal(repeat_sales['first_sale_price'],
+                                          ordered['transaction_price'][same])
+            np.testing.assert_array_equal(repeat_sales['second_sale_price'],
+                                          next_sale['transaction_price'][same])
+    
     def test_calculate_price_relatives(self, repeat_sales_transactions):
         """Test calculation of price relatives"""
         processor = RepeatSalesProcessor()
@@ -178,21 +324,97 @@ class TestRepeatSalesProcessor:
         repeat_sales = processor.identify_repeat_sales(repeat_sales_transactions)
         repeat_sales_with_metrics = processor.calculate_price_relatives(repeat_sales)
         
-        # Check calculations for first pair
-        first_pair = repeat_sales_with_metrics.iloc[0]
+        # Check calculations for every pair
+        price_ratio = (repeat_sales_with_metrics['second_sale_price'] /
+                       repeat_sales_with_metrics['first_sale_price']).to_numpy()
         
         # Log price relative
-        expected_log = np.log(first_pair['second_sale_price'] / first_pair['first_sale_price'])
-        assert abs(first_pair['log_price_relative'] - expected_log) < 0.0001
+        np.testing.assert_allclose(repeat_sales_with_metrics['log_price_relative'],
+                                   np.log(price_ratio), rtol=0, atol=0.0001)
         
         # Years between sales
-        days_between = (first_pair['second_sale_date'] - first_pair['first_sale_date']).days
+        days_between = (repeat_sales_with_metrics['second_sale_date'] -
+                        repeat_sales_with_metrics['first_sale_date']).dt.days.to_numpy()
         expected_years = days_between / 365.25
-        assert abs(first_pair['years_between_sales'] - expected_years) < 0.01
+        np.testing.assert_allclose(repeat_sales_with_metrics['years_between_sales'],
+                                   expected_years, rtol=0, atol=0.01)
         
         # Annual growth rate
-        expected_growth = (first_pair['second_sale_price'] / first_pair['first_sale_price']) ** (1 / expected_years) - 1
-        assert abs(first_pair['annual_growth_rate'] - expected_growth) < 0.0001
+        np.testing.assert_allclose(repeat_sales_with_metrics['annual_growth_rate'],
+                                   price_ratio ** (1 / expected_years) - 1, rtol=0, atol=0.0001)
+    
+    def test_price_relative_columns_consistent(self, repeat_sales_transactions):
+        """Test derived metrics all come from the same ratio and holding period"""
+        processor = RepeatSalesProcessor()
+        
+        repeat_sales = processor.identify_repeat_sales(repeat_sales_transactions)
+        result = processor.calculate_price_relatives(repeat_sales)
+        
+        np.testing.assert_allclose(
+            np.exp(result['log_price_relative']), result['cumulative_appreciation']
+        )
+        np.testing.assert_allclose(
+            result['cumulative_appreciation'] ** (1 / result['years_between_sales']) - 1,
+            result['annual_growth_rate']
+        )
+        days = (result['second_sale_date'] - result['first_sale_date']).dt.days
+        np.testing.assert_allclose(result['years_between_sales'], days / 365.25)
+        
+        # Sale years are stored as int16 columns
+        assert result['first_year'].dtype == np.int16
+        np.testing.assert_array_equal(result['first_year'], result['first_sale_date'].dt.year)
+        np.testing.assert_array_equal(result['second_year'], result['second_sale_date'].dt.year)
+    
+    def test_price_relatives_small_changes(self):
+        """Test near-unchanged prices keep full relative precision"""
+        processor = RepeatSalesProcessor()
+        pairs = pd.DataFrame({
+            'first_sale_date': pd.to_datetime(['2018-01-01', '2018-01-01']),
+            'second_sale_date': pd.to_datetime(['2020-01-01', '2021-01-01']),
+            'first_sale_price': [250000.0, 300000.0],
+            'second_sale_price': [250000.01, 299999.97]
+        })
+        
+        result = processor.calculate_price_relatives(pairs)
+        
+        # Exact log of the stored prices' ratio, to 40 digits
+        with decimal.localcontext(decimal.Context(prec=40)):
+            expected = [float((decimal.Decimal(second) / decimal.Decimal(first)).ln())
+                        for first, second in zip(pairs['first_sale_price'], pairs['second_sale_price'])]
+        np.testing.assert_allclose(result['log_price_relative'], expected, rtol=1e-14)
+        np.testing.assert_allclose(result['annual_growth_rate'],
+                                   np.expm1(result['log_price_relative'] / result['years_between_sales']),
+                                   rtol=1e-15)
+    
+    def test_price_relatives_missing_dates(self):
+        """Test a missing sale date gives a NaN holding period, filtered out"""
+        processor = RepeatSalesProcessor()
+        pairs = pd.DataFrame({
+            'first_sale_date': pd.to_datetime(['2018-01-01', None, '2018-01-01']),
+            'second_sale_date': pd.to_datetime(['2020-01-01', '2020-01-01', None]),
+            'first_sale_price': [250000.0, 250000.0, 250000.0],
+            'second_sale_price': [275000.0, 275000.0, 275000.0]
+        })
+        
+        result = processor.calculate_price_relatives(pairs)
+        
+        expected = (pairs['second_sale_date'] - pairs['first_sale_date']).dt.days / 365.25
+        np.testing.assert_array_equal(result['years_between_sales'], expected)
+        assert result['years_between_sales'].isna().tolist() == [False, True, True]
+        assert result['annual_growth_rate'].isna().tolist() == [False, True, True]
+        assert len(processor.apply_filters(result)) == 1
+    
+    def test_calculate_price_relatives_copy(self, repeat_sales_transactions):
+        """Test copy=False adds metric columns in place"""
+        processor = RepeatSalesProcessor()
+        repeat_sales = processor.identify_repeat_sales(repeat_sales_transactions)
+        
+        result = processor.calculate_price_relatives(repeat_sales)
+        assert 'log_price_relative' not in repeat_sales.columns
+        
+        in_place = processor.calculate_price_relatives(repeat_sales, copy=False)
+        assert in_place is repeat_sales
+        pd.testing.assert_frame_equal(in_place, result)
     
     def test_apply_filters(self):
         """Test filtering of repeat sales pairs"""
@@ -257,6 +479,31 @@ class TestRepeatSalesProcessor:
         assert len(filtered) == 1
         assert filtered.iloc[0]['property_id'] == 'PROP001'
     
+    def test_apply_filters_follows_threshold_changes(self):
+        """Test filter thresholds changed after construction are respected"""
+        processor = RepeatSalesProcessor()
+        pairs = pd.DataFrame({
+            'years_between_sales': [2.0, 0.75],
+            'annual_growth_rate': [0.05, 0.05],
+            'cumulative_appreciation': [1.1, 1.04]
+        })
+        
+        assert len(processor.apply_filters(pairs)) == 1
+        
+        processor.min_period_months = 6
+        assert len(processor.apply_filters(pairs)) == 2
+    
+    def test_process_repeat_sales_without_pairs(self, repeat_sales_transactions):
+        """Test transactions without any repeat sale give an empty pairs frame"""
+        processor = RepeatSalesProcessor()
+        single_sales = repeat_sales_transactions.drop_duplicates('property_id')
+        
+        result = processor.process_repeat_sales(single_sales)
+        
+        assert len(result) == 0
+        assert 'log_price_relative' in result.columns
+        assert len(processor.repeat_sales_arrays.log_price_relative) == 0
+    
     def test_process_repeat_sales_integration(self, repeat_sales_transactions):
         """Test complete repeat sales processing pipeline"""
         processor = RepeatSalesProcessor()
@@ -270,7 +517,31 @@ class TestRepeatSalesProcessor:
         assert 'years_between_sales' in result.columns
         
         # All pairs should meet filter criteria
-        assert all(result['years_between_sales'] >= 1.0)  # At least 12 months
-        assert all(abs(result['annual_growth_rate']) <= 0.30)
-        assert all(result['cumulative_appreciation'] <= 10.0)
-        assert all(result['cumulative_appreciation'] >= 0.25)
\ No newline at end of file
+        assert (result['years_between_sales'] >= 1.0).all()  # At least 12 months
+        assert (result['annual_growth_rate'].abs() <= 0.30).all()
+        assert (result['cumulative_appreciation'] <= 10.0).all()
+        assert (result['cumulative_appreciation'] >= 0.25).all()
+    
+    def test_repeat_sales_arrays(self, repeat_sales_transactions):
+        """Test the array view matches the processed repeat sales frame"""
+        processor = RepeatSalesProcessor()
+        result = processor.process_repeat_sales(repeat_sales_transactions)
+        arrays = processor.repeat_sales_arrays
+        
+        assert arrays.tract_code.dtype == np.int32
+        assert arrays.first_year.dtype == np.int16
+        assert arrays.second_year.dtype == np.int16
+        assert arrays.log_price_relative.dtype == np.float64
+        assert list(arrays.tracts[arrays.tract_code]) == list(result['census_tract_2010'])
+        assert list(arrays.first_year) == list(result['first_sale_date'].dt.year)
+        assert list(arrays.second_year) == list(result['second_sale_date'].dt.year)
+        np.testing.assert_array_equal(arrays.log_price_relative,
+                                      result['log_price_relative'].to_numpy())
+        
+        # Categorical tracts reuse their codes
+        categorical = result.astype({'census_tract_2010': 'category'})
+        cat_arrays = repeat_sales_arrays(categorical)
+        np.testing.assert_array_equal(
+            cat_arrays.tract_code, categorical['census_tract_2010'].cat.codes.to_numpy()
+        )
+        assert list(cat_arrays.tracts[cat_arrays.tract_code]) == list(result['census_tract_2010'])
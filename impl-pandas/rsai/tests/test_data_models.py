@@ -6,7 +6,8 @@ from pydantic import ValidationError
 
 from rsai.src.data.models import (
     Transaction, RepeatSalePair, GeographicData, 
-    WeightingData, SupertractDefinition, IndexValue
+    WeightingData, SupertractDefinition, IndexValue,
+    bulk_validate_transactions
 )
 
 
@@ -46,6 +47,31 @@ class TestTransaction:
                 census_tract_2010="06037123456",
                 cbsa_id="31080"
             )
+    
+    
+    def test_bulk_validate_transactions(self):
+        """Test validating a batch of transaction records"""
+        records = [
+            {
+                'property_id': f"PROP00{i}",
+                'transaction_date': date(2020, 1, 15 + i),
+                'transaction_price': 250000.0 + i,
+                'census_tract_2010': "06037123456",
+                'cbsa_id': "31080"
+            }
+            for i in range(3)
+        ]
+        
+        transactions = bulk_validate_transactions(records)
+        
+        assert len(transactions) == 3
+        assert all(isinstance(t, Transaction) for t in transactions)
+        assert transactions[2].transaction_price == 250002.0
+        
+        # A single invalid record fails the batch
+        records[1]['transaction_price'] = -1.0
+        with pytest.raises(ValidationError):
+            bulk_validate_transactions(records)
 
 
 class TestRepeatSalePair:
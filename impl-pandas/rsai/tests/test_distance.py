@@ -0,0 +1,174 @@
+"""Unit tests for geographic distance calculations"""
+
+import pytest
+import pandas as pd
+import numpy as np
+
+from rsai.src.geography.distance import (
+    GeographicDistanceCalculator, TractNeighborSearch,
+    haversine_distance, haversine_vectorized
+)
+
+
+class TestGeographicDistanceCalculator:
+    """Test GeographicDistanceCalculator class"""
+    
+    @pytest.fixture
+    def geographic_data(self):
+        """Create a line of census tracts with increasing spacing"""
+        offsets = [0.0, 0.01, 0.03, 0.06, 0.10]
+        
+        return pd.DataFrame({
+            'census_tract_2010': [f'0603700{i:03d}' for i in range(len(offsets))],
+            'centroid_lat': [34.0 + o for o in offsets],
+            'centroid_lon': [-118.0] * len(offsets),
+            'cbsa_id': ['31080'] * len(offsets)
+        })
+    
+    def test_get_distance_between_tracts(self, geographic_data):
+        """Test tract-to-tract distance uses the haversine formula"""
+        calc = GeographicDistanceCalculator(geographic_data)
+        row1 = geographic_data.iloc[0]
+        row2 = geographic_data.iloc[3]
+        
+        expected = haversine_distance(
+            row1['centroid_lat'], row1['centroid_lon'],
+            row2['centroid_lat'], row2['centroid_lon']
+        )
+        distance = calc.get_distance_between_tracts(
+            row1['census_tract_2010'], row2['census_tract_2010']
+        )
+        
+        assert abs(distance - expected) < 1e-9
+        # 0.06 degrees of latitude is roughly 6.7 km
+        assert 6.0 < distance < 7.0
+    
+    def test_distance_to_unknown_tract_is_infinite(self, geographic_data):
+        """Test unknown tracts give an infinite distance instead of raising"""
+        calc = GeographicDistanceCalculator(geographic_data)
+        tract = geographic_data['census_tract_2010'].iloc[0]
+        
+        assert calc.get_distance_between_tracts(tract, '06037999999') == float('inf')
+        assert calc.get_distance_between_tracts('06037999999', tract) == float('inf')
+    
+    def test_get_all_distances_from_tract(self, geographic_data):
+        """Test distances to all other tracts are sorted and exclude the source"""
+        calc = GeographicDistanceCalculator(geographic_data)
+        source = geographic_data['census_tract_2010'].iloc[2]
+        
+        result = calc.get_all_distances_from_tract(source)
+        
+        assert len(result) == len(geographic_data) - 1
+        assert source not in result['census_tract_2010'].values
+        assert result['distance_km'].is_monotonic_increasing
+        for tract, dist in zip(result['census_tract_2010'], result['distance_km']):
+            assert abs(dist - calc.get_distance_between_tracts(source, tract)) < 1e-9
+    
+    def test_distances_from_matches_vectorized_haversine(self, geographic_data):
+        """Test cached-trig distances agree with the vectorized haversine"""
+        calc = GeographicDistanceCalculator(geographic_data)
+        lats = geographic_data['centroid_lat'].to_numpy()
+        lons = geographic_data['centroid_lon'].to_numpy()
+        
+        distances = calc.distances_from(1)
+        expected = haversine_vectorized(lats[1], lons[1], lats, lons)
+        
+        np.testing.assert_allclose(distances, expected, rtol=1e-12, atol=1e-9)
+        assert distances[1] == 0
+    
+    def test_distance_matrix(self, geographic_data):
+        """Test pairwise matrix entries equal tract-to-tract distances"""
+        calc = GeographicDistanceCalculator(geographic_data)
+        tracts = geographic_data['census_tract_2010'].tolist()[::-1]
+        
+        matrix = calc.distance_matrix(tracts)
+        
+        assert matrix.shape == (len(tracts), len(tracts))
+        for i, t1 in enumerate(tracts):
+            for j, t2 in enumerate(tracts):
+                assert abs(matrix[i, j] - calc.get_distance_between_tracts(t1, t2)) < 1e-9
+    
+    def test_nearest_neighbor_distance_is_great_circle(self, geographic_data):
+        """Test nearest neighbor distance equals the haversine distance"""
+        calc = GeographicDistanceCalculator(geographic_data)
+        tracts = geographic_data['census_tract_2010'].tolist()
+        
+        neighbor, dist = calc.get_nearest_neighbor(tracts[3])
+        
+        assert neighbor == tracts[2]
+        assert abs(dist - calc.get_distance_between_tracts(tracts[3], neighbor)) < 1e-6
+    
+    def test_get_nearest_neighbors_matches_single_queries(self, geographic_data):
+        """Test batched neighbor query agrees with per-tract queries"""
+        calc = GeographicDistanceCalculator(geographic_data)
+        tracts = geographic_data['census_tract_2010'].tolist()
+        
+        nearest, distances = calc.get_nearest_neighbors(tracts)
+        
+        for tract, neighbor, dist in zip(tracts, nearest, distances):
+            expected_neighbor, expected_dist = calc.get_nearest_neighbor(tract)
+            assert neighbor == expected_neighbor
+            assert abs(dist - expected_dist) < 1e-9
+    
+    def test_get_nearest_neighbors_exclusions(self, geographic_data):
+        """Test excluded tracts are skipped and exhausted searches return None"""
+        calc = GeographicDistanceCalculator(geographic_data)
+        tracts = geographic_data['census_tract_2010'].tolist()
+        
+        nearest, _ = calc.get_nearest_neighbors([tracts[0]], exclude_tracts={tracts[1]})
+        assert nearest[0] == tracts[2]
+        
+        nearest, distances = calc.get_nearest_neighbors(
+            [tracts[0]], exclude_tracts=set(tracts[1:])
+        )
+        assert nearest[0] is None
+        assert np.isnan(distances[0])
+    
+    def test_unknown_tract_error(self, geographic_data):
+        """Test error when a tract is not in the geographic data"""
+        calc = GeographicDistanceCalculator(geographic_data)
+        
+        with pytest.raises(ValueError, match="not found"):
+            calc.get_nearest_neighbors(['06037999999'])
+
+
+class TestTractNeighborSearch:
+    """Test TractNeighborSearch class"""
+    
+    @pytest.fixture
+    def scattered_tracts(self):
+        """Create randomly placed tracts (no exact distance ties)"""
+        rng = np.random.default_rng(7)
+        n = 200
+        
+        return pd.DataFrame({
+            'census_tract_2010': [f'06037{i:06d}' for i in range(n)],
+            'centroid_lat': rng.uniform(33.5, 34.5, n),
+            'centroid_lon': rng.uniform(-119, -117, n),
+            'cbsa_id': ['31080'] * n
+        })
+    
+    def test_tree_matches_matrix(self, scattered_tracts):
+        """Test the BallTree path returns the same tract as the dense matrix"""
+        calc = GeographicDistanceCalculator(scattered_tracts)
+        tracts = scattered_tracts['census_tract_2010'].tolist()
+        dense = TractNeighborSearch(calc, tracts)
+        tree = TractNeighborSearch(calc, tracts, max_matrix_tracts=0)
+        assert dense.tree is None and tree.tree is not None
+        
+        rng = np.random.default_rng(11)
+        for n_unavailable in [0, 50, 190, 199]:
+            members = rng.choice(len(tracts), size=3, replace=False)
+            available = np.ones(len(tracts), dtype=bool)
+            available[rng.choice(len(tracts), size=n_unavailable, replace=False)] = False
+            available[members] = False
+            
+            assert tree.nearest(members, available) == dense.nearest(members, available)
+    
+    def test_nothing_available(self, scattered_tracts):
+        """Test None is returned when every tract is unavailable"""
+        calc = GeographicDistanceCalculator(scattered_tracts)
+        tracts = scattered_tracts['census_tract_2010'].tolist()
+        search = TractNeighborSearch(calc, tracts, max_matrix_tracts=0)
+        
+        assert search.nearest(np.array([0]), np.zeros(len(tracts), dtype=bool)) is None
@@ -4,10 +4,12 @@ import pytest
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import tempfile
 import os
 
-from rsai.src.output.export import IndexChainer, OutputGenerator, RSAIExporter
+from rsai.src.output.export import (
+    STANDARD_OUTPUT_DTYPES, IndexChainer, OutputGenerator, RSAIExporter, _chain_index_values,
+    _write_csv
+)
 
 
 class TestIndexChainer:
@@ -58,12 +60,9 @@ class TestIndexChainer:
         assert base_row['index_value'].iloc[0] == 100.0
         
         # Check chaining calculation
-        for i in range(1, len(result)):
-            prev_value = result.iloc[i-1]['index_value']
-            appr_rate = result.iloc[i]['appreciation_rate']
-            expected_value = prev_value * np.exp(appr_rate)
-            
-            assert abs(result.iloc[i]['index_value'] - expected_value) < 0.0001
+        index_values = result['index_value'].to_numpy()
+        expected_values = index_values[:-1] * np.exp(result['appreciation_rate'].to_numpy()[1:])
+        np.testing.assert_allclose(index_values[1:], expected_values, rtol=0, atol=0.0001)
     
     def test_chain_with_different_base_year(self, appreciation_data):
         """Test chaining with non-first base year"""
@@ -79,11 +78,35 @@ class TestIndexChainer:
         
         # Earlier years should have lower values
         earlier = result[result['year'] < 2018]
-        assert all(earlier['index_value'] < 100.0)
+        assert (earlier['index_value'] < 100.0).all()
         
         # Later years should have higher values
         later = result[result['year'] > 2018]
-        assert all(later['index_value'] > 100.0)
+        assert (later['index_value'] > 100.0).all()
+    
+    def test_chain_matches_recursion(self, appreciation_data):
+        """Test vectorized chaining equals the year-by-year recursion"""
+        rates = appreciation_data.loc[
+            (appreciation_data['cbsa_id'] == '41860') &
+            (appreciation_data['weighting_scheme'] == 'value'), 'appreciation_rate'
+        ].to_numpy()
+        
+        for base_year in [2016, 2018, 2020, 1999]:
+            chainer = IndexChainer(base_value=100.0, base_year=base_year)
+            result = chainer.chain_appreciation_rates(
+                appreciation_data, '41860', 'value'
+            )
+            
+            # A base year outside the data chains from the first year
+            base_idx = base_year - 2016 if 2016 <= base_year <= 2020 else 0
+            expected = np.zeros(len(rates))
+            expected[base_idx] = 100.0
+            for i in range(base_idx + 1, len(rates)):
+                expected[i] = expected[i-1] * np.exp(rates[i])
+            for i in range(base_idx - 1, -1, -1):
+                expected[i] = expected[i+1] / np.exp(rates[i+1])
+            
+            np.testing.assert_array_equal(result['index_value'].to_numpy(), expected)
     
     def test_chain_all_indices(self, appreciation_data):
         """Test chaining all CBSA/scheme combinations"""
@@ -96,12 +119,114 @@ class TestIndexChainer:
         assert len(unique_combos) == 4
         
         # Each combination should have 5 years
-        assert all(unique_combos == 5)
+        assert (unique_combos == 5).all()
         
         # All should have proper structure
         required_cols = ['year', 'index_value', 'appreciation_rate', 
                         'cbsa_id', 'weighting_scheme']
         assert all(col in all_indices.columns for col in required_cols)
+    
+    def test_chain_all_indices_matches_single_series(self, appreciation_data):
+        """Test the one-pass chaining equals chaining each series alone"""
+        shuffled = appreciation_data.sample(frac=1, random_state=0)
+        all_chainer = IndexChainer(base_value=100.0, base_year=2017)
+        all_indices = all_chainer.chain_all_indices(shuffled)
+        
+        chainer = IndexChainer(base_value=100.0, base_year=2017)
+        expected = pd.concat([
+            chainer.chain_appreciation_rates(shuffled, cbsa_id, scheme)
+            for cbsa_id in ['31080', '41860'] for scheme in ['sample', 'value']
+        ], ignore_index=True)
+        
+        pd.testing.assert_frame_equal(all_indices, expected)
+        
+        # Stored series are sliced out of the combined result on lookup
+        assert list(all_chainer.chained_indices) == list(chainer.chained_indices)
+        for key, series_df in chainer.chained_indices.items():
+            pd.testing.assert_frame_equal(all_chainer.chained_indices[key], series_df)
+    
+    def test_chain_all_indices_keeps_categorical_keys(self, appreciation_data):
+        """Test categorical series keys stay categorical through chaining and summary"""
+        key_dtypes = {'cbsa_id': 'category', 'weighting_scheme': 'category'}
+        categorical = appreciation_data.astype(key_dtypes)
+        
+        index_df = IndexChainer(base_value=100.0).chain_all_indices(categorical)
+        expected = IndexChainer(base_value=100.0).chain_all_indices(appreciation_data)
+        
+        for key in key_dtypes:
+            assert index_df[key].dtype == categorical[key].dtype
+        pd.testing.assert_frame_equal(index_df.astype(expected.dtypes), expected)
+        
+        summary = OutputGenerator().generate_summary_statistics(index_df)
+        assert isinstance(summary['cbsa_id'].dtype, pd.CategoricalDtype)
+        pd.testing.assert_frame_equal(
+            summary.astype({key: object for key in key_dtypes}),
+            OutputGenerator().generate_summary_statistics(expected)
+        )
+    
+    def test_chain_all_indices_rebase_and_edits(self, appreciation_data):
+        """Test re-chaining a rebased or edited frame matches a fresh chainer"""
+        chainer = IndexChainer(base_value=100.0, base_year=2016)
+        chainer.chain_all_indices(appreciation_data)
+        
+        chainer.base_year = 2019
+        rebased = chainer.chain_all_indices(appreciation_data)
+        pd.testing.assert_frame_equal(
+            rebased, IndexChainer(base_value=100.0, base_year=2019).chain_all_indices(appreciation_data)
+        )
+        
+        # Rates edited in place are picked up by the next call
+        edited = appreciation_data.copy()
+        chainer.chain_all_indices(edited)
+        edited.loc[2, 'appreciation_rate'] = 0.5
+        pd.testing.assert_frame_equal(
+            chainer.chain_all_indices(edited),
+            IndexChainer(base_value=100.0, base_year=2019).chain_all_indices(edited)
+        )
+    
+    def test_chain_appreciation_rates_series(self, appreciation_data):
+        """Test chaining series of one frame in turn, including after an edit"""
+        chainer = IndexChainer(base_value=100.0, base_year=2016)
+        chainer.chain_appreciation_rates(appreciation_data, '31080', 'sample')
+        
+        result = chainer.chain_appreciation_rates(appreciation_data, '41860', 'value')
+        
+        assert result['appreciation_rate'].tolist() == appreciation_data.loc[
+            (appreciation_data['cbsa_id'] == '41860') &
+            (appreciation_data['weighting_scheme'] == 'value'), 'appreciation_rate'
+        ].tolist()
+        assert chainer.chain_appreciation_rates(appreciation_data, '99999', 'value').empty
+        
+        edited = appreciation_data.copy()
+        chainer.chain_appreciation_rates(edited, '31080', 'sample')
+        edited.loc[3, 'appreciation_rate'] = 0.25
+        pd.testing.assert_frame_equal(
+            chainer.chain_appreciation_rates(edited, '31080', 'sample'),
+            IndexChainer(base_value=100.0, base_year=2016).chain_appreciation_rates(
+                edited, '31080', 'sample'
+            )
+        )
+    
+    def test_chain_index_values_segments(self):
+        """Test the multi-series kernel chains each series independently"""
+        rng = np.random.default_rng(0)
+        lengths = [4, 1, 6, 3]
+        base_offsets = [2, 0, 5, 0]
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        base_positions = starts + base_offsets
+        factors = np.exp(rng.normal(0, 0.05, ends[-1]))
+        
+        result = _chain_index_values(factors, starts, ends, base_positions, 100.0)
+        
+        for start, end, base in zip(starts, ends, base_positions):
+            expected = np.zeros(end - start)
+            expected[base - start] = 100.0
+            for i in range(base - start + 1, end - start):
+                expected[i] = expected[i-1] * factors[start + i]
+            for i in range(base - start - 1, -1, -1):
+                expected[i] = expected[i+1] / factors[start + i + 1]
+            np.testing.assert_array_equal(result[start:end], expected)
 
 
 class TestOutputGenerator:
@@ -110,20 +235,22 @@ class TestOutputGenerator:
     @pytest.fixture
     def index_data(self):
         """Create sample index data"""
-        data = []
-        
-        for year in range(2016, 2021):
-            index_value = 100 * (1.05 ** (year - 2016))  # 5% annual growth
-            
-            data.append({
-                'cbsa_id': '31080',
-                'year': year,
-                'weighting_scheme': 'sample',
-                'index_value': index_value,
-                'appreciation_rate': 0.05
-            })
-        
-        return pd.DataFrame(data)
+        years = np.arange(2016, 2021)
+        
+        return pd.DataFrame({
+            'cbsa_id': '31080',
+            'year': years,
+            'weighting_scheme': 'sample',
+            'index_value': 100 * (1.05 ** (years - 2016)),  # 5% annual growth
+            'appreciation_rate': 0.05
+        })
+    
+    @pytest.fixture
+    def multi_scheme_index_data(self, index_data):
+        """The sample index series under both the sample and value schemes"""
+        schemes = ['sample', 'value']
+        data = index_data.iloc[np.tile(np.arange(len(index_data)), len(schemes))]
+        return data.assign(weighting_scheme=np.repeat(schemes, len(index_data)))
     
     def test_prepare_standard_output(self, index_data):
         """Test preparation of standard output format"""
@@ -139,51 +266,147 @@ class TestOutputGenerator:
         assert pd.isna(result.iloc[0]['yoy_change'])
         
         # Check yoy calculation
-        for i in range(1, len(result)):
-            expected_yoy = (result.iloc[i]['index_value'] / 
-                          result.iloc[i-1]['index_value'] - 1) * 100
-            assert abs(result.iloc[i]['yoy_change'] - expected_yoy) < 0.0001
+        index_values = result['index_value'].to_numpy()
+        expected_yoy = (index_values[1:] / index_values[:-1] - 1) * 100
+        np.testing.assert_allclose(result['yoy_change'].to_numpy()[1:], expected_yoy,
+                                   rtol=0, atol=0.0001)
         
         # Check cumulative change
-        base_value = result.iloc[0]['index_value']
-        for i in range(len(result)):
-            expected_cum = (result.iloc[i]['index_value'] / base_value - 1) * 100
-            assert abs(result.iloc[i]['cumulative_change'] - expected_cum) < 0.0001
+        expected_cum = (index_values / index_values[0] - 1) * 100
+        np.testing.assert_allclose(result['cumulative_change'], expected_cum, rtol=0, atol=0.0001)
     
-    def test_export_to_csv(self, index_data):
+    def test_prepare_standard_output_per_series(self, index_data):
+        """Test changes are computed within each interleaved series"""
+        other = index_data.assign(weighting_scheme='value',
+                                  index_value=index_data['index_value'] * 2)
+        combined = pd.concat([index_data, other]).sort_values('year', kind='mergesort')
+        
+        result = OutputGenerator().prepare_standard_output(combined)
+        single = OutputGenerator().prepare_standard_output(index_data)
+        
+        for scheme in ['sample', 'value']:
+            series = result[result['weighting_scheme'] == scheme]
+            np.testing.assert_allclose(series['cumulative_change'],
+                                       single['cumulative_change'], rtol=1e-12)
+            np.testing.assert_allclose(series['yoy_change'].iloc[1:],
+                                       single['yoy_change'].iloc[1:], rtol=1e-12)
+        
+        # Series that come grouped give the same rows as interleaved ones
+        grouped = OutputGenerator().prepare_standard_output(pd.concat([index_data, other]))
+        pd.testing.assert_frame_equal(
+            grouped.reset_index(drop=True),
+            result.sort_values('weighting_scheme', kind='mergesort').reset_index(drop=True)
+        )
+        
+        # A missing first value leaves the series' cumulative change missing
+        missing_first = index_data.copy()
+        missing_first.loc[0, 'index_value'] = np.nan
+        result = OutputGenerator().prepare_standard_output(missing_first)
+        assert result['cumulative_change'].isna().all()
+        
+        # A missing value inside a series carries the previous value forward
+        # for the yoy change (as pct_change does)
+        missing_inner = index_data.iloc[:3].copy()
+        missing_inner['index_value'] = [100.0, np.nan, 110.0]
+        result = OutputGenerator().prepare_standard_output(missing_inner)
+        np.testing.assert_allclose(result['yoy_change'], [np.nan, 0.0, 10.0])
+        np.testing.assert_allclose(result['cumulative_change'], [0.0, np.nan, 10.0])
+    
+    def test_export_to_csv(self, index_data, multi_scheme_index_data, tmp_path):
         """Test CSV export"""
         output_gen = OutputGenerator()
         
-        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
-            temp_file = f.name
+        temp_file = str(tmp_path / 'index.csv')
         
-        try:
-            # Test long format
-            output_gen.export_to_csv(index_data, temp_file, wide_format=False)
-            
-            # Read back and verify
-            df = pd.read_csv(temp_file)
-            assert len(df) == len(index_data)
-            assert 'yoy_change' in df.columns
-            
-            os.unlink(temp_file)
-            
-            # Test wide format with multiple schemes
-            multi_scheme_data = pd.concat([
-                index_data,
-                index_data.assign(weighting_scheme='value')
-            ])
-            
-            output_gen.export_to_csv(multi_scheme_data, temp_file, wide_format=True)
-            
-            # Read back and verify
-            df = pd.read_csv(temp_file)
-            assert 'sample' in df.columns
-            assert 'value' in df.columns
-            
-        finally:
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
+        # Test long format
+        output_gen.export_to_csv(index_data, temp_file, wide_format=False)
+        
+        # Read back and verify
+        df = pd.read_csv(temp_file, engine='pyarrow')
+        assert len(df) == len(index_data)
+        assert 'yoy_change' in df.columns
+        
+        # Test wide format with multiple schemes
+        output_gen.export_to_csv(multi_scheme_index_data, temp_file, wide_format=True)
+        
+        # Read back and verify
+        df = pd.read_csv(temp_file, engine='pyarrow')
+        assert 'sample' in df.columns
+        assert 'value' in df.columns
+    
+    def test_exported_files_round_trip(self, index_data, tmp_path):
+        """Test CSV and Parquet outputs read back to the standard output"""
+        import pyarrow.parquet as pq
+        
+        output_gen = OutputGenerator()
+        expected = output_gen.prepare_standard_output(index_data)
+        assert expected['year'].dtype == np.int16
+        assert isinstance(expected['cbsa_id'].dtype, pd.CategoricalDtype)
+        assert expected['index_value'].dtype == np.float64
+        
+        csv_path = tmp_path / 'index.csv'
+        output_gen.export_to_csv(index_data, csv_path)
+        from_csv = pd.read_csv(csv_path, dtype=STANDARD_OUTPUT_DTYPES)
+        pd.testing.assert_frame_equal(from_csv, expected)
+        
+        parquet_path = tmp_path / 'index.parquet'
+        output_gen.export_to_parquet(index_data, parquet_path)
+        pd.testing.assert_frame_equal(pd.read_parquet(parquet_path), expected)
+        metadata = pq.ParquetFile(parquet_path).metadata
+        assert metadata.row_group(0).column(0).compression == 'ZSTD'
+    
+    def test_csv_matches_baseline_format(self, tmp_path):
+        """Test the CSV text is what to_csv wrote: unquoted, integral floats keep .0"""
+        index_df = pd.DataFrame({
+            'cbsa_id': '01080',
+            'year': [2019, 2020, 2021],
+            'weighting_scheme': 'sample',
+            'index_value': [100.0, 200.0, 150.0],
+            'appreciation_rate': [0.0, 0.5, -0.25]
+        })
+        output_gen = OutputGenerator()
+        
+        csv_path = tmp_path / 'index.csv'
+        output_gen.export_to_csv(index_df, csv_path)
+        assert csv_path.read_text() == (
+            'cbsa_id,year,weighting_scheme,index_value,appreciation_rate,'
+            'yoy_change,cumulative_change\n'
+            '01080,2019,sample,100.0,0.0,,0.0\n'
+            '01080,2020,sample,200.0,0.5,100.0,100.0\n'
+            '01080,2021,sample,150.0,-0.25,-25.0,50.0\n'
+        )
+        
+        output_gen.export_to_csv(index_df, csv_path, wide_format=True)
+        assert csv_path.read_text() == (
+            'cbsa_id,year,sample\n'
+            '01080,2019,100.0\n'
+            '01080,2020,200.0\n'
+            '01080,2021,150.0\n'
+        )
+        
+        # Text that needs quoting is quoted as to_csv quotes it
+        quoted = index_df.assign(weighting_scheme='sample, "adjusted"')
+        output_gen.export_to_csv(quoted, csv_path)
+        assert csv_path.read_text() == output_gen.prepare_standard_output(
+            quoted).to_csv(index=False)
+    
+    def test_csv_datetime_columns(self, tmp_path):
+        """Test datetime and duration columns are written as to_csv writes them"""
+        dates = pd.to_datetime(['2020-01-01', None, '1965-06-30'])
+        frames = [
+            pd.DataFrame({'id': [1, 2, 3], 'date': dates}),
+            pd.DataFrame({'id': [1, 2, 3], 'date': dates + pd.Timedelta('36h')}),
+            pd.DataFrame({'id': [1, 2, 3], 'date': dates.tz_localize('UTC')}),
+            pd.DataFrame({'id': [1, 2, 3], 'period': dates - dates[0]})
+        ]
+        
+        csv_path = tmp_path / 'dates.csv'
+        for df in frames:
+            _write_csv(df, csv_path)
+            assert csv_path.read_text() == df.to_csv(index=False)
+        
+        _write_csv(frames[0], csv_path)
+        assert csv_path.read_text() == 'id,date\n1,2020-01-01\n2,\n3,1965-06-30\n'
     
     def test_generate_summary_statistics(self, index_data):
         """Test summary statistics generation"""
@@ -210,9 +433,57 @@ class TestOutputGenerator:
         assert cbsa_31080['std_appreciation'] == 0.0  # All same value
         
         # Check total appreciation
-        expected_total = (index_data.iloc[-1]['index_value'] / 
-                         index_data.iloc[0]['index_value'] - 1) * 100
+        index_values = index_data['index_value'].to_numpy()
+        expected_total = (index_values[-1] / index_values[0] - 1) * 100
         assert abs(cbsa_31080['total_appreciation'] - expected_total) < 0.0001
+    
+    def test_summary_statistics_series_endpoints(self, index_data):
+        """Test totals use each series' first and last rows"""
+        single_year = index_data.iloc[[2]].assign(cbsa_id='41860')
+        missing_first = index_data.assign(cbsa_id='19100')
+        missing_first.loc[0, 'index_value'] = np.nan
+        
+        summary = OutputGenerator().generate_summary_statistics(
+            pd.concat([missing_first, index_data, single_year])
+        ).set_index('cbsa_id')
+        
+        assert list(summary.index) == ['19100', '31080', '41860']
+        assert pd.isna(summary.loc['19100', 'total_appreciation'])
+        assert summary.loc['41860', 'n_years'] == 1
+        assert summary.loc['41860', 'total_appreciation'] == 0.0
+        assert pd.isna(summary.loc['41860', 'std_appreciation'])
+        assert summary.loc['31080', 'start_year'] == 2016
+        assert summary.loc['31080', 'end_year'] == 2020
+    
+    def test_export_by_cbsa(self, index_data, tmp_path):
+        """Test one wide file is written per CBSA"""
+        multi_data = pd.concat([
+            index_data,
+            index_data.assign(weighting_scheme='value'),
+            index_data.assign(cbsa_id='41860', index_value=index_data['index_value'] * 2)
+        ])
+        
+        temp_dir = tmp_path / 'all'
+        OutputGenerator().export_by_cbsa(multi_data, temp_dir)
+        
+        assert sorted(os.listdir(temp_dir)) == ['hpi_31080.csv', 'hpi_41860.csv']
+        
+        cbsa_31080 = pd.read_csv(temp_dir / 'hpi_31080.csv', engine='pyarrow')
+        assert list(cbsa_31080.columns) == ['year', 'sample', 'value']
+        np.testing.assert_allclose(cbsa_31080['value'], index_data['index_value'])
+        
+        cbsa_41860 = pd.read_csv(temp_dir / 'hpi_41860.csv', engine='pyarrow')
+        assert list(cbsa_41860.columns) == ['year', 'sample']
+        np.testing.assert_allclose(cbsa_41860['sample'], index_data['index_value'] * 2)
+        
+        # Threaded and serial writes produce the same files
+        serial_dir = tmp_path / 'serial'
+        threaded_dir = tmp_path / 'threaded'
+        OutputGenerator().export_by_cbsa(multi_data, serial_dir, n_jobs=1)
+        OutputGenerator().export_by_cbsa(multi_data, threaded_dir, n_jobs=4)
+        for name in os.listdir(serial_dir):
+            assert (serial_dir / name).read_bytes() == \
+                (threaded_dir / name).read_bytes()
 
 
 class TestRSAIExporter:
@@ -237,68 +508,53 @@ class TestRSAIExporter:
         
         return pd.DataFrame(data)
     
-    def test_process_and_export(self, appreciation_data):
+    def test_process_and_export(self, appreciation_data, tmp_path):
         """Test complete processing and export"""
         exporter = RSAIExporter(base_value=100.0, base_year=2016)
         
-        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
-            temp_file = f.name
-        
-        try:
-            # Process and export
-            index_df = exporter.process_and_export(
-                appreciation_data,
-                temp_file,
-                format='csv',
-                wide_format=False,
-                include_summary=True
-            )
-            
-            # Check returned data
-            assert len(index_df) > 0
-            assert 'index_value' in index_df.columns
-            
-            # Check main file exists
-            assert os.path.exists(temp_file)
-            
-            # Check summary file exists
-            summary_path = Path(temp_file).parent / "summary_statistics.csv"
-            assert os.path.exists(summary_path)
-            
-            # Read and verify summary
-            summary_df = pd.read_csv(summary_path)
-            assert len(summary_df) == 4  # 2 CBSAs × 2 schemes
-            
-            # Cleanup
-            os.unlink(summary_path)
-            
-        finally:
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
+        temp_file = str(tmp_path / 'index.csv')
+        
+        # Process and export
+        index_df = exporter.process_and_export(
+            appreciation_data,
+            temp_file,
+            format='csv',
+            wide_format=False,
+            include_summary=True
+        )
+        
+        # Check returned data
+        assert len(index_df) > 0
+        assert 'index_value' in index_df.columns
+        
+        # Check main file exists
+        assert os.path.exists(temp_file)
+        
+        # Check summary file exists
+        summary_path = Path(temp_file).parent / "summary_statistics.csv"
+        assert os.path.exists(summary_path)
+        
+        # Read and verify summary
+        summary_df = pd.read_csv(summary_path, engine='pyarrow')
+        assert len(summary_df) == 4  # 2 CBSAs × 2 schemes
     
-    def test_parquet_export(self, appreciation_data):
+    def test_parquet_export(self, appreciation_data, tmp_path):
         """Test Parquet format export"""
         exporter = RSAIExporter(base_value=100.0)
         
-        with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False) as f:
-            temp_file = f.name
+        temp_file = str(tmp_path / 'index.parquet')
         
-        try:
-            index_df = exporter.process_and_export(
-                appreciation_data,
-                temp_file,
-                format='parquet',
-                include_summary=False
-            )
-            
-            # Check file exists
-            assert os.path.exists(temp_file)
-            
-            # Read back and verify
-            df = pd.read_parquet(temp_file)
-            assert len(df) == len(index_df)
-            assert 'yoy_change' in df.columns
-            
-        finally:
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
\ No newline at end of file
+        index_df = exporter.process_and_export(
+            appreciation_data,
+            temp_file,
+            format='parquet',
+            include_summary=False
+        )
+        
+        # Check file exists
+        assert os.path.exists(temp_file)
+        
+        # Read back and verify
+        df = pd.read_parquet(temp_file)
+        assert len(df) == len(index_df)
+        assert 'yoy_change' in df.columns
\ No newline at end of file
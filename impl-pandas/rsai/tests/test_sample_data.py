@@ -9,33 +9,78 @@ from rsai.src.data.ingestion import DataIngestion, RepeatSalesProcessor
 from rsai.src.data.validation import DataValidator
 from rsai.src.main import RSAIPipeline
 
+# Upper bound on the loaded sample transactions, so an accidentally bloated
+# sample file fails here rather than slowing every test that uses it
+SAMPLE_MAX_BYTES = 50 * 2**20
 
+
+@pytest.fixture(scope="session")
+def sample_data_paths():
+    """Get paths to sample data files"""
+    base_path = Path(__file__).parent.parent / "data" / "sample"
+    
+    return {
+        'transactions': base_path / "transactions.csv",
+        'geographic': base_path / "geographic.csv", 
+        'weighting': base_path / "weighting.csv"
+    }
+
+
+def _existing_path(sample_data_paths: dict, name: str) -> str:
+    """Path of a sample file, skipping the requesting test if it is absent"""
+    path = sample_data_paths[name]
+    if not path.is_file():
+        # Only test_sample_data_files_exist reports missing files as failures
+        pytest.skip(f"Sample {name} file not present at {path}")
+    return str(path)
+
+
+# The loaded frames are shared by every test in the session (the CSVs are
+# parsed once), so tests must not modify them in place
+@pytest.fixture(scope="session")
+def sample_transactions_df(sample_data_paths):
+    """Sample transaction data, loaded once per test session"""
+    return DataIngestion().load_transaction_data(
+        _existing_path(sample_data_paths, 'transactions')
+    )
+
+
+@pytest.fixture(scope="session")
+def sample_geographic_df(sample_data_paths):
+    """Sample geographic data, loaded once per test session"""
+    return DataIngestion().load_geographic_data(
+        _existing_path(sample_data_paths, 'geographic')
+    )
+
+
+@pytest.fixture(scope="session")
+def sample_weighting_df(sample_data_paths):
+    """Sample weighting data, loaded once per test session"""
+    return DataIngestion().load_weighting_data(
+        _existing_path(sample_data_paths, 'weighting')
+    )
+
+
+@pytest.fixture(scope="session")
+def sample_repeat_sales_df(sample_transactions_df):
+    """Repeat sales of the sample transactions, processed once per test session"""
+    return RepeatSalesProcessor().process_repeat_sales(sample_transactions_df)
+
+
+@pytest.mark.xdist_group('rsai_sample_data')
 class TestSampleData:
     """Test using the provided sample data files"""
     
-    @pytest.fixture
-    def sample_data_paths(self):
-        """Get paths to sample data files"""
-        base_path = Path(__file__).parent.parent / "data" / "sample"
-        
-        return {
-            'transactions': base_path / "transactions.csv",
-            'geographic': base_path / "geographic.csv", 
-            'weighting': base_path / "weighting.csv"
-        }
-    
     def test_sample_data_files_exist(self, sample_data_paths):
         """Test that all sample data files exist"""
         for name, path in sample_data_paths.items():
             assert path.exists(), f"Sample {name} file not found at {path}"
             assert path.is_file(), f"Sample {name} path is not a file: {path}"
     
-    def test_load_sample_transaction_data(self, sample_data_paths):
+    @pytest.mark.io
+    def test_load_sample_transaction_data(self, sample_transactions_df):
         """Test loading sample transaction data"""
-        ingestion = DataIngestion()
-        
-        # Load the sample transaction data
-        df = ingestion.load_transaction_data(str(sample_data_paths['transactions']))
+        df = sample_transactions_df
         
         # Check basic structure
         assert len(df) > 0, "Transaction data should not be empty"
@@ -49,6 +94,11 @@ class TestSampleData:
         assert pd.api.types.is_datetime64_any_dtype(df['transaction_date'])
         assert pd.api.types.is_numeric_dtype(df['transaction_price'])
         
+        # ID columns are categorical, not Python object arrays
+        for col in ['property_id', 'census_tract_2010', 'cbsa_id']:
+            assert isinstance(df[col].dtype, pd.CategoricalDtype), f"{col} is not categorical"
+        assert df.memory_usage(deep=True).sum() < SAMPLE_MAX_BYTES
+        
         # Check data quality
         assert df['transaction_price'].min() > 0, "All prices should be positive"
         assert not df['property_id'].isna().any(), "No missing property IDs"
@@ -57,11 +107,10 @@ class TestSampleData:
         print(f"Date range: {df['transaction_date'].min()} to {df['transaction_date'].max()}")
         print(f"Price range: ${df['transaction_price'].min():,.0f} to ${df['transaction_price'].max():,.0f}")
     
-    def test_load_sample_geographic_data(self, sample_data_paths):
+    @pytest.mark.io
+    def test_load_sample_geographic_data(self, sample_geographic_df):
         """Test loading sample geographic data"""
-        ingestion = DataIngestion()
-        
-        df = ingestion.load_geographic_data(str(sample_data_paths['geographic']))
+        df = sample_geographic_df
         
         # Check structure
         assert len(df) > 0, "Geographic data should not be empty"
@@ -71,17 +120,16 @@ class TestSampleData:
         assert 'cbsa_id' in df.columns
         
         # Check coordinate bounds
-        assert all(-90 <= lat <= 90 for lat in df['centroid_lat']), "Invalid latitudes"
-        assert all(-180 <= lon <= 180 for lon in df['centroid_lon']), "Invalid longitudes"
+        assert df['centroid_lat'].between(-90, 90).all(), "Invalid latitudes"
+        assert df['centroid_lon'].between(-180, 180).all(), "Invalid longitudes"
         
         print(f"Loaded {len(df)} census tracts from sample data")
         print(f"Unique CBSAs: {df['cbsa_id'].nunique()}")
     
-    def test_load_sample_weighting_data(self, sample_data_paths):
+    @pytest.mark.io
+    def test_load_sample_weighting_data(self, sample_weighting_df):
         """Test loading sample weighting data"""
-        ingestion = DataIngestion()
-        
-        df = ingestion.load_weighting_data(str(sample_data_paths['weighting']))
+        df = sample_weighting_df
         
         # Check structure
         assert len(df) > 0, "Weighting data should not be empty"
@@ -99,35 +147,24 @@ class TestSampleData:
         print(f"Loaded {len(df)} weighting records from sample data")
         print(f"Year range: {df['year'].min()} to {df['year'].max()}")
     
-    def test_sample_data_validation(self, sample_data_paths):
+    def test_sample_data_validation(self, sample_transactions_df, sample_geographic_df):
         """Test that sample data passes validation"""
-        ingestion = DataIngestion()
         validator = DataValidator()
         
-        # Load data
-        transactions_df = ingestion.load_transaction_data(str(sample_data_paths['transactions']))
-        geographic_df = ingestion.load_geographic_data(str(sample_data_paths['geographic']))
-        
         # Validate transactions
-        trans_issues = validator.validate_transactions(transactions_df)
+        trans_issues = validator.validate_transactions(sample_transactions_df)
         assert not trans_issues.get('missing_values', {}), "Sample transaction data has missing values"
         
         # Validate geographic data
-        geo_issues = validator.validate_geographic_data(geographic_df)
+        geo_issues = validator.validate_geographic_data(sample_geographic_df)
         assert not geo_issues.get('data_quality', {}), "Sample geographic data has quality issues"
         
         print("Sample data validation passed!")
     
-    def test_repeat_sales_processing_with_sample_data(self, sample_data_paths):
+    @pytest.mark.cpu
+    def test_repeat_sales_processing_with_sample_data(self, sample_repeat_sales_df):
         """Test repeat sales processing with sample data"""
-        ingestion = DataIngestion()
-        processor = RepeatSalesProcessor()
-        
-        # Load transaction data
-        transactions_df = ingestion.load_transaction_data(str(sample_data_paths['transactions']))
-        
-        # Process repeat sales
-        repeat_sales_df = processor.process_repeat_sales(transactions_df)
+        repeat_sales_df = sample_repeat_sales_df
         
         # Check results
         assert len(repeat_sales_df) > 0, "Should find some repeat sales in sample data"
@@ -143,35 +180,33 @@ class TestSampleData:
             assert col in repeat_sales_df.columns, f"Missing column: {col}"
         
         # Check data quality
-        assert all(repeat_sales_df['years_between_sales'] > 0), "Invalid time periods"
-        assert all(repeat_sales_df['second_sale_date'] > repeat_sales_df['first_sale_date']), "Invalid sale order"
+        assert (repeat_sales_df['years_between_sales'].to_numpy() > 0).all(), "Invalid time periods"
+        assert repeat_sales_df['second_sale_date'].gt(repeat_sales_df['first_sale_date']).all(), \
+            "Invalid sale order"
         
         print(f"Found {len(repeat_sales_df)} repeat sales pairs in sample data")
         print(f"Average years between sales: {repeat_sales_df['years_between_sales'].mean():.1f}")
         print(f"Average annual growth rate: {repeat_sales_df['annual_growth_rate'].mean():.1%}")
     
-    def test_data_compatibility(self, sample_data_paths):
+    def test_data_compatibility(self, sample_transactions_df, sample_geographic_df):
         """Test that transaction and geographic data are compatible"""
-        ingestion = DataIngestion()
-        
-        # Load both datasets
-        transactions_df = ingestion.load_transaction_data(str(sample_data_paths['transactions']))
-        geographic_df = ingestion.load_geographic_data(str(sample_data_paths['geographic']))
+        transactions_df = sample_transactions_df
+        geographic_df = sample_geographic_df
         
         # Check tract compatibility
-        trans_tracts = set(transactions_df['census_tract_2010'].unique())
-        geo_tracts = set(geographic_df['census_tract_2010'].unique())
+        trans_tracts = pd.Index(transactions_df['census_tract_2010'].unique())
+        geo_tracts = pd.Index(geographic_df['census_tract_2010'].unique())
         
         # All transaction tracts should have geographic data
-        missing_geo = trans_tracts - geo_tracts
-        if missing_geo:
+        missing_geo = trans_tracts.difference(geo_tracts)
+        if len(missing_geo) > 0:
             print(f"Warning: {len(missing_geo)} transaction tracts missing geographic data")
         
         # Check CBSA compatibility
-        trans_cbsas = set(transactions_df['cbsa_id'].unique())
-        geo_cbsas = set(geographic_df['cbsa_id'].unique())
+        trans_cbsas = pd.Index(transactions_df['cbsa_id'].unique())
+        geo_cbsas = pd.Index(geographic_df['cbsa_id'].unique())
         
-        common_cbsas = trans_cbsas & geo_cbsas
+        common_cbsas = trans_cbsas.intersection(geo_cbsas)
         assert len(common_cbsas) > 0, "No common CBSAs between transaction and geographic data"
         
         print(f"Data compatibility check:")
@@ -180,29 +215,22 @@ class TestSampleData:
         print(f"  Common CBSAs: {len(common_cbsas)}")
     
     @pytest.mark.slow
-    def test_mini_pipeline_with_sample_data(self, sample_data_paths):
+    @pytest.mark.cpu
+    def test_mini_pipeline_with_sample_data(self, sample_repeat_sales_df):
         """Test a mini version of the RSAI pipeline with sample data"""
         # This is a simplified test that doesn't run the full pipeline
         # but tests key components with sample data
         
-        ingestion = DataIngestion()
-        processor = RepeatSalesProcessor()
-        
-        # Load data
-        transactions_df = ingestion.load_transaction_data(str(sample_data_paths['transactions']))
-        geographic_df = ingestion.load_geographic_data(str(sample_data_paths['geographic']))
-        
-        # Process repeat sales
-        repeat_sales_df = processor.process_repeat_sales(transactions_df)
+        repeat_sales_df = sample_repeat_sales_df
         
         # Basic pipeline validation
         assert len(repeat_sales_df) > 0, "Pipeline should produce repeat sales"
         
         # Check that we can group by year
-        repeat_sales_df['sale_year'] = repeat_sales_df['second_sale_date'].dt.year
-        yearly_stats = repeat_sales_df.groupby('sale_year').agg({
-            'annual_growth_rate': ['count', 'mean', 'std']
-        }).round(4)
+        sale_year = repeat_sales_df['second_sale_date'].dt.year.rename('sale_year')
+        yearly_stats = repeat_sales_df['annual_growth_rate'].groupby(sale_year).agg(
+            ['count', 'mean', 'std']
+        ).round(4)
         
         print("Yearly repeat sales statistics from sample data:")
         print(yearly_stats)
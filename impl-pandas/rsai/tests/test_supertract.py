@@ -5,66 +5,69 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 
-from rsai.src.geography.supertract import SupertractGenerator
+from rsai.src.data.ingestion import MISSING_YEAR
+from rsai.src.geography.supertract import (
+    COMPONENT_TRACTS_DTYPE, SupertractGenerator, _half_pairs_table, _year_counts
+)
+
+
+@pytest.fixture(scope="module")
+def geographic_data():
+    """Create sample geographic data for testing (shared, read-only)"""
+    # Create a grid of census tracts: 10 tracts in each of 3 CBSAs
+    i = np.repeat(np.arange(3), 10)
+    j = np.tile(np.arange(10), 3)
+    
+    return pd.DataFrame({
+        'census_tract_2010': [f'0603700{a}{b:02d}' for a, b in zip(i, j)],
+        'centroid_lat': 34.0 + i * 0.1 + j * 0.01,
+        'centroid_lon': -118.0 + i * 0.1 + j * 0.01,
+        'cbsa_id': [f'CBSA00{a}' for a in i]
+    })
+
+
+@pytest.fixture(scope="module")
+def generator(geographic_data):
+    """Generator for the shared geographic data (it holds no per-call state)"""
+    return SupertractGenerator(geographic_data, min_half_pairs=40)
 
 
 class TestSupertractGenerator:
     """Test SupertractGenerator class"""
     
-    @pytest.fixture
-    def geographic_data(self):
-        """Create sample geographic data for testing"""
-        # Create a grid of census tracts
-        tracts = []
-        for i in range(3):  # 3 CBSAs
-            for j in range(10):  # 10 tracts per CBSA
-                tracts.append({
-                    'census_tract_2010': f'0603700{i}{j:02d}',
-                    'centroid_lat': 34.0 + i * 0.1 + j * 0.01,
-                    'centroid_lon': -118.0 + i * 0.1 + j * 0.01,
-                    'cbsa_id': f'CBSA00{i}'
-                })
-        
-        return pd.DataFrame(tracts)
-    
     @pytest.fixture
     def repeat_sales_data(self):
         """Create repeat sales data with varying transaction counts"""
-        data = []
+        first_dates = pd.date_range('2019-01-01', periods=12, freq='MS')
+        second_dates = pd.date_range('2020-01-01', periods=12, freq='MS')
         
         # CBSA000: Mix of high and low transaction tracts
         high_trans_tracts = ['0603700000', '0603700001', '0603700002']
         low_trans_tracts = ['0603700003', '0603700004', '0603700005']
         
-        # High transaction tracts (50+ half-pairs each)
-        for tract in high_trans_tracts:
-            for i in range(30):  # 30 repeat sales = 60 half-pairs
-                data.append({
-                    'property_id': f'{tract}_PROP{i:03d}',
-                    'first_sale_date': pd.to_datetime(f'2019-{(i%12)+1:02d}-01'),
-                    'second_sale_date': pd.to_datetime(f'2020-{(i%12)+1:02d}-01'),
-                    'first_sale_price': 200000 + i * 1000,
-                    'second_sale_price': 220000 + i * 1000,
-                    'census_tract_2010': tract,
-                    'cbsa_id': 'CBSA000',
-                    'log_price_relative': np.log(1.1)
-                })
-        
-        # Low transaction tracts (10-20 half-pairs each)
-        for tract in low_trans_tracts:
-            for i in range(8):  # 8 repeat sales = 16 half-pairs
-                data.append({
-                    'property_id': f'{tract}_PROP{i:03d}',
-                    'first_sale_date': pd.to_datetime(f'2019-{(i%12)+1:02d}-01'),
-                    'second_sale_date': pd.to_datetime(f'2020-{(i%12)+1:02d}-01'),
-                    'first_sale_price': 300000 + i * 2000,
-                    'second_sale_price': 330000 + i * 2000,
-                    'census_tract_2010': tract,
-                    'cbsa_id': 'CBSA000',
-                    'log_price_relative': np.log(1.1)
-                })
-        
-        return pd.DataFrame(data)
+        # High transaction tracts: 30 repeat sales = 60 half-pairs each;
+        # low transaction tracts: 8 repeat sales = 16 half-pairs each
+        counts = [30] * len(high_trans_tracts) + [8] * len(low_trans_tracts)
+        tracts = np.repeat(high_trans_tracts + low_trans_tracts, counts)
+        i = np.concatenate([np.arange(n) for n in counts])
+        high = np.repeat([n == 30 for n in counts], counts)
+        
+        repeat_sales = pd.DataFrame({
+            'property_id': [f'{tract}_PROP{k:03d}' for tract, k in zip(tracts, i)],
+            'first_sale_date': first_dates[i % 12],
+            'second_sale_date': second_dates[i % 12],
+            'first_sale_price': np.where(high, 200000 + i * 1000, 300000 + i * 2000),
+            'second_sale_price': np.where(high, 220000 + i * 1000, 330000 + i * 2000),
+            'census_tract_2010': tracts.astype(object),
+            'cbsa_id': 'CBSA000',
+            'log_price_relative': np.log(1.1)
+        })
+        
+        # Sale years cached the way calculate_price_relatives stores them, so
+        # the generator and the tests read them instead of recomputing .dt.year
+        repeat_sales['first_year'] = repeat_sales['first_sale_date'].dt.year.astype(np.int16)
+        repeat_sales['second_year'] = repeat_sales['second_sale_date'].dt.year.astype(np.int16)
+        return repeat_sales
     
     def test_calculate_half_pairs_single_tract(self, repeat_sales_data):
         """Test half-pairs calculation for a single tract"""
@@ -76,11 +79,11 @@ class TestSupertractGenerator:
         )
         
         # Should have half-pairs from transactions where either sale is in 2020
-        tract_sales = repeat_sales_data[repeat_sales_data['census_tract_2010'] == '0603700000']
-        expected = (
-            (tract_sales['first_sale_date'].dt.year == 2020).sum() +
-            (tract_sales['second_sale_date'].dt.year == 2020).sum()
-        )
+        in_tract = repeat_sales_data['census_tract_2010'].to_numpy() == '0603700000'
+        tract_sales = repeat_sales_data.loc[in_tract, ['first_year', 'second_year']]
+        first_years = tract_sales['first_year'].to_numpy()
+        second_years = tract_sales['second_year'].to_numpy()
+        expected = int((first_years == 2020).sum() + (second_years == 2020).sum())
         
         assert half_pairs_2020 == expected
     
@@ -101,21 +104,73 @@ class TestSupertractGenerator:
         
         assert half_pairs == individual_sum
     
-    def test_generate_supertracts_for_year(self, geographic_data, repeat_sales_data):
-        """Test supertract generation for a specific year"""
-        generator = SupertractGenerator(geographic_data, min_half_pairs=40)
+    def test_calculate_half_pairs_matrix(self, repeat_sales_data):
+        """Test the tract x year matrix matches per-tract half-pair counts"""
+        generator = SupertractGenerator(pd.DataFrame(), min_half_pairs=40)
+        
+        matrix = generator.calculate_half_pairs_matrix(repeat_sales_data)
+        
+        assert set(matrix.columns) == {2019, 2020}
+        for tract in repeat_sales_data['census_tract_2010'].unique():
+            for year in matrix.columns:
+                assert matrix.at[tract, year] == generator.calculate_half_pairs(
+                    repeat_sales_data, year, tract
+                )
+    
+    def test_half_pairs_table(self, repeat_sales_data):
+        """Test the bincount table matches per-tract half-pair counts"""
+        generator = SupertractGenerator(pd.DataFrame(), min_half_pairs=40)
+        
+        codes, tracts = pd.factorize(repeat_sales_data['census_tract_2010'])
+        table, first_year = _half_pairs_table(
+            codes, len(tracts),
+            repeat_sales_data['first_year'].to_numpy(),
+            repeat_sales_data['second_year'].to_numpy()
+        )
+        
+        for i, tract in enumerate(tracts):
+            for year in range(first_year - 1, first_year + table.shape[1] + 1):
+                assert _year_counts(table, first_year, year)[i] == (
+                    generator.calculate_half_pairs(repeat_sales_data, year, tract)
+                )
+    
+    def test_half_pairs_table_skips_missing_years(self):
+        """Test pairs with a missing sale year (MISSING_YEAR) are not counted"""
+        table, first_year = _half_pairs_table(
+            np.array([0, 0, 1], dtype=np.int32), 2,
+            np.array([2019, MISSING_YEAR, 2019], dtype=np.int16),
+            np.array([2020, 2020, MISSING_YEAR], dtype=np.int16)
+        )
         
+        assert first_year == 2019
+        np.testing.assert_array_equal(table, [[1, 1], [0, 0]])
+    
+    def test_half_pairs_use_cached_year_columns(self, repeat_sales_data):
+        """Test precomputed first_year/second_year columns give the same counts"""
+        generator = SupertractGenerator(pd.DataFrame(), min_half_pairs=40)
+        dates_only = repeat_sales_data.drop(columns=['first_year', 'second_year'])
+        tracts = ['0603700000', '0603700003']
+        
+        for year in [2019, 2020]:
+            assert (generator.calculate_half_pairs_multi(repeat_sales_data, year, tracts) ==
+                    generator.calculate_half_pairs_multi(dates_only, year, tracts))
+        pd.testing.assert_frame_equal(
+            generator.calculate_half_pairs_matrix(repeat_sales_data),
+            generator.calculate_half_pairs_matrix(dates_only),
+            check_names=False, check_column_type=False
+        )
+    
+    def test_generate_supertracts_for_year(self, generator, repeat_sales_data):
+        """Test supertract generation for a specific year"""
         supertracts = generator.generate_supertracts_for_year(
             repeat_sales_data, 2020, 'CBSA000'
         )
         
         # Check that all tracts are in supertracts
-        all_tracts = set()
-        for st_id, components in supertracts.items():
-            all_tracts.update(components)
+        all_tracts = set().union(*supertracts.values())
         
         # Should have all CBSA000 tracts covered
-        expected_tracts = set([f'0603700{0}{i:02d}' for i in range(10)])
+        expected_tracts = frozenset(f'06037000{i:02d}' for i in range(10))
         assert expected_tracts.issubset(all_tracts)
         
         # Low transaction tracts should be merged
@@ -132,22 +187,18 @@ class TestSupertractGenerator:
     def test_threshold_enforcement(self, geographic_data):
         """Test that threshold is enforced for both current and previous year"""
         # Create data where tract meets threshold in 2020 but not 2019
-        data = []
-        
         # Tract with transactions only in 2020
-        for i in range(25):  # 50 half-pairs in 2020, 0 in 2019
-            data.append({
-                'property_id': f'PROP{i:03d}',
-                'first_sale_date': pd.to_datetime('2020-01-01'),
-                'second_sale_date': pd.to_datetime('2020-06-01'),
-                'first_sale_price': 200000,
-                'second_sale_price': 210000,
-                'census_tract_2010': '0603700100',
-                'cbsa_id': 'CBSA001',
-                'log_price_relative': np.log(1.05)
-            })
-        
-        repeat_sales_df = pd.DataFrame(data)
+        n = 25  # 50 half-pairs in 2020, 0 in 2019
+        repeat_sales_df = pd.DataFrame({
+            'property_id': [f'PROP{i:03d}' for i in range(n)],
+            'first_sale_date': np.datetime64('2020-01-01', 'ns'),
+            'second_sale_date': np.datetime64('2020-06-01', 'ns'),
+            'first_sale_price': 200000,
+            'second_sale_price': 210000,
+            'census_tract_2010': '0603700100',
+            'cbsa_id': 'CBSA001',
+            'log_price_relative': np.log(1.05)
+        })
         
         # Add this tract to geographic data
         geo_subset = geographic_data[geographic_data['cbsa_id'] == 'CBSA001'].copy()
@@ -179,25 +230,20 @@ class TestSupertractGenerator:
     def test_nearest_neighbor_merging(self, geographic_data):
         """Test that tracts merge with nearest neighbors"""
         # Create specific pattern of transactions
-        data = []
-        
         # Three tracts in a line with low transactions
         tracts = ['0603700200', '0603700201', '0603700202']  # These should be adjacent
-        
-        for tract in tracts:
-            for i in range(10):  # 20 half-pairs each (below threshold)
-                data.append({
-                    'property_id': f'{tract}_PROP{i:03d}',
-                    'first_sale_date': pd.to_datetime('2019-06-01'),
-                    'second_sale_date': pd.to_datetime('2020-06-01'),
-                    'first_sale_price': 200000,
-                    'second_sale_price': 210000,
-                    'census_tract_2010': tract,
-                    'cbsa_id': 'CBSA002',
-                    'log_price_relative': np.log(1.05)
-                })
-        
-        repeat_sales_df = pd.DataFrame(data)
+        n = 10  # 20 half-pairs each (below threshold)
+        
+        repeat_sales_df = pd.DataFrame({
+            'property_id': [f'{tract}_PROP{i:03d}' for tract in tracts for i in range(n)],
+            'first_sale_date': np.datetime64('2019-06-01', 'ns'),
+            'second_sale_date': np.datetime64('2020-06-01', 'ns'),
+            'first_sale_price': 200000,
+            'second_sale_price': 210000,
+            'census_tract_2010': np.repeat(tracts, n).astype(object),
+            'cbsa_id': 'CBSA002',
+            'log_price_relative': np.log(1.05)
+        })
         
         # Use subset of geographic data
         geo_subset = geographic_data[geographic_data['cbsa_id'] == 'CBSA002']
@@ -216,10 +262,20 @@ class TestSupertractGenerator:
                 # Should contain adjacent tract(s)
                 assert '0603700200' in components or '0603700202' in components
     
-    def test_generate_all_supertracts(self, geographic_data, repeat_sales_data):
-        """Test generation of supertracts for multiple years"""
-        generator = SupertractGenerator(geographic_data, min_half_pairs=40)
+    def test_categorical_ids_match_string_ids(self, geographic_data, generator,
+                                              repeat_sales_data):
+        """Test categorical tract IDs give the same supertracts as strings"""
+        categorical = SupertractGenerator(
+            geographic_data.astype({'census_tract_2010': 'category'}), min_half_pairs=40
+        )
+        categorical_sales = repeat_sales_data.astype({'census_tract_2010': 'category'})
         
+        for year in [2019, 2020]:
+            assert (categorical.generate_supertracts_for_year(categorical_sales, year, 'CBSA000') ==
+                    generator.generate_supertracts_for_year(repeat_sales_data, year, 'CBSA000'))
+    
+    def test_generate_all_supertracts(self, generator, repeat_sales_data):
+        """Test generation of supertracts for multiple years"""
         all_supertracts = generator.generate_all_supertracts(
             repeat_sales_data, 2019, 2020
         )
@@ -236,4 +292,34 @@ class TestSupertractGenerator:
         assert len(all_supertracts['supertract_id'].unique()) == len(all_supertracts)
         
         # Half-pairs counts should be calculated
-        assert all(all_supertracts['half_pairs_count'] >= 0)
\ No newline at end of file
+        assert (all_supertracts['half_pairs_count'] >= 0).all()
+        for year, component_tracts, half_pairs_count in all_supertracts[
+            ['year', 'component_tracts', 'half_pairs_count']
+        ].itertuples(index=False, name=None):
+            assert half_pairs_count == generator.calculate_half_pairs_multi(
+                repeat_sales_data, year, list(component_tracts)
+            )
+        
+        # Component tracts are stored as an Arrow list column
+        assert all_supertracts['component_tracts'].dtype == COMPONENT_TRACTS_DTYPE
+        assert (all_supertracts['component_tracts'].list.len() >= 1).all()
+    
+    def test_generate_all_supertracts_parallel(self, generator, repeat_sales_data):
+        """Test worker-process generation matches in-process generation"""
+        repeat_sales_data = pd.concat([
+            repeat_sales_data,
+            repeat_sales_data.assign(
+                cbsa_id='CBSA001',
+                census_tract_2010=repeat_sales_data['census_tract_2010'].str.replace(
+                    '0603700', '0603701', n=1
+                )
+            )
+        ], ignore_index=True)
+        
+        sequential = generator.generate_all_supertracts(repeat_sales_data, 2019, 2020)
+        parallel = generator.generate_all_supertracts(
+            repeat_sales_data, 2019, 2020, n_jobs=2
+        )
+        
+        assert set(sequential['cbsa_id']) == {'CBSA000', 'CBSA001'}
+        pd.testing.assert_frame_equal(parallel, sequential)
@@ -3,153 +3,170 @@
 import pytest
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 
+from rsai.src.index import weights as weights_module
 from rsai.src.index.weights import (
-    WeightCalculator, SampleWeighting, ValueWeighting,
-    UnitWeighting, UPBWeighting, CollegeWeighting, NonWhiteWeighting
+    WeightCalculator, WeightingScheme, SampleWeighting, ValueWeighting,
+    UnitWeighting, UPBWeighting, CollegeWeighting, NonWhiteWeighting,
+    index_weighting_data
 )
 
 
-class TestWeightingSchemes:
-    """Test individual weighting schemes"""
+@pytest.fixture(scope="module")
+def supertract_data():
+    """Create sample supertract data (shared, read-only)"""
+    # 5 supertracts of two tracts each in 2019 and 2020
+    years = np.repeat([2019, 2020], 5)
+    i = np.tile(np.arange(5), 2)
     
-    @pytest.fixture
-    def supertract_data(self):
-        """Create sample supertract data"""
-        data = []
-        
-        for year in [2019, 2020]:
-            for i in range(5):
-                data.append({
-                    'supertract_id': f'31080_{year}_ST{i:04d}',
-                    'year': year,
-                    'cbsa_id': '31080',
-                    'component_tracts': [f'0603712345{i}', f'0603712345{i+5}'],
-                    'half_pairs_count': 40 + i * 10  # 40, 50, 60, 70, 80
-                })
-        
-        return pd.DataFrame(data)
+    return pd.DataFrame({
+        'supertract_id': [f'31080_{year}_ST{k:04d}' for year, k in zip(years, i)],
+        'year': years,
+        'cbsa_id': '31080',
+        'component_tracts': [[f'0603712345{k}', f'0603712345{k + 5}'] for k in i],
+        'half_pairs_count': 40 + i * 10  # 40, 50, 60, 70, 80
+    })
+
+
+@pytest.fixture(scope="module")
+def weighting_data():
+    """Create sample weighting data (shared, read-only)"""
+    # 10 tracts over 2 years, plus 2010 data for demographic weights
+    # (which has no housing or UPB values)
+    years = np.repeat([2019, 2020, 2010], 10)
+    i = np.tile(np.arange(10), 3)
+    has_housing = years != 2010
     
-    @pytest.fixture
-    def weighting_data(self):
-        """Create sample weighting data"""
-        data = []
-        
-        # Create data for 10 tracts over 2 years
-        for year in [2019, 2020]:
-            for i in range(10):
-                data.append({
-                    'census_tract_2010': f'0603712345{i}',
-                    'year': year,
-                    'total_housing_units': 1000 + i * 100,
-                    'total_housing_value': 500000000 + i * 50000000,
-                    'total_upb': 400000000 + i * 40000000,
-                    'college_population': 2000 + i * 200,
-                    'non_white_population': 1500 + i * 150
-                })
-        
-        # Add 2010 data for demographic weights
-        for i in range(10):
-            data.append({
-                'census_tract_2010': f'0603712345{i}',
-                'year': 2010,
-                'total_housing_units': None,
-                'total_housing_value': None,
-                'total_upb': None,
-                'college_population': 2000 + i * 200,
-                'non_white_population': 1500 + i * 150
-            })
-        
-        return pd.DataFrame(data)
+    return pd.DataFrame({
+        'census_tract_2010': np.tile([f'0603712345{k}' for k in range(10)], 3).astype(object),
+        'year': years,
+        'total_housing_units': np.where(has_housing, 1000 + i * 100, np.nan),
+        'total_housing_value': np.where(has_housing, 500000000 + i * 50000000, np.nan),
+        'total_upb': np.where(has_housing, 400000000 + i * 40000000, np.nan),
+        'college_population': 2000 + i * 200,
+        'non_white_population': 1500 + i * 150
+    })
+
+
+class TestWeightingSchemes:
+    """Test individual weighting schemes"""
     
-    def test_sample_weighting(self, supertract_data):
-        """Test sample-based weighting"""
-        weighting = SampleWeighting()
-        
-        weights = weighting.calculate_weights(supertract_data, 2020)
+    @pytest.mark.parametrize('scheme_cls,needs_weighting_data', [
+        (SampleWeighting, False),
+        (ValueWeighting, True),
+        (UnitWeighting, True),
+        (UPBWeighting, True),
+        (CollegeWeighting, True),   # uses 2010 demographic data
+        (NonWhiteWeighting, True),
+    ])
+    def test_scheme_weights_normalized(self, scheme_cls, needs_weighting_data,
+                                       supertract_data, weighting_data):
+        """Test each scheme gives positive weights that sum to 1"""
+        kwargs = {'weighting_data': weighting_data} if needs_weighting_data else {}
+        
+        weights = scheme_cls().calculate_weights(supertract_data, 2020, **kwargs)
         
         # Check weights sum to 1
         assert abs(weights.sum() - 1.0) < 0.0001
         
-        # Check weights are proportional to half-pairs
-        year_data = supertract_data[supertract_data['year'] == 2020]
-        expected_weights = year_data.set_index('supertract_id')['half_pairs_count'] / year_data['half_pairs_count'].sum()
+        # All weights should be positive
+        assert (weights > 0).all()
+    
+    def test_sample_weighting(self, supertract_data):
+        """Test sample-based weights are proportional to half-pairs"""
+        weights = SampleWeighting().calculate_weights(supertract_data, 2020)
         
-        for st_id in weights.index:
-            assert abs(weights[st_id] - expected_weights[st_id]) < 0.0001
+        half_pairs = supertract_data.loc[
+            supertract_data['year'] == 2020, ['supertract_id', 'half_pairs_count']
+        ].set_index('supertract_id')['half_pairs_count']
+        expected_weights = half_pairs.div(half_pairs.sum())
+        
+        np.testing.assert_allclose(weights, expected_weights.reindex(weights.index),
+                                   rtol=0, atol=0.0001)
     
     def test_value_weighting(self, supertract_data, weighting_data):
         """Test value-based (Laspeyres) weighting"""
-        weighting = ValueWeighting()
-        
-        weights = weighting.calculate_weights(
+        weights = ValueWeighting().calculate_weights(
             supertract_data, 2020, weighting_data=weighting_data
         )
         
-        # Check weights sum to 1
-        assert abs(weights.sum() - 1.0) < 0.0001
-        
         # Verify it uses previous year (2019) values
         # Supertract with higher-indexed tracts should have higher weight
         weights_list = weights.sort_index().values
         assert weights_list[-1] > weights_list[0]  # Last should be larger
     
-    def test_unit_weighting(self, supertract_data, weighting_data):
-        """Test unit-based weighting"""
-        weighting = UnitWeighting()
-        
-        weights = weighting.calculate_weights(
-            supertract_data, 2020, weighting_data=weighting_data
+    def test_tract_sums_match_per_supertract_filter(self, supertract_data, weighting_data):
+        """Test vectorized tract sums equal filtering the tract data per supertract"""
+        # Duplicate tract rows are summed, Arrow list and categorical IDs work
+        weighting_data = pd.concat([weighting_data, weighting_data.iloc[10:13]], ignore_index=True)
+        arrow_supertracts = supertract_data.astype({
+            'component_tracts': pd.ArrowDtype(pa.list_(pa.string()))
+        })
+        categorical_weighting = weighting_data.astype({'census_tract_2010': 'category'})
+        
+        weights = UnitWeighting().calculate_weights(
+            arrow_supertracts, 2020, weighting_data=categorical_weighting
         )
         
-        # Check weights sum to 1
-        assert abs(weights.sum() - 1.0) < 0.0001
-        
-        # All weights should be positive
-        assert all(weights > 0)
-    
-    def test_upb_weighting(self, supertract_data, weighting_data):
-        """Test UPB weighting"""
-        weighting = UPBWeighting()
-        
-        weights = weighting.calculate_weights(
-            supertract_data, 2020, weighting_data=weighting_data
-        )
-        
-        # Check weights sum to 1
-        assert abs(weights.sum() - 1.0) < 0.0001
-        
-        # All weights should be positive
-        assert all(weights > 0)
+        year_data = supertract_data[supertract_data['year'] == 2020]
+        expected = pd.Series({
+            supertract_id: weighting_data[
+                weighting_data['census_tract_2010'].isin(component_tracts) &
+                (weighting_data['year'] == 2020)
+            ]['total_housing_units'].sum()
+            for supertract_id, component_tracts in year_data[
+                ['supertract_id', 'component_tracts']
+            ].itertuples(index=False, name=None)
+        }, dtype=float)
+        
+        np.testing.assert_allclose(weights.to_numpy(), (expected / expected.sum()).to_numpy())
+        assert weights.index.tolist() == year_data['supertract_id'].tolist()
     
-    def test_college_weighting(self, supertract_data, weighting_data):
-        """Test college population weighting"""
-        weighting = CollegeWeighting()
-        
-        weights = weighting.calculate_weights(
-            supertract_data, 2020, weighting_data=weighting_data
-        )
+    def test_sum_over_tracts_missing_tracts(self):
+        """Test tracts without values and supertracts without tracts sum to 0"""
+        supertract_data = pd.DataFrame({
+            'supertract_id': ['ST0', 'ST1', 'ST2'],
+            'year': 2020,
+            'component_tracts': [['t1', 't2'], ['t3'], []]
+        })
+        tract_values = pd.Series({'t1': 1.5, 't2': 2.0})
         
-        # Check weights sum to 1
-        assert abs(weights.sum() - 1.0) < 0.0001
+        totals = UnitWeighting().sum_over_tracts(supertract_data, 2020, tract_values)
         
-        # Should use 2010 demographic data
-        # All weights should be positive
-        assert all(weights > 0)
+        assert totals.index.tolist() == ['ST0', 'ST1', 'ST2']
+        assert totals.dtype == np.float64
+        np.testing.assert_array_equal(totals.to_numpy(), [3.5, 0.0, 0.0])
     
-    def test_non_white_weighting(self, supertract_data, weighting_data):
-        """Test non-white population weighting"""
-        weighting = NonWhiteWeighting()
-        
-        weights = weighting.calculate_weights(
-            supertract_data, 2020, weighting_data=weighting_data
-        )
-        
-        # Check weights sum to 1
-        assert abs(weights.sum() - 1.0) < 0.0001
-        
-        # All weights should be positive
-        assert all(weights > 0)
+    def test_indexed_weighting_data_matches_masks(self, supertract_data, weighting_data):
+        """Test the (year, tract) pre-indexed totals give the same weights"""
+        calculator = WeightCalculator()
+        weighting_index = calculator.weighting_index(weighting_data)
+        assert weighting_index.index.names == ['year', 'census_tract_2010']
+        assert calculator.weighting_index(weighting_data) is weighting_index
+        
+        # Also with the supertract year missing from the weighting data
+        missing_year = weighting_data[weighting_data['year'] != 2020]
+        for name in ['value', 'unit', 'upb', 'college', 'non_white']:
+            scheme = calculator.schemes[name]
+            for data in [weighting_data, missing_year]:
+                expected = scheme.calculate_weights(
+                    supertract_data, 2020, weighting_data=data
+                )
+                indexed = calculator.calculate_weights(
+                    name, supertract_data, 2020, data
+                )
+                pd.testing.assert_series_equal(indexed, expected)
+        
+        # A missing column still fails the scheme
+        with pytest.raises(KeyError):
+            UnitWeighting().calculate_weights(
+                supertract_data, 2020,
+                weighting_data=weighting_data.drop(columns='total_housing_units'),
+                weighting_index=index_weighting_data(
+                    weighting_data.drop(columns='total_housing_units')
+                )
+            )
     
     def test_missing_weighting_data_error(self, supertract_data):
         """Test error when weighting data is missing"""
@@ -174,7 +191,7 @@ class TestWeightingSchemes:
         
         # Should return equal weights
         assert abs(weights.sum() - 1.0) < 0.0001
-        assert all(abs(w - 1/3) < 0.0001 for w in weights)
+        np.testing.assert_allclose(weights, 1/3, rtol=0, atol=0.0001)
 
 
 class TestWeightCalculator:
@@ -252,7 +269,116 @@ class TestWeightCalculator:
         assert all(scheme in all_weights.columns for scheme in expected_schemes)
         
         # All weights should be 1.0 (only one supertract)
-        assert all(all_weights.iloc[0] == 1.0)
+        assert (all_weights.iloc[0] == 1.0).all()
+    
+    def test_calculate_all_weights_matches_single_schemes(self, calculator):
+        """Test the stacked normalization equals each scheme's calculate_weights"""
+        supertract_data = pd.DataFrame({
+            'supertract_id': ['ST2', 'ST0', 'ST1'],
+            'year': 2020,
+            'component_tracts': [['t2'], ['t0', 't1'], ['t3']],
+            'half_pairs_count': [40, 0, 60]
+        })
+        weighting_data = pd.DataFrame({
+            'census_tract_2010': ['t0', 't1', 't2', 't3'],
+            'year': 2020,
+            'total_housing_units': [100.0, 200.0, 300.0, 0.0],
+            'total_housing_value': 0.0,
+            'total_upb': [1.0, 2.0, 3.0, 4.0]
+        })
+        
+        class HalfPairsOverride(SampleWeighting):
+            def calculate_weights(self, supertract_data, year, **kwargs):
+                weights = super().calculate_weights(supertract_data, year, **kwargs)
+                return weights.iloc[::-1] ** 2
+        calculator.add_custom_scheme('override', HalfPairsOverride())
+        
+        all_weights = calculator.calculate_all_weights(supertract_data, 2020, weighting_data)
+        
+        assert all_weights.index.tolist() == ['ST2', 'ST0', 'ST1']
+        np.testing.assert_allclose(all_weights.sum(), 1.0)
+        for scheme in ['sample', 'unit', 'upb', 'override']:
+            expected = calculator.calculate_weights(scheme, supertract_data, 2020, weighting_data)
+            np.testing.assert_allclose(
+                all_weights[scheme], expected.reindex(all_weights.index) /
+                expected.sum(), rtol=1e-15
+            )
+        # Value weights (previous year) are all zero and demographic data
+        # is missing: both fall back to equal weights
+        for scheme in ['value', 'college', 'non_white']:
+            np.testing.assert_allclose(all_weights[scheme], 1 / 3)
+    
+    def test_calculate_all_weights_single_tract_pass(self, calculator, monkeypatch):
+        """Test the tract-summing schemes share one sum over the membership"""
+        supertract_data = pd.DataFrame({
+            'supertract_id': ['ST0', 'ST1'],
+            'year': 2020,
+            'component_tracts': [['t0', 't1'], ['t2']],
+            'half_pairs_count': [10, 30]
+        })
+        weighting_data = pd.DataFrame({
+            'census_tract_2010': ['t0', 't1', 't2'] * 3,
+            'year': [2019] * 3 + [2020] * 3 + [2010] * 3,
+            'total_housing_value': [1.0, 2.0, 3.0] * 3,
+            'total_housing_units': [4.0, 0.0, 4.0] * 3,
+            'total_upb': [1.0, 1.0, 2.0] * 3,
+            'college_population': [5.0, 5.0, 30.0] * 3,
+            'non_white_population': [1.0, 2.0, 1.0] * 3
+        })
+        
+        calls = []
+        original = weights_module._sum_over_tracts
+        monkeypatch.setattr(weights_module, '_sum_over_tracts',
+                            lambda *args: calls.append(args[2].shape) or original(*args))
+        
+        all_weights = calculator.calculate_all_weights(supertract_data, 2020, weighting_data)
+        
+        assert calls == [(3, 5)]
+        np.testing.assert_allclose(all_weights.loc['ST0'], [0.25, 0.5, 0.5, 0.5, 0.25, 0.75])
+    
+    def test_calculate_all_weights_non_fusable_tract_scheme(self, calculator):
+        """Test a tract-summing scheme opting out of the shared pass is called"""
+        supertract_data = pd.DataFrame({
+            'supertract_id': ['ST0', 'ST1'],
+            'year': 2020,
+            'component_tracts': [['t0', 't1'], ['t2']],
+            'half_pairs_count': [10, 30]
+        })
+        weighting_data = pd.DataFrame({
+            'census_tract_2010': ['t0', 't1', 't2'],
+            'year': 2020,
+            'total_housing_units': [1.0, 2.0, 1.0]
+        })
+        
+        class SquaredUnits(UnitWeighting):
+            fusable = False
+            
+            def raw_weights(self, supertract_data, year, **kwargs):
+                return super().raw_weights(supertract_data, year, **kwargs) ** 2
+        calculator.add_custom_scheme('squared_units', SquaredUnits())
+        
+        all_weights = calculator.calculate_all_weights(supertract_data, 2020, weighting_data)
+        
+        np.testing.assert_allclose(all_weights['unit'], [0.75, 0.25])
+        np.testing.assert_allclose(all_weights['squared_units'], [0.9, 0.1])
+    
+    def test_scheme_overriding_only_calculate_weights(self, calculator, sample_data):
+        """Test a direct WeightingScheme subclass may define only calculate_weights"""
+        supertract_data, weighting_data = sample_data
+        
+        class EqualWeighting(WeightingScheme):
+            def calculate_weights(self, supertract_data, year, **kwargs):
+                year_data = supertract_data[supertract_data['year'] == year]
+                return self.normalize_weights(pd.Series(1.0, index=year_data['supertract_id']))
+        calculator.add_custom_scheme('equal', EqualWeighting())
+        
+        weights = calculator.calculate_weights('equal', supertract_data, 2020)
+        assert weights.tolist() == [1.0]
+        all_weights = calculator.calculate_all_weights(supertract_data, 2020, weighting_data)
+        assert all_weights['equal'].tolist() == [1.0]
+        
+        with pytest.raises(NotImplementedError, match="EqualWeighting must implement"):
+            EqualWeighting().raw_weights(supertract_data, 2020)
     
     def test_custom_scheme(self, calculator, sample_data):
         """Test adding custom weighting scheme"""